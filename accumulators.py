@@ -0,0 +1,195 @@
+"""
+**Online Accumulators**
+
+Description:
+    Constant-space statistics of the observations a simulation run makes, updated as the run goes instead of being
+    computed at the end from a stored history.
+    RunningStatistics replaces the per-queue dicts data['X Queue Lengths'] (one observation per queue-length change)
+    and data['X Queue Waiting Times'] (one observation per patient leaving the queue): it keeps the number,
+    sum, sum of squares and maximum of the observations, which is what the Max_Lq / Max_Wq results need.
+
+Quantiles:
+    QuantileSketch estimates quantiles (P90, P95, P99 of the waiting times) in bounded space: a log-bucketed histogram
+    in the style of DDSketch (Masson, Rim & Lee, 2019). Every positive value falls in the bucket
+    (gamma^(k-1), gamma^k] with gamma = (1 + a) / (1 - a), so any quantile is estimated with a relative error of at
+    most a (1% by default), and only the occupied buckets are stored (about 750 for values from 1 second to 1000
+    hours). Two sketches are merged by adding their bucket counts, so the sketches of several replications give the
+    quantiles of the pooled observations exactly as one sketch of all of them would.
+
+Time-weighted histograms:
+    TimeWeightedHistogram is a fixed-size array of the time a piecewise-constant quantity (a queue length, a number of
+    occupied beds) spent at each level, updated at the change points the engine already tracks for the areas under
+    the curves ('Last Time ... Changed'). It gives the whole distribution of the level, e.g. P(queue >= k) and
+    P(all beds busy), at O(1) cost per change. The last bin collects the time spent at its level or above.
+
+Warm-up:
+    Every accumulator has a reset() method, called by the warm-up event of base.simulation() (see base.warm_up()), so
+    that the statistics only cover the steady state.
+
+History:
+    The full history (a dict keyed like the old ones: by time for queue lengths, by patient for waiting times) is only
+    kept when asked for (base.simulation(..., queue_history=True)). Statistics never lose observations: two entries
+    with the same key (e.g. two queue-length changes at the same time) both count, whereas the history keeps only the
+    last one, as the old dicts did.
+"""
+
+import math
+from array import array
+
+
+class QuantileSketch:
+    """Mergeable streaming quantile estimator of non-negative values, with relative accuracy `accuracy`."""
+
+    __slots__ = ('accuracy', '_log_gamma', 'buckets', 'zero_count', 'count')
+
+    def __init__(self, accuracy=0.01):
+        self.accuracy = accuracy
+        self._log_gamma = math.log((1 + accuracy) / (1 - accuracy))
+        self.buckets = {}  # bucket index k -> number of values in (gamma^(k-1), gamma^k]
+        self.zero_count = 0  # values too small to matter (zero waiting times)
+        self.count = 0
+
+    def add(self, value, count=1):
+        if count <= 0:
+            return
+        self.count += count
+        if value <= 1e-9:
+            self.zero_count += count
+        else:
+            k = math.ceil(math.log(value) / self._log_gamma)
+            self.buckets[k] = self.buckets.get(k, 0) + count
+
+    def reset(self):
+        # Forget every value (e.g. at the end of the warm-up period)
+        self.buckets.clear()
+        self.zero_count = 0
+        self.count = 0
+
+    def merge(self, other):
+        # Add the values of another sketch with the same accuracy
+        if other.accuracy != self.accuracy:
+            raise ValueError("Only sketches with the same accuracy can be merged.")
+        self.count += other.count
+        self.zero_count += other.zero_count
+        for k, count in other.buckets.items():
+            self.buckets[k] = self.buckets.get(k, 0) + count
+        return self
+
+    def quantile(self, q):
+        # Estimate of the q-quantile (0 <= q <= 1); 0 when there are no values
+        if self.count == 0:
+            return 0
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0
+        for k in sorted(self.buckets):
+            seen += self.buckets[k]
+            if rank < seen:
+                # Middle of the bucket in relative terms: within `accuracy` of every value in it
+                return 2 * math.exp(k * self._log_gamma) / (math.exp(self._log_gamma) + 1)
+        return 2 * math.exp(max(self.buckets) * self._log_gamma) / (math.exp(self._log_gamma) + 1)
+
+
+class RunningStatistics:
+    """
+    Count, sum, sum of squares and maximum of a stream of non-negative observations (0 when there are none), and with
+    `quantiles` a QuantileSketch of them (self.sketch).
+    """
+
+    __slots__ = ('count', 'sum', 'sum_squares', 'max', 'history', 'sketch')
+
+    def __init__(self, history=False, quantiles=False):
+        self.count = 0
+        self.sum = 0
+        self.sum_squares = 0
+        self.max = 0
+        self.history = {} if history else None
+        self.sketch = QuantileSketch() if quantiles else None
+
+    def add(self, key, value):
+        # Record one observation; key (time or patient) is only used by the history
+        self.count += 1
+        self.sum += value
+        self.sum_squares += value * value
+        if value > self.max:
+            self.max = value
+        if self.history is not None:
+            self.history[key] = value
+        if self.sketch is not None:
+            self.sketch.add(value)
+
+    def reset(self):
+        # Forget every observation, the history included (e.g. at the end of the warm-up period)
+        self.count = 0
+        self.sum = 0
+        self.sum_squares = 0
+        self.max = 0
+        if self.history is not None:
+            self.history.clear()
+        if self.sketch is not None:
+            self.sketch.reset()
+
+    def merge(self, other):
+        # Add the observations of another accumulator (e.g. of another replication); the history is not merged
+        self.count += other.count
+        self.sum += other.sum
+        self.sum_squares += other.sum_squares
+        if other.max > self.max:
+            self.max = other.max
+        if self.sketch is not None and other.sketch is not None:
+            self.sketch.merge(other.sketch)
+        return self
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0
+
+    @property
+    def variance(self):
+        # Sample variance (0 for fewer than two observations)
+        if self.count < 2:
+            return 0
+        return max(self.sum_squares - self.sum * self.sum / self.count, 0) / (self.count - 1)
+
+    def __repr__(self):
+        return f'RunningStatistics(count={self.count}, mean={self.mean!r}, max={self.max!r})'
+
+
+class TimeWeightedHistogram:
+    """Time spent at each level 0, 1, ..., size - 2 of a piecewise-constant quantity, and at size - 1 or more."""
+
+    __slots__ = ('time', '_last')
+
+    def __init__(self, size):
+        self.time = array('d', [0.0]) * size
+        self._last = size - 1
+
+    def add(self, level, duration):
+        # The quantity was at `level` for `duration`
+        self.time[level if level < self._last else self._last] += duration
+
+    def reset(self):
+        # Forget the time recorded so far (e.g. at the end of the warm-up period)
+        for level in range(len(self.time)):
+            self.time[level] = 0.0
+
+    def merge(self, other):
+        # Add the time of another histogram of the same size (e.g. of another replication)
+        if len(other.time) != len(self.time):
+            raise ValueError("Only histograms of the same size can be merged.")
+        for level, duration in enumerate(other.time):
+            self.time[level] += duration
+        return self
+
+    def probabilities(self):
+        # Share of the time spent at each level (the last one: at that level or above)
+        total = sum(self.time)
+        return [duration / total if total else 0 for duration in self.time]
+
+    def probability_at_least(self, k):
+        # Share of the time the quantity was k or more (exact for k <= size - 1)
+        total = sum(self.time)
+        if total == 0:
+            return 0
+        return sum(self.time[min(max(k, 0), self._last):]) / total
@@ -27,6 +27,7 @@ Input Distributions:
 
 System Properties:
     - The system starts in an empty state with no occupied beds or patients in the queue.
+    - The statistics of a run can leave out a warm-up period: when it ends, they start over (see warm_up()).
     - The hospital has fixed capacities for departments:
         - ICU: 10 beds
         - CCU: 5 beds
@@ -59,13 +60,100 @@ Authors: Arman Maghsoudi & Ali Nasr
 Date: Winter 2025
 """
 
-import random
-import math
+from collections import deque
+from functools import partial
 import numpy as np
-import pandas as pd
-
-
-def starting_state(param: dict):
+from event_queue import make_event_queue
+from tracing import NullRecorder, ExcelRecorder
+from patients import make_patient_store, NORMAL, URGENT, SIMPLE, MEDIUM, COMPLEX, GENERAL_WARD, ICU, CCU
+from variates import Variates
+from accumulators import QuantileSketch, RunningStatistics, TimeWeightedHistogram
+from events import (Event, NORMAL_ARRIVAL, URGENT_ARRIVAL, LABORATORY_ARRIVAL, LABORATORY_DEPARTURE, OPERATION_ARRIVAL,
+                    OPERATION_DEPARTURE, CONDITION_DETERIORATION, CARE_UNIT_DEPARTURE, POWER_OFF, POWER_ON,
+                    END_OF_SERVICE, END_OF_SIMULATION, WARM_UP)
+
+# Version of the model; increase it whenever a change makes a seeded run give different Results (see result_cache.py)
+ENGINE_VERSION = 10
+
+# Percentiles of the waiting time in each queue and of the time in system reported in data['Results'] (estimated with
+# the QuantileSketch of the accumulators, see accumulators.py)
+PERCENTILES = (90, 95, 99)
+WAITING_TIME_QUEUES = ('Preoperative', 'Emergency', 'Laboratory_Normal', 'Laboratory_Urgent', 'Operation_Normal',
+                       'Operation_Urgent', 'General_Ward', 'ICU', 'CCU')
+
+# Time-weighted histograms of the queue lengths and of the numbers of occupied beds (see accumulators.py):
+# Results suffix -> name in data (data['<name> Queue Length Histogram'], data['<name> Occupancy Histogram'])
+QUEUE_HISTOGRAMS = {'Preoperative': 'Preoperative', 'Emergency': 'Emergency', 'Laboratory_Normal': 'Laboratory Normal',
+                    'Laboratory_Urgent': 'Laboratory Urgent', 'Operation_Normal': 'Surgery Normal',
+                    'Operation_Urgent': 'Surgery Urgent', 'General_Ward': 'General Ward', 'ICU': 'ICU', 'CCU': 'CCU'}
+OCCUPANCY_HISTOGRAMS = {'Emergency': 'Emergency', 'Preoperative': 'Preoperative', 'Laboratory': 'Laboratory',
+                        'Operation': 'Operation', 'General_Ward': 'General Ward', 'ICU': 'ICU', 'CCU': 'CCU'}
+QUEUE_HISTOGRAM_SIZE = 101  # queue lengths 0-99, and 100 or more in the last bin (the emergency queue is bounded)
+
+# Metrics of data['Results'], in the order of the vector returned by simulation(..., return_mode='vector')
+RESULT_METRICS = (
+    'average_time_in_system', 'Full_Emergency_Queue_Probability', 'average_complex_operation_reoperations',
+    'immediately_admitted_emergency_patients_percentage',
+    'rho_Emergency', 'rho_Preoperative', 'rho_Laboratory', 'rho_Operation', 'rho_General_Ward', 'rho_ICU', 'rho_CCU',
+    'Lq_Emergency', 'Lq_Preoperative', 'Lq_Laboratory_Normal', 'Lq_Laboratory_Urgent', 'Lq_Operation_Normal',
+    'Lq_Operation_Urgent', 'Lq_General_Ward', 'Lq_ICU', 'Lq_CCU',
+    'Wq_Emergency', 'Wq_Preoperative', 'Wq_Laboratory_Normal', 'Wq_Laboratory_Urgent', 'Wq_Operation_Normal',
+    'Wq_Operation_Urgent', 'Wq_General_Ward', 'Wq_ICU', 'Wq_CCU',
+    'Max_Wq_Preoperative', 'Max_Wq_Emergency', 'Max_Wq_Laboratory_Normal', 'Max_Wq_Laboratory_Urgent',
+    'Max_Wq_Operation_Normal', 'Max_Wq_Operation_Urgent', 'Max_Wq_General_Ward', 'Max_Wq_ICU', 'Max_Wq_CCU',
+    'Max_Lq_Preoperative', 'Max_Lq_Emergency', 'Max_Lq_Laboratory_Normal', 'Max_Lq_Laboratory_Urgent',
+    'Max_Lq_Operation_Normal', 'Max_Lq_Operation_Urgent', 'Max_Lq_General_Ward', 'Max_Lq_ICU', 'Max_Lq_CCU',
+    'Finished_Patients',
+) + tuple(f'P{percentile}_Wq_{queue}' for queue in WAITING_TIME_QUEUES for percentile in PERCENTILES) + \
+    tuple(f'P{percentile}_time_in_system' for percentile in PERCENTILES) + \
+    tuple(f'Nonempty_Queue_Probability_{queue}' for queue in QUEUE_HISTOGRAMS) + \
+    tuple(f'All_Beds_Busy_Probability_{department}' for department in OCCUPANCY_HISTOGRAMS)
+RETURN_MODES = ('data', 'results', 'vector', 'summary')
+
+
+def results_from_vector(vector):
+    # Results dict of a vector returned by simulation(..., return_mode='vector')
+    return dict(zip(RESULT_METRICS, vector.tolist()))
+
+
+class DiscardedHistory(dict):
+    """Stands in for a history dict that the caller will not read: assignments are dropped, so it stays empty."""
+
+    def __setitem__(self, key, value):
+        pass
+
+
+class BedOccupancy:
+    """
+    The set of patients occupying the beds of a unit (ICU, CCU).
+    Adding or removing a patient also updates the unit's occupied-beds state variable, so the two never diverge.
+    """
+
+    def __init__(self, state, state_key):
+        self._patients = set()
+        self._state = state
+        self._state_key = state_key
+
+    def add(self, patient):
+        self._patients.add(patient)
+        self._state[self._state_key] = len(self._patients)
+
+    def remove(self, patient):
+        self._patients.remove(patient)
+        self._state[self._state_key] = len(self._patients)
+
+    def __contains__(self, patient):
+        return patient in self._patients
+
+    def __len__(self):
+        return len(self._patients)
+
+    def __iter__(self):
+        return iter(self._patients)
+
+
+def starting_state(param: dict, event_queue='heap', retention='keep', seed=None, antithetic=False, variates=None,
+                   history=True, queue_history=False):
     # State variables
     state = dict()
     state['Preoperative Occupied Beds'] = 0
@@ -90,50 +178,67 @@ def starting_state(param: dict):
 
     # Data: will save everything
     data = dict()
-    data['Patients'] = dict()  # To track each customer, saving their arrival time, time service begins, etc.
-    data['Preoperative Queue Patients'] = dict()  # Patient: Arrival Time, used to find first customer in the queue
-    data['Emergency Queue Patients'] = dict()
-    data['Laboratory Normal Queue Patients'] = dict()
-    data['Laboratory Urgent Queue Patients'] = dict()
-    data['Surgery Normal Queue Patients'] = dict()
-    data['Surgery Urgent Queue Patients'] = dict()
-    data['General Ward Queue Patients'] = dict()
-    data['ICU Queue Patients'] = dict()
-    data['CCU Queue Patients'] = dict()
-    data['ICU Patients'] = list()
-    data['CCU Patients'] = list()
+    # To track each customer, saving their arrival time, time service begins, etc. ('keep', 'drop' or a callable, see
+    # patients.py for what happens to the record of a patient who leaves the system)
+    data['Patients'] = make_patient_store(retention)
+    data['Preoperative Queue Patients'] = deque()  # Patients in arrival order, the first customer is at the left end
+    data['Emergency Queue Patients'] = deque()
+    data['Laboratory Normal Queue Patients'] = deque()
+    data['Laboratory Urgent Queue Patients'] = deque()
+    data['Surgery Normal Queue Patients'] = deque()
+    data['Surgery Urgent Queue Patients'] = deque()
+    data['General Ward Queue Patients'] = deque()
+    data['ICU Queue Patients'] = deque()
+    data['CCU Queue Patients'] = deque()
+    data['ICU Patients'] = BedOccupancy(state, 'ICU Occupied Beds')  # patients occupying a bed, O(1) add/remove
+    data['CCU Patients'] = BedOccupancy(state, 'CCU Occupied Beds')
+    # Random inputs: one seeded stream per stochastic source, drawn in blocks (see variates.py)
+    data['Variates'] = variates if variates is not None else Variates(param, seed, antithetic)
 
     data['Results'] = dict()
-
-    # Needed data to find maximum waiting time in each queue
-    data['Preoperative Queue Waiting Times'] = dict()
-    data['Emergency Queue Waiting Times'] = dict()
-    data['Laboratory Normal Queue Waiting Times'] = dict()
-    data['Laboratory Urgent Queue Waiting Times'] = dict()
-    data['Operation Normal Queue Waiting Times'] = dict()
-    data['Operation Urgent Queue Waiting Times'] = dict()
-    data['General Ward Queue Waiting Times'] = dict()
-    data['ICU Queue Waiting Times'] = dict()
-    data['CCU Queue Waiting Times'] = dict()
-
-    # Needed data to find maximum queue length for each queue
-    data['Preoperative Queue Lengths'] = dict()
-    data['Emergency Queue Lengths'] = dict()
-    data['Laboratory Normal Queue Lengths'] = dict()
-    data['Laboratory Urgent Queue Lengths'] = dict()
-    data['Operation Normal Queue Lengths'] = dict()
-    data['Operation Urgent Queue Lengths'] = dict()
-    data['General Ward Queue Lengths'] = dict()
-    data['ICU Queue Lengths'] = dict()
-    data['CCU Queue Lengths'] = dict()
+    # Quantile sketches the percentiles of data['Results'] come from, keyed by the metric after 'P<percentile>_'
+    # (e.g. 'Wq_ICU', 'time_in_system'); replications merge them to pool the percentiles (see get_result.replication)
+    data['Sketches'] = dict()
+
+    # Waiting times in each queue (count, sum, sum of squares, maximum and a quantile sketch; the full history only
+    # with queue_history, see accumulators.py)
+    data['Preoperative Queue Waiting Times'] = RunningStatistics(queue_history, quantiles=True)
+    data['Emergency Queue Waiting Times'] = RunningStatistics(queue_history, quantiles=True)
+    data['Laboratory Normal Queue Waiting Times'] = RunningStatistics(queue_history, quantiles=True)
+    data['Laboratory Urgent Queue Waiting Times'] = RunningStatistics(queue_history, quantiles=True)
+    data['Operation Normal Queue Waiting Times'] = RunningStatistics(queue_history, quantiles=True)
+    data['Operation Urgent Queue Waiting Times'] = RunningStatistics(queue_history, quantiles=True)
+    data['General Ward Queue Waiting Times'] = RunningStatistics(queue_history, quantiles=True)
+    data['ICU Queue Waiting Times'] = RunningStatistics(queue_history, quantiles=True)
+    data['CCU Queue Waiting Times'] = RunningStatistics(queue_history, quantiles=True)
+    data['Time in System'] = RunningStatistics(queue_history, quantiles=True)  # of the patients who finish service
+
+    # Time spent at each queue length and number of occupied beds; a department's last bin is "all beds busy" (at its
+    # starting capacity, see the All_Beds_Busy_Probability results for the ICU and CCU)
+    for name in QUEUE_HISTOGRAMS.values():
+        size = param['Emergency Queue Capacity'] + 1 if name == 'Emergency' else QUEUE_HISTOGRAM_SIZE
+        data[f'{name} Queue Length Histogram'] = TimeWeightedHistogram(int(size))
+    for name in OCCUPANCY_HISTOGRAMS.values():
+        data[f'{name} Occupancy Histogram'] = TimeWeightedHistogram(int(param[f'{name} Capacity']) + 1)
+
+    # Queue lengths of each queue, one observation per change (same as above)
+    data['Preoperative Queue Lengths'] = RunningStatistics(queue_history)
+    data['Emergency Queue Lengths'] = RunningStatistics(queue_history)
+    data['Laboratory Normal Queue Lengths'] = RunningStatistics(queue_history)
+    data['Laboratory Urgent Queue Lengths'] = RunningStatistics(queue_history)
+    data['Operation Normal Queue Lengths'] = RunningStatistics(queue_history)
+    data['Operation Urgent Queue Lengths'] = RunningStatistics(queue_history)
+    data['General Ward Queue Lengths'] = RunningStatistics(queue_history)
+    data['ICU Queue Lengths'] = RunningStatistics(queue_history)
+    data['CCU Queue Lengths'] = RunningStatistics(queue_history)
 
     # Cumulative Stats
     data['Last Time Emergency Queue Length Changed'] = 0  # Needed to calculate probability of a full emergency queue
     data['Last Time Preoperative Queue Length Changed'] = 0
     data['Last Time Laboratory Normal Queue Length Changed'] = 0
     data['Last Time Laboratory Urgent Queue Length Changed'] = 0
-    data['Last Time Operation Normal Queue Length Changed'] = 0
-    data['Last Time Operation Urgent Queue Length Changed'] = 0
+    data['Last Time Surgery Normal Queue Length Changed'] = 0
+    data['Last Time Surgery Urgent Queue Length Changed'] = 0
     data['Last Time General Ward Queue Length Changed'] = 0
     data['Last Time ICU Queue Length Changed'] = 0
     data['Last Time CCU Queue Length Changed'] = 0
@@ -192,126 +297,91 @@ def starting_state(param: dict):
     data['Cumulative Stats']['ICU Server Busy Time'] = 0
     data['Cumulative Stats']['CCU Server Busy Time'] = 0
 
+    # Time during which every bed of the ICU / CCU that can be used is busy (their capacity drops during an outage)
+    data['Cumulative Stats']['ICU All Beds Busy Time'] = 0
+    data['Cumulative Stats']['CCU All Beds Busy Time'] = 0
+
     data['Cumulative Stats']['Number of Repeated Operations For Patients With Complex Operation'] = 0
 
     data['Cumulative Stats']['Number of Immediately Admitted Emergency Patients'] = 0
 
     data['Cumulative Stats']['Patients With Complex Surgery'] = 0
 
-    # Cumulative stats for warm period
-    data['Cumulative Stats']['Area Under Preoperative Queue Length Curve(warm period)'] = 0
-    data['Cumulative Stats']['Preoperative Queue Waiting Time(warm period)'] = 0
-    data['Cumulative Stats']['Preoperative Service Starters(warm period)'] = 0
-    data['Cumulative Stats']['Finished Patients'] = 0
-
     # Set up a data structure to save required queue length by time
     # preoperative_queue_tracker = dict()  # keys are time, values are queue length
-    data['preoperative_queue_tracker'] = dict()  # keys are time, values are queue length
+    # keys are time, values are queue length (not kept when the caller only wants the Results, see simulation())
+    data['preoperative_queue_tracker'] = dict() if history else DiscardedHistory()
 
     # Starting FEL
-    future_event_list = list()
-    future_event_list.append({'Event Type': 'Arrival', 'Event Time': 0, 'Patient': 'P1', 'Patient Type': 'Normal'})
+    future_event_list = make_event_queue(event_queue)  # 'heap', 'calendar' or 'ladder' (see event_queue.py)
+    future_event_list.push(Event(0, NORMAL_ARRIVAL, 1))
     return state, future_event_list, data
 
 
-def exponential(lambd):
-    r = random.random()
-    return -(1 / lambd) * math.log(r)
-
-
-def uniform(a, b):
-    r = random.random()
-    return a + (b - a) * r
-
-
-def triangular(LB: float, M: float, UB: float) -> float:
-    r = np.random.triangular(left=LB, mode=M, right=UB)
-    return r
-
-
-def fel_maker(future_event_list, event_type, clock, data, param, patient=None, patient_type=None):
+def fel_maker(future_event_list, event_type, clock, data, param, patient=None):
+    # event_type is an event code from events.py
     event_time = 0
 
-    if event_type == 'Arrival':
-        if patient_type == 'Normal':  # Normal Patient
-            event_time = clock + exponential(param['Normal Arrival Exp Param'])
-        else:  # Urgent patient
-            event_time = clock + exponential(param['Urgent Arrival Exp Param'])
+    if event_type == NORMAL_ARRIVAL:  # Normal Patient
+        event_time = clock + data['Variates'].normal_interarrival()
+        future_event_list.push(Event(event_time, event_type, patient))
 
-        new_event = {'Event Type': event_type, 'Event Time': event_time, 'Patient': patient,
-                     'Patient Type': patient_type}
-        future_event_list.append(new_event)
+    elif event_type == URGENT_ARRIVAL:  # Urgent patient
+        event_time = clock + data['Variates'].urgent_interarrival()
+        future_event_list.push(Event(event_time, event_type, patient))
 
-    elif event_type == 'Power On':
+    elif event_type == POWER_ON:
         event_time = clock + 24  # one day of power outage
-
-        new_event = {'Event Type': event_type, 'Event Time': event_time, 'Patient': None}
-        future_event_list.append(new_event)
+        future_event_list.push(Event(event_time, event_type))
 
     else:
-        if event_type == 'Laboratory Arrival':
-            if data['Patients'][patient]['Patient Type'] == 'Normal':
+        if event_type == LABORATORY_ARRIVAL:
+            if data['Patients'].patient_type[patient] == NORMAL:
                 event_time = clock + param['Normal Laboratory Param']
             else:
                 event_time = clock + param['Urgent Laboratory Param']
 
-        elif event_type == 'Laboratory Departure':
+        elif event_type == LABORATORY_DEPARTURE:
             # event_time = clock + uniform((28 / 60), (32 / 60))
-            event_time = clock + uniform(param['After Laboratory Uni a Param'], param['After Laboratory Uni b Param'])
+            event_time = clock + data['Variates'].laboratory_delay()
 
-        elif event_type == 'Operation Arrival':
-            if data['Patients'][patient]['Patient Type'] == 'Normal':
+        elif event_type == OPERATION_ARRIVAL:
+            if data['Patients'].patient_type[patient] == NORMAL:
                 # event_time = clock + 48
                 event_time = clock + param['Normal Operation Param']
             else:
                 # event_time = clock + triangular((5 / 60), (75 / 60), (100 / 60))
-                event_time = clock + triangular(param['Urgent Operation trgl LB Param'],
-                                                param['Urgent Operation trgl M Param'],
-                                                param['Urgent Operation trgl UB Param'])
-
-        elif event_type == 'Operation Departure':
-            if data['Patients'][patient]['Surgery Type'] == 'Simple':
-                # event_time = clock + (10 / 60) + np.random.normal(loc=(30.22 / 60), scale=(math.sqrt(4.96) / 60))
-                event_time = clock + (10 / 60) + np.random.normal(loc=(param['Simple Operation Mean'] / 60),
-                                                                  scale=(param['Simple Operation SD'] / 60))
-            elif data['Patients'][patient]['Surgery Type'] == 'Medium':
-                # event_time = clock + (10 / 60) + np.random.normal(loc=(74.54 / 60), scale=(math.sqrt(9.53) / 60))
-                event_time = clock + (10 / 60) + np.random.normal(loc=(param['Medium Operation Mean'] / 60),
-                                                                  scale=(param['Medium Operation SD'] / 60))
-            else:
-                # event_time = clock + (10 / 60) + np.random.normal(loc=(242.03 / 60), scale=(math.sqrt(63.27) / 60))
-                event_time = clock + (10 / 60) + np.random.normal(loc=(param['Complex Operation Mean'] / 60),
-                                                                  scale=(param['Complex Operation SD'] / 60))
+                event_time = clock + data['Variates'].urgent_operation_delay()
 
-        elif event_type == 'Condition Deterioration':
+        elif event_type == OPERATION_DEPARTURE:
+            # 10 minutes of preparation + a normal surgery duration, e.g. N(30.22 / 60, 4.96 / 60) for a simple surgery
+            event_time = clock + (10 / 60) + data['Variates'].surgery_duration[data['Patients'].surgery_type[patient]]()
+
+        elif event_type == CONDITION_DETERIORATION:
             event_time = clock
 
-        elif event_type == 'Care Unit Departure':
+        elif event_type == CARE_UNIT_DEPARTURE:
             # event_time = clock + exponential(25)
-            event_time = clock + exponential(param['Care Unit Exp Param'])
+            event_time = clock + data['Variates'].care_unit_los()
 
-        elif event_type == 'End of Service':
+        elif event_type == END_OF_SERVICE:
             # event_time = clock + exponential(50)
-            event_time = clock + exponential(param['End of Service Exp Param'])
+            event_time = clock + data['Variates'].ward_los()
 
-        new_event = {'Event Type': event_type, 'Event Time': event_time, 'Patient': patient}
-        future_event_list.append(new_event)
+        future_event_list.push(Event(event_time, event_type, patient))
 
 
 def arrival(future_event_list, state, param, clock, data, patient, patient_type):
-    warm_up_time = 5400
-    if patient_type == 'Normal':  # Normal Patient
-        data['Patients'][patient] = dict()
-        data['Patients'][patient]['Arrival Time'] = clock  # track every move of this patient
-        data['Patients'][patient]['Patient Type'] = 'Normal'
-
-        crn = random.random()
-        if crn <= 0.5:  # Simple Surgery
-            data['Patients'][patient]['Surgery Type'] = 'Simple'
-        elif 0.5 < crn <= 0.95:  # Medium Surgery
-            data['Patients'][patient]['Surgery Type'] = 'Medium'
+    if patient_type == NORMAL:  # Normal Patient
+        data['Patients'].add(patient, clock, NORMAL)  # track every move of this patient
+
+        surgery_type = data['Variates'].surgery_type()
+        if surgery_type == SIMPLE:  # Simple Surgery
+            data['Patients'].surgery_type[patient] = SIMPLE
+        elif surgery_type == MEDIUM:  # Medium Surgery
+            data['Patients'].surgery_type[patient] = MEDIUM
         else:  # Complex Surgery
-            data['Patients'][patient]['Surgery Type'] = 'Complex'
+            data['Patients'].surgery_type[patient] = COMPLEX
 
             # Update number of 'Patients With Complex Surgery'
             data['Cumulative Stats']['Patients With Complex Surgery'] += 1
@@ -321,6 +391,8 @@ def arrival(future_event_list, state, param, clock, data, patient, patient_type)
             data['Cumulative Stats']['Preoperative Server Busy Time'] += \
                 (clock - data['Last Time Preoperative Occupied Beds Changed']) * (state['Preoperative Occupied Beds']
                                                                                   / param['Preoperative Capacity'])
+            data['Preoperative Occupancy Histogram'].add(
+                state['Preoperative Occupied Beds'], clock - data['Last Time Preoperative Occupied Beds Changed'])
 
             # Update Occupied Beds
             state['Preoperative Occupied Beds'] += 1
@@ -329,65 +401,50 @@ def arrival(future_event_list, state, param, clock, data, patient, patient_type)
 
             # Someone just started getting service. Update 'Service Starters' (Needed to calculate Wq)
             data['Cumulative Stats']['Preoperative Service Starters'] += 1
-            data['Patients'][patient]['Time Preoperative Service Begins'] = clock  # track "every move" of this patient
-
-            # Calculation for warm period
-            if clock >= warm_up_time:
-                data['Cumulative Stats']['Preoperative Service Starters(warm period)'] += 1
+            data['Patients'].preoperative_service_begins[patient] = clock  # track "every move" of this patient
 
-            fel_maker(future_event_list, 'Laboratory Arrival', clock, data, param, patient)
+            fel_maker(future_event_list, LABORATORY_ARRIVAL, clock, data, param, patient)
 
         else:  # there is no empty bed -> wait in queue
             # Queue length changes, so calculate the area under the current rectangle
             data['Cumulative Stats']['Area Under Preoperative Queue Length Curve'] += \
                 (clock - data['Last Time Preoperative Queue Length Changed']) * (state['Preoperative Queue'])
-
-            # Calculation for warm period
-            if clock >= warm_up_time:
-                if data['Last Time Preoperative Queue Length Changed'] >= warm_up_time:
-                    data['Cumulative Stats']['Area Under Preoperative Queue Length Curve(warm period)'] += \
-                        (clock - data['Last Time Preoperative Queue Length Changed']) * (state['Preoperative Queue'])
-                else:
-                    data['Cumulative Stats']['Area Under Preoperative Queue Length Curve(warm period)'] += \
-                        (clock - warm_up_time) * (state['Preoperative Queue'])
+            data['Preoperative Queue Length Histogram'].add(
+                state['Preoperative Queue'], clock - data['Last Time Preoperative Queue Length Changed'])
 
             # Track preoperative queue length
             data['preoperative_queue_tracker'][data['Last Time Preoperative Queue Length Changed']] = \
                 state['Preoperative Queue']
             state['Preoperative Queue'] += 1
-            data['Preoperative Queue Patients'][patient] = clock  # add this patient to the queue
-            data['Preoperative Queue Lengths'][clock] = state['Preoperative Queue']  # Save queue length
+            data['Preoperative Queue Patients'].append(patient)  # add this patient to the end of the queue
+            data['Preoperative Queue Lengths'].add(clock, state['Preoperative Queue'])  # Save queue length
 
             # Queue length just changed. Update 'Last Time Queue Length Changed'
             data['Last Time Preoperative Queue Length Changed'] = clock
 
-        next_patient = 'P' + str(int(patient[1:]) + 1)
-        if random.random() <= 0.75:
-            fel_maker(future_event_list, 'Arrival', clock, data, param, next_patient, 'Normal')
-        else:
-            fel_maker(future_event_list, 'Arrival', clock, data, param, next_patient, 'Urgent')
+        next_patient = patient + 1
+        fel_maker(future_event_list, data['Variates'].next_arrival(), clock, data, param, next_patient)
 
     else:  # Urgent Patient
-        if random.random() >= 0.005:  # if it's single entry
+        group_size = data['Variates'].group_size()
+        if group_size == 1:  # if it's single entry
 
             if state['Emergency Queue'] == param['Emergency Queue Capacity']:  # if the queue is full
                 pass  # patient refusal
 
             else:  # the queue is not full
-                data['Patients'][patient] = dict()
-                data['Patients'][patient]['Arrival Time'] = clock  # track every move of this patient
-                data['Patients'][patient]['Patient Type'] = 'Urgent'
+                data['Patients'].add(patient, clock, URGENT)  # track every move of this patient
 
                 # Update number of 'Emergency Patients'
                 data['Cumulative Stats']['Emergency Patients'] += 1
 
-                crn = random.random()
-                if crn <= 0.5:  # Simple Surgery
-                    data['Patients'][patient]['Surgery Type'] = 'Simple'
-                elif 0.5 < crn <= 0.95:  # Medium Surgery
-                    data['Patients'][patient]['Surgery Type'] = 'Medium'
+                surgery_type = data['Variates'].surgery_type()
+                if surgery_type == SIMPLE:  # Simple Surgery
+                    data['Patients'].surgery_type[patient] = SIMPLE
+                elif surgery_type == MEDIUM:  # Medium Surgery
+                    data['Patients'].surgery_type[patient] = MEDIUM
                 else:  # Complex Surgery
-                    data['Patients'][patient]['Surgery Type'] = 'Complex'
+                    data['Patients'].surgery_type[patient] = COMPLEX
 
                     # Update number of 'Patients With Complex Surgery'
                     data['Cumulative Stats']['Patients With Complex Surgery'] += 1
@@ -397,10 +454,12 @@ def arrival(future_event_list, state, param, clock, data, patient, patient_type)
                     # Queue length changes, so calculate the area under the current rectangle
                     data['Cumulative Stats']['Area Under Emergency Queue Length Curve'] += \
                         (clock - data['Last Time Emergency Queue Length Changed']) * (state['Emergency Queue'])
+                    data['Emergency Queue Length Histogram'].add(
+                        state['Emergency Queue'], clock - data['Last Time Emergency Queue Length Changed'])
 
                     state['Emergency Queue'] += 1
-                    data['Emergency Queue Patients'][patient] = clock  # add this patient to the queue
-                    data['Emergency Queue Lengths'][clock] = state['Emergency Queue']  # Save queue length
+                    data['Emergency Queue Patients'].append(patient)  # add this patient to the end of the queue
+                    data['Emergency Queue Lengths'].add(clock, state['Emergency Queue'])  # Save queue length
 
                     # Queue length just changed. Update 'Last Time Queue Length Changed'
                     data['Last Time Emergency Queue Length Changed'] = clock
@@ -410,6 +469,8 @@ def arrival(future_event_list, state, param, clock, data, patient, patient_type)
                     data['Cumulative Stats']['Emergency Server Busy Time'] += \
                         ((clock - data['Last Time Emergency Occupied Beds Changed']) *
                          (state['Emergency Occupied Beds'] / param['Emergency Capacity']))
+                    data['Emergency Occupancy Histogram'].add(
+                        state['Emergency Occupied Beds'], clock - data['Last Time Emergency Occupied Beds Changed'])
 
                     # Update Occupied Beds
                     state['Emergency Occupied Beds'] += 1
@@ -418,34 +479,27 @@ def arrival(future_event_list, state, param, clock, data, patient, patient_type)
                     # Someone just started getting service. Update 'Service Starters' (Needed to calculate Wq)
                     data['Cumulative Stats']['Emergency Service Starters'] += 1
                     # print('a')
-                    data['Patients'][patient][
-                        'Time Emergency Service Begins'] = clock  # track "every move" of this patient
+                    data['Patients'].emergency_service_begins[patient] = clock  # track "every move" of this patient
 
                     # Update number of 'Number of Immediately Admitted Emergency Patients'
                     data['Cumulative Stats']['Number of Immediately Admitted Emergency Patients'] += 1
 
-                    fel_maker(future_event_list, 'Laboratory Arrival', clock, data, param, patient)
+                    fel_maker(future_event_list, LABORATORY_ARRIVAL, clock, data, param, patient)
 
-            next_patient = 'P' + str(int(patient[1:]) + 1)
-            if random.random() <= 0.75:
-                fel_maker(future_event_list, 'Arrival', clock, data, param, next_patient, 'Normal')
-            else:
-                fel_maker(future_event_list, 'Arrival', clock, data, param, next_patient, 'Urgent')
+            next_patient = patient + 1
+            fel_maker(future_event_list, data['Variates'].next_arrival(), clock, data, param, next_patient)
 
         else:  # it's group entry
             epsilon = 1e-10
-            GroupNumber = random.randint(2, 5)
+            GroupNumber = group_size
 
             if (param['Emergency Capacity'] - state[
                 'Emergency Occupied Beds']) >= GroupNumber:  # if there are enough empty beds
                 for i in range(GroupNumber):
-                    data['Patients']['P' + str(int(patient[1:]) + i)] = dict()
                     # track every move of this patient
-                    data['Patients']['P' + str(int(patient[1:]) + i)]['Arrival Time'] = clock + (i * epsilon)
-                    data['Patients']['P' + str(int(patient[1:]) + i)]['Patient Type'] = 'Urgent'
+                    data['Patients'].add(patient + i, clock + (i * epsilon), URGENT)
                     # track "every move" of this patient
-                    data['Patients']['P' + str(int(patient[1:]) + i)]['Time Emergency Service Begins'] = \
-                        clock + (i * epsilon)
+                    data['Patients'].emergency_service_begins[patient + i] = clock + (i * epsilon)
 
                     # Update number of 'Emergency Patients'
                     data['Cumulative Stats']['Emergency Patients'] += 1
@@ -453,13 +507,13 @@ def arrival(future_event_list, state, param, clock, data, patient, patient_type)
                     # Update number of 'Number of Immediately Admitted Emergency Patients'
                     data['Cumulative Stats']['Number of Immediately Admitted Emergency Patients'] += 1
 
-                    crn = random.random()
-                    if crn <= 0.5:  # Simple Surgery
-                        data['Patients']['P' + str(int(patient[1:]) + i)]['Surgery Type'] = 'Simple'
-                    elif 0.5 < crn <= 0.95:  # Medium Surgery
-                        data['Patients']['P' + str(int(patient[1:]) + i)]['Surgery Type'] = 'Medium'
+                    surgery_type = data['Variates'].surgery_type()
+                    if surgery_type == SIMPLE:  # Simple Surgery
+                        data['Patients'].surgery_type[patient + i] = SIMPLE
+                    elif surgery_type == MEDIUM:  # Medium Surgery
+                        data['Patients'].surgery_type[patient + i] = MEDIUM
                     else:  # Complex Surgery
-                        data['Patients']['P' + str(int(patient[1:]) + i)]['Surgery Type'] = 'Complex'
+                        data['Patients'].surgery_type[patient + i] = COMPLEX
 
                         # Update number of 'Patients With Complex Surgery'
                         data['Cumulative Stats']['Patients With Complex Surgery'] += 1
@@ -468,6 +522,8 @@ def arrival(future_event_list, state, param, clock, data, patient, patient_type)
                     data['Cumulative Stats']['Emergency Server Busy Time'] += \
                         ((clock - data['Last Time Emergency Occupied Beds Changed']) *
                          (state['Emergency Occupied Beds'] / param['Emergency Capacity']))
+                    data['Emergency Occupancy Histogram'].add(
+                        state['Emergency Occupied Beds'], clock - data['Last Time Emergency Occupied Beds Changed'])
 
                     # Update Occupied Beds
                     state['Emergency Occupied Beds'] += 1
@@ -477,26 +533,25 @@ def arrival(future_event_list, state, param, clock, data, patient, patient_type)
                     data['Cumulative Stats']['Emergency Service Starters'] += 1
                     # print('b')
 
-                    fel_maker(future_event_list, 'Laboratory Arrival', clock + (i * epsilon), data, param,
-                              'P' + str(int(patient[1:]) + i))
+                    fel_maker(future_event_list, LABORATORY_ARRIVAL, clock + (i * epsilon), data, param,
+                              patient + i)
 
-            next_patient = 'P' + str(int(patient[1:]) + GroupNumber)
-            if random.random() <= 0.75:
-                fel_maker(future_event_list, 'Arrival', clock, data, param, next_patient, 'Normal')
-            else:
-                fel_maker(future_event_list, 'Arrival', clock, data, param, next_patient, 'Urgent')
+            next_patient = patient + GroupNumber
+            fel_maker(future_event_list, data['Variates'].next_arrival(), clock, data, param, next_patient)
 
 
 def laboratory_arrival(future_event_list, state, param, clock, data, patient):
-    data['Patients'][patient]['Laboratory Arrival Time'] = clock  # track every move of this patient
+    data['Patients'].laboratory_arrival_time[patient] = clock  # track every move of this patient
 
-    if data['Patients'][patient]['Patient Type'] == 'Normal':  # if the patient is normal
+    if data['Patients'].patient_type[patient] == NORMAL:  # if the patient is normal
 
         if state['Laboratory Occupied Beds'] < param['Laboratory Capacity']:  # if there is an empty bed
             # Occupied Beds changes, so calculate Server busy time
             data['Cumulative Stats']['Laboratory Server Busy Time'] += \
                 ((clock - data['Last Time Laboratory Occupied Beds Changed']) *
                  (state['Laboratory Occupied Beds'] / param['Laboratory Capacity']))
+            data['Laboratory Occupancy Histogram'].add(
+                state['Laboratory Occupied Beds'], clock - data['Last Time Laboratory Occupied Beds Changed'])
 
             # Update Occupied Beds
             state['Laboratory Occupied Beds'] += 1
@@ -504,17 +559,19 @@ def laboratory_arrival(future_event_list, state, param, clock, data, patient):
             data['Last Time Laboratory Occupied Beds Changed'] = clock
             # Someone just started getting service. Update 'Service Starters' (Needed to calculate Wq)
             data['Cumulative Stats']['Laboratory Normal Service Starters'] += 1
-            data['Patients'][patient]['Time Laboratory Service Begins'] = clock  # track "every move" of this patient
-            fel_maker(future_event_list, 'Laboratory Departure', clock, data, param, patient)
+            data['Patients'].laboratory_service_begins[patient] = clock  # track "every move" of this patient
+            fel_maker(future_event_list, LABORATORY_DEPARTURE, clock, data, param, patient)
 
         else:  # there is no empty bed -> wait in queue
             # Queue length changes, so calculate the area under the current rectangle
             data['Cumulative Stats']['Area Under Laboratory Normal Queue Length Curve'] += \
                 (clock - data['Last Time Laboratory Normal Queue Length Changed']) * (state['Laboratory Normal Queue'])
+            data['Laboratory Normal Queue Length Histogram'].add(
+                state['Laboratory Normal Queue'], clock - data['Last Time Laboratory Normal Queue Length Changed'])
 
             state['Laboratory Normal Queue'] += 1
-            data['Laboratory Normal Queue Patients'][patient] = clock  # add this patient to the queue
-            data['Laboratory Normal Queue Lengths'][clock] = state['Laboratory Normal Queue']  # Save queue length
+            data['Laboratory Normal Queue Patients'].append(patient)  # add this patient to the end of the queue
+            data['Laboratory Normal Queue Lengths'].add(clock, state['Laboratory Normal Queue'])  # Save queue length
 
             # Queue length just changed. Update 'Last Time Queue Length Changed'
             data['Last Time Laboratory Normal Queue Length Changed'] = clock
@@ -526,6 +583,8 @@ def laboratory_arrival(future_event_list, state, param, clock, data, patient):
             data['Cumulative Stats']['Laboratory Server Busy Time'] += \
                 ((clock - data['Last Time Laboratory Occupied Beds Changed']) *
                  (state['Laboratory Occupied Beds'] / param['Laboratory Capacity']))
+            data['Laboratory Occupancy Histogram'].add(
+                state['Laboratory Occupied Beds'], clock - data['Last Time Laboratory Occupied Beds Changed'])
 
             # Update Occupied Beds
             state['Laboratory Occupied Beds'] += 1
@@ -533,24 +592,26 @@ def laboratory_arrival(future_event_list, state, param, clock, data, patient):
             data['Last Time Laboratory Occupied Beds Changed'] = clock
             # Someone just started getting service. Update 'Service Starters' (Needed to calculate Wq)
             data['Cumulative Stats']['Laboratory Urgent Service Starters'] += 1
-            data['Patients'][patient]['Time Laboratory Service Begins'] = clock  # track "every move" of this patient
-            fel_maker(future_event_list, 'Laboratory Departure', clock, data, param, patient)
+            data['Patients'].laboratory_service_begins[patient] = clock  # track "every move" of this patient
+            fel_maker(future_event_list, LABORATORY_DEPARTURE, clock, data, param, patient)
 
         else:  # if there is no empty bed -> wait in queue
             # Queue length changes, so calculate the area under the current rectangle
             data['Cumulative Stats']['Area Under Laboratory Urgent Queue Length Curve'] += \
                 (clock - data['Last Time Laboratory Urgent Queue Length Changed']) * (state['Laboratory Urgent Queue'])
+            data['Laboratory Urgent Queue Length Histogram'].add(
+                state['Laboratory Urgent Queue'], clock - data['Last Time Laboratory Urgent Queue Length Changed'])
 
             state['Laboratory Urgent Queue'] += 1
-            data['Laboratory Urgent Queue Patients'][patient] = clock  # add this patient to the queue
-            data['Laboratory Urgent Queue Lengths'][clock] = state['Laboratory Urgent Queue']  # Save queue length
+            data['Laboratory Urgent Queue Patients'].append(patient)  # add this patient to the end of the queue
+            data['Laboratory Urgent Queue Lengths'].add(clock, state['Laboratory Urgent Queue'])  # Save queue length
 
             # Queue length just changed. Update 'Last Time Queue Length Changed'
             data['Last Time Laboratory Urgent Queue Length Changed'] = clock
 
 
 def laboratory_departure(future_event_list, state, param, clock, data, patient):
-    fel_maker(future_event_list, 'Operation Arrival', clock, data, param, patient)
+    fel_maker(future_event_list, OPERATION_ARRIVAL, clock, data, param, patient)
 
     if state['Laboratory Urgent Queue'] == 0:  # if there is no urgent patient in the queue
 
@@ -559,6 +620,8 @@ def laboratory_departure(future_event_list, state, param, clock, data, patient):
             data['Cumulative Stats']['Laboratory Server Busy Time'] += \
                 ((clock - data['Last Time Laboratory Occupied Beds Changed']) *
                  (state['Laboratory Occupied Beds'] / param['Laboratory Capacity']))
+            data['Laboratory Occupancy Histogram'].add(
+                state['Laboratory Occupied Beds'], clock - data['Last Time Laboratory Occupied Beds Changed'])
 
             # Update Occupied Beds
             state['Laboratory Occupied Beds'] -= 1
@@ -569,85 +632,85 @@ def laboratory_departure(future_event_list, state, param, clock, data, patient):
             # Queue length changes, so calculate the area under the current rectangle
             data['Cumulative Stats']['Area Under Laboratory Normal Queue Length Curve'] += \
                 (clock - data['Last Time Laboratory Normal Queue Length Changed']) * (state['Laboratory Normal Queue'])
+            data['Laboratory Normal Queue Length Histogram'].add(
+                state['Laboratory Normal Queue'], clock - data['Last Time Laboratory Normal Queue Length Changed'])
 
             state['Laboratory Normal Queue'] -= 1
-            data['Laboratory Normal Queue Lengths'][clock] = state['Laboratory Normal Queue']  # Save queue length
+            data['Laboratory Normal Queue Lengths'].add(clock, state['Laboratory Normal Queue'])  # Save queue length
 
             # Queue length just changed. Update 'Last Time Queue Length Changed'
             data['Last Time Laboratory Normal Queue Length Changed'] = clock
 
             # Who is going to get served first?
-            first_patient_in_queue = min(data['Laboratory Normal Queue Patients'],
-                                         key=data['Laboratory Normal Queue Patients'].get)
-            data['Laboratory Normal Queue Patients'].pop(first_patient_in_queue, None)
+            first_patient_in_queue = data['Laboratory Normal Queue Patients'].popleft()
 
             # Someone just started getting service. Update 'Service Starters' (Needed to calculate Wq)
             data['Cumulative Stats']['Laboratory Normal Service Starters'] += 1
-            data['Patients'][first_patient_in_queue][
-                'Time Laboratory Service Begins'] = clock  # track "every move" of this patient
+            # track "every move" of this patient
+            data['Patients'].laboratory_service_begins[first_patient_in_queue] = clock
 
             # Update queue waiting time
             data['Cumulative Stats']['Laboratory Normal Queue Waiting Time'] += \
-                (data['Patients'][first_patient_in_queue]['Time Laboratory Service Begins'] -
-                 data['Patients'][first_patient_in_queue]['Laboratory Arrival Time'])
+                (data['Patients'].laboratory_service_begins[first_patient_in_queue] -
+                 data['Patients'].laboratory_arrival_time[first_patient_in_queue])
 
             # Save the waiting time
-            data['Laboratory Normal Queue Waiting Times'][first_patient_in_queue] = (
-                    data['Patients'][first_patient_in_queue]['Time Laboratory Service Begins'] -
-                    data['Patients'][first_patient_in_queue]['Laboratory Arrival Time'])
+            data['Laboratory Normal Queue Waiting Times'].add(first_patient_in_queue, (
+                    data['Patients'].laboratory_service_begins[first_patient_in_queue] -
+                    data['Patients'].laboratory_arrival_time[first_patient_in_queue]))
 
             # Schedule 'Laboratory Departure' for this patient
-            fel_maker(future_event_list, 'Laboratory Departure', clock, data, param, first_patient_in_queue)
+            fel_maker(future_event_list, LABORATORY_DEPARTURE, clock, data, param, first_patient_in_queue)
 
     else:  # there is at least one urgent patient in the queue
         # Queue length changes, so calculate the area under the current rectangle
         data['Cumulative Stats']['Area Under Laboratory Urgent Queue Length Curve'] += \
             (clock - data['Last Time Laboratory Urgent Queue Length Changed']) * (state['Laboratory Urgent Queue'])
+        data['Laboratory Urgent Queue Length Histogram'].add(
+            state['Laboratory Urgent Queue'], clock - data['Last Time Laboratory Urgent Queue Length Changed'])
 
         state['Laboratory Urgent Queue'] -= 1
-        data['Laboratory Urgent Queue Lengths'][clock] = state['Laboratory Urgent Queue']  # Save queue length
+        data['Laboratory Urgent Queue Lengths'].add(clock, state['Laboratory Urgent Queue'])  # Save queue length
 
         # Queue length just changed. Update 'Last Time Queue Length Changed'
         data['Last Time Laboratory Urgent Queue Length Changed'] = clock
 
         # Who is going to get served first?
-        first_patient_in_queue = min(data['Laboratory Urgent Queue Patients'],
-                                     key=data['Laboratory Urgent Queue Patients'].get)
-        data['Laboratory Urgent Queue Patients'].pop(first_patient_in_queue, None)
+        first_patient_in_queue = data['Laboratory Urgent Queue Patients'].popleft()
 
         # Someone just started getting service. Update 'Service Starters' (Needed to calculate Wq)
         data['Cumulative Stats']['Laboratory Urgent Service Starters'] += 1
-        data['Patients'][first_patient_in_queue][
-            'Time Laboratory Service Begins'] = clock  # track "every move" of this patient
+        data['Patients'].laboratory_service_begins[first_patient_in_queue] = clock  # track "every move" of this patient
 
         # Update queue waiting time
         data['Cumulative Stats']['Laboratory Urgent Queue Waiting Time'] += \
-            (data['Patients'][first_patient_in_queue]['Time Laboratory Service Begins'] -
-             data['Patients'][first_patient_in_queue]['Laboratory Arrival Time'])
+            (data['Patients'].laboratory_service_begins[first_patient_in_queue] -
+             data['Patients'].laboratory_arrival_time[first_patient_in_queue])
 
         # Save the waiting time
-        data['Laboratory Urgent Queue Waiting Times'][first_patient_in_queue] = (
-                data['Patients'][first_patient_in_queue]['Time Laboratory Service Begins'] -
-                data['Patients'][first_patient_in_queue]['Laboratory Arrival Time'])
+        data['Laboratory Urgent Queue Waiting Times'].add(first_patient_in_queue, (
+                data['Patients'].laboratory_service_begins[first_patient_in_queue] -
+                data['Patients'].laboratory_arrival_time[first_patient_in_queue]))
 
         # Schedule 'Laboratory Departure' for this patient
-        fel_maker(future_event_list, 'Laboratory Departure', clock, data, param, first_patient_in_queue)
+        fel_maker(future_event_list, LABORATORY_DEPARTURE, clock, data, param, first_patient_in_queue)
 
 
 def operation_arrival(future_event_list, state, param, clock, data, patient):
-    warm_up_time = 5400
-    data['Patients'][patient]['Operation Arrival Time'] = clock  # track every move of this patient
+    data['Patients'].operation_arrival_time[patient] = clock  # track every move of this patient
 
-    if data['Patients'][patient]['Patient Type'] == 'Normal':  # if the patient is normal
+    if data['Patients'].patient_type[patient] == NORMAL:  # if the patient is normal
 
         if state['Operation Occupied Beds'] == param['Operation Capacity']:  # if there is no empty bed
             # Queue length changes, so calculate the area under the current rectangle
-            data['Cumulative Stats']['Area Under Surgery Normal Queue Length Curve'] += \
+            data['Cumulative Stats']['Area Under Operation Normal Queue Length Curve'] += \
                 (clock - data['Last Time Surgery Normal Queue Length Changed']) * (state['Surgery Normal Queue'])
+            data['Surgery Normal Queue Length Histogram'].add(
+                state['Surgery Normal Queue'], clock - data['Last Time Surgery Normal Queue Length Changed'])
 
             state['Surgery Normal Queue'] += 1
-            data['Surgery Normal Queue Patients'][patient] = clock  # add this patient to the queue
-            data['Operation Normal Queue Lengths'][clock] = state['Surgery Normal Queue']  # Save queue length
+            data['Surgery Normal Queue Patients'].append(patient)  # add this patient to the end of the queue
+            data['Operation Normal Queue Lengths'].add(clock, state['Surgery Normal Queue'])  # Save queue length
 
             # Queue length just changed. Update 'Last Time Queue Length Changed'
             data['Last Time Surgery Normal Queue Length Changed'] = clock
@@ -657,6 +720,8 @@ def operation_arrival(future_event_list, state, param, clock, data, patient):
             data['Cumulative Stats']['Operation Server Busy Time'] += \
                 ((clock - data['Last Time Operation Occupied Beds Changed']) *
                  (state['Operation Occupied Beds'] / param['Operation Capacity']))
+            data['Operation Occupancy Histogram'].add(
+                state['Operation Occupied Beds'], clock - data['Last Time Operation Occupied Beds Changed'])
 
             # Update Occupied Beds
             state['Operation Occupied Beds'] += 1
@@ -664,15 +729,17 @@ def operation_arrival(future_event_list, state, param, clock, data, patient):
             data['Last Time Operation Occupied Beds Changed'] = clock
             # Someone just started getting service. Update 'Service Starters' (Needed to calculate Wq)
             data['Cumulative Stats']['Operation Normal Service Starters'] += 1
-            data['Patients'][patient]['Time Operation Service Begins'] = clock  # track "every move" of this patient
+            data['Patients'].operation_service_begins[patient] = clock  # track "every move" of this patient
 
-            fel_maker(future_event_list, 'Operation Departure', clock, data, param, patient)
+            fel_maker(future_event_list, OPERATION_DEPARTURE, clock, data, param, patient)
 
             if state['Preoperative Queue'] == 0:  # if there is no patient in the preoperative queue
                 # Occupied Beds changes, so calculate Server busy time
                 data['Cumulative Stats']['Preoperative Server Busy Time'] += \
                     ((clock - data['Last Time Preoperative Occupied Beds Changed']) *
                      (state['Preoperative Occupied Beds'] / param['Preoperative Capacity']))
+                data['Preoperative Occupancy Histogram'].add(
+                    state['Preoperative Occupied Beds'], clock - data['Last Time Preoperative Occupied Beds Changed'])
 
                 # Update Occupied Beds
                 state['Preoperative Occupied Beds'] -= 1
@@ -683,72 +750,51 @@ def operation_arrival(future_event_list, state, param, clock, data, patient):
                 # Queue length changes, so calculate the area under the current rectangle
                 data['Cumulative Stats']['Area Under Preoperative Queue Length Curve'] += \
                     (clock - data['Last Time Preoperative Queue Length Changed']) * (state['Preoperative Queue'])
-
-                # Calculation for warm period
-                if clock >= warm_up_time:
-                    if data['Last Time Preoperative Queue Length Changed'] >= warm_up_time:
-                        data['Cumulative Stats']['Area Under Preoperative Queue Length Curve(warm period)'] += \
-                            (clock - data['Last Time Preoperative Queue Length Changed']) * (
-                            state['Preoperative Queue'])
-                    else:
-                        data['Cumulative Stats']['Area Under Preoperative Queue Length Curve(warm period)'] += \
-                            (clock - warm_up_time) * (state['Preoperative Queue'])
+                data['Preoperative Queue Length Histogram'].add(
+                    state['Preoperative Queue'], clock - data['Last Time Preoperative Queue Length Changed'])
 
                 # Track preoperative queue length
                 data['preoperative_queue_tracker'][data['Last Time Preoperative Queue Length Changed']] = state[
                     'Preoperative Queue']
                 state['Preoperative Queue'] -= 1
-                data['Preoperative Queue Lengths'][clock] = state['Preoperative Queue']  # Save queue length
+                data['Preoperative Queue Lengths'].add(clock, state['Preoperative Queue'])  # Save queue length
 
                 # Queue length just changed. Update 'Last Time Queue Length Changed'
                 data['Last Time Preoperative Queue Length Changed'] = clock
 
                 # Who is going to get served first?
-                first_patient_in_queue = min(data['Preoperative Queue Patients'],
-                                             key=data['Preoperative Queue Patients'].get)
-                data['Preoperative Queue Patients'].pop(first_patient_in_queue, None)
+                first_patient_in_queue = data['Preoperative Queue Patients'].popleft()
 
                 # Someone just started getting service. Update 'Service Starters' (Needed to calculate Wq)
                 data['Cumulative Stats']['Preoperative Service Starters'] += 1
-                data['Patients'][first_patient_in_queue][
-                    'Time Preoperative Service Begins'] = clock  # track "every move" of this patient
+                # track "every move" of this patient
+                data['Patients'].preoperative_service_begins[first_patient_in_queue] = clock
 
                 # Update queue waiting time
                 data['Cumulative Stats']['Preoperative Queue Waiting Time'] += \
-                    (data['Patients'][first_patient_in_queue]['Time Preoperative Service Begins'] -
-                     data['Patients'][first_patient_in_queue]['Arrival Time'])
-
-                # Calculation for warm period
-                if data['Patients'][first_patient_in_queue]['Time Preoperative Service Begins'] >= warm_up_time:
-                    # Calculation for warm period
-                    data['Cumulative Stats']['Preoperative Service Starters(warm period)'] += 1
-                    if data['Patients'][first_patient_in_queue]['Arrival Time'] >= warm_up_time:
-                        data['Cumulative Stats']['Preoperative Queue Waiting Time(warm period)'] += \
-                            (data['Patients'][first_patient_in_queue]['Time Preoperative Service Begins'] -
-                             data['Patients'][first_patient_in_queue]['Arrival Time'])
-                    else:
-                        data['Cumulative Stats']['Preoperative Queue Waiting Time(warm period)'] += \
-                            (data['Patients'][first_patient_in_queue]['Time Preoperative Service Begins'] -
-                             warm_up_time)
+                    (data['Patients'].preoperative_service_begins[first_patient_in_queue] -
+                     data['Patients'].arrival_time[first_patient_in_queue])
 
                 # Save the waiting time
-                data['Preoperative Queue Waiting Times'][first_patient_in_queue] = (
-                        data['Patients'][first_patient_in_queue]['Time Preoperative Service Begins'] -
-                        data['Patients'][first_patient_in_queue]['Arrival Time'])
+                data['Preoperative Queue Waiting Times'].add(first_patient_in_queue, (
+                        data['Patients'].preoperative_service_begins[first_patient_in_queue] -
+                        data['Patients'].arrival_time[first_patient_in_queue]))
 
                 # Schedule 'Laboratory Arrival' for this patient
-                fel_maker(future_event_list, 'Laboratory Arrival', clock, data, param, first_patient_in_queue)
+                fel_maker(future_event_list, LABORATORY_ARRIVAL, clock, data, param, first_patient_in_queue)
 
     else:  # the patient is urgent
 
         if state['Operation Occupied Beds'] == param['Operation Capacity']:  # if there is no empty bed
             # Queue length changes, so calculate the area under the current rectangle
-            data['Cumulative Stats']['Area Under Surgery Urgent Queue Length Curve'] += \
+            data['Cumulative Stats']['Area Under Operation Urgent Queue Length Curve'] += \
                 (clock - data['Last Time Surgery Urgent Queue Length Changed']) * (state['Surgery Urgent Queue'])
+            data['Surgery Urgent Queue Length Histogram'].add(
+                state['Surgery Urgent Queue'], clock - data['Last Time Surgery Urgent Queue Length Changed'])
 
             state['Surgery Urgent Queue'] += 1
-            data['Surgery Urgent Queue Patients'][patient] = clock  # add this patient to the queue
-            data['Operation Urgent Queue Lengths'][clock] = state['Surgery Urgent Queue']  # Save queue length
+            data['Surgery Urgent Queue Patients'].append(patient)  # add this patient to the end of the queue
+            data['Operation Urgent Queue Lengths'].add(clock, state['Surgery Urgent Queue'])  # Save queue length
 
             # Queue length just changed. Update 'Last Time Queue Length Changed'
             data['Last Time Surgery Urgent Queue Length Changed'] = clock
@@ -758,6 +804,8 @@ def operation_arrival(future_event_list, state, param, clock, data, patient):
             data['Cumulative Stats']['Operation Server Busy Time'] += \
                 (clock - data['Last Time Operation Occupied Beds Changed']) * (
                             state['Operation Occupied Beds'] / param['Operation Capacity'])
+            data['Operation Occupancy Histogram'].add(
+                state['Operation Occupied Beds'], clock - data['Last Time Operation Occupied Beds Changed'])
 
             # Update Occupied Beds
             state['Operation Occupied Beds'] += 1
@@ -765,15 +813,17 @@ def operation_arrival(future_event_list, state, param, clock, data, patient):
             data['Last Time Operation Occupied Beds Changed'] = clock
             # Someone just started getting service. Update 'Service Starters' (Needed to calculate Wq)
             data['Cumulative Stats']['Operation Urgent Service Starters'] += 1
-            data['Patients'][patient]['Time Operation Service Begins'] = clock  # track "every move" of this patient
+            data['Patients'].operation_service_begins[patient] = clock  # track "every move" of this patient
 
-            fel_maker(future_event_list, 'Operation Departure', clock, data, param, patient)
+            fel_maker(future_event_list, OPERATION_DEPARTURE, clock, data, param, patient)
 
             if state['Emergency Queue'] == 0:  # if there is no patient in the emergency queue
                 # Occupied Beds changes, so caculate Server busy time
                 data['Cumulative Stats']['Emergency Server Busy Time'] += \
                     (clock - data['Last Time Emergency Occupied Beds Changed']) * (
                                 state['Emergency Occupied Beds'] / param['Emergency Capacity'])
+                data['Emergency Occupancy Histogram'].add(
+                    state['Emergency Occupied Beds'], clock - data['Last Time Emergency Occupied Beds Changed'])
 
                 # Update Occupied Beds
                 state['Emergency Occupied Beds'] -= 1
@@ -790,97 +840,99 @@ def operation_arrival(future_event_list, state, param, clock, data, patient):
                     # Queue length changes, so calculate the area under the current rectangle
                     data['Cumulative Stats']['Area Under Emergency Queue Length Curve'] += \
                         (clock - data['Last Time Emergency Queue Length Changed']) * (state['Emergency Queue'])
+                    data['Emergency Queue Length Histogram'].add(
+                        state['Emergency Queue'], clock - data['Last Time Emergency Queue Length Changed'])
 
                     state['Emergency Queue'] -= 1
-                    data['Emergency Queue Lengths'][clock] = state['Emergency Queue']  # Save queue length
+                    data['Emergency Queue Lengths'].add(clock, state['Emergency Queue'])  # Save queue length
 
                     # Queue length just changed. Update 'Last Time Queue Length Changed'
                     data['Last Time Emergency Queue Length Changed'] = clock
 
                     # Who is going to get served first?
-                    first_patient_in_queue = min(data['Emergency Queue Patients'],
-                                                 key=data['Emergency Queue Patients'].get)
-                    data['Emergency Queue Patients'].pop(first_patient_in_queue, None)
+                    first_patient_in_queue = data['Emergency Queue Patients'].popleft()
 
                     # Someone just started getting service. Update 'Service Starters' (Needed to calculate Wq)
                     data['Cumulative Stats']['Emergency Service Starters'] += 1
                     # print('c')
-                    data['Patients'][first_patient_in_queue][
-                        'Time Emergency Service Begins'] = clock  # track "every move" of this patient
+                    # track "every move" of this patient
+                    data['Patients'].emergency_service_begins[first_patient_in_queue] = clock
 
                     # Update queue waiting time
                     data['Cumulative Stats']['Emergency Queue Waiting Time'] += \
-                        (data['Patients'][first_patient_in_queue]['Time Emergency Service Begins'] -
-                         data['Patients'][first_patient_in_queue]['Arrival Time'])
+                        (data['Patients'].emergency_service_begins[first_patient_in_queue] -
+                         data['Patients'].arrival_time[first_patient_in_queue])
 
                     # Save the waiting time
-                    data['Emergency Queue Waiting Times'][first_patient_in_queue] = (
-                            data['Patients'][first_patient_in_queue]['Time Emergency Service Begins'] -
-                            data['Patients'][first_patient_in_queue]['Arrival Time'])
+                    data['Emergency Queue Waiting Times'].add(first_patient_in_queue, (
+                            data['Patients'].emergency_service_begins[first_patient_in_queue] -
+                            data['Patients'].arrival_time[first_patient_in_queue]))
 
                     # Check whether the patient is admitted immediately or not
-                    if clock - data['Patients'][first_patient_in_queue]['Arrival Time'] == 0:
+                    if clock - data['Patients'].arrival_time[first_patient_in_queue] == 0:
                         # Update number of 'Number of Immediately Admitted Emergency Patients'
                         data['Cumulative Stats']['Number of Immediately Admitted Emergency Patients'] += 1
 
                     # Schedule 'Laboratory Arrival' for this patient
-                    fel_maker(future_event_list, 'Laboratory Arrival', clock, data, param, first_patient_in_queue)
+                    fel_maker(future_event_list, LABORATORY_ARRIVAL, clock, data, param, first_patient_in_queue)
 
                 else:
                     # Queue length changes, so calculate the area under the current rectangle
                     data['Cumulative Stats']['Area Under Emergency Queue Length Curve'] += \
                         (clock - data['Last Time Emergency Queue Length Changed']) * (state['Emergency Queue'])
+                    data['Emergency Queue Length Histogram'].add(
+                        state['Emergency Queue'], clock - data['Last Time Emergency Queue Length Changed'])
 
                     state['Emergency Queue'] -= 1
-                    data['Emergency Queue Lengths'][clock] = state['Emergency Queue']  # Save queue length
+                    data['Emergency Queue Lengths'].add(clock, state['Emergency Queue'])  # Save queue length
 
                     # Queue length just changed. Update 'Last Time Queue Length Changed'
                     data['Last Time Emergency Queue Length Changed'] = clock
 
                     # Who is going to get served first?
-                    first_patient_in_queue = min(data['Emergency Queue Patients'],
-                                                 key=data['Emergency Queue Patients'].get)
-                    data['Emergency Queue Patients'].pop(first_patient_in_queue, None)
+                    first_patient_in_queue = data['Emergency Queue Patients'].popleft()
 
                     # Someone just started getting service. Update 'Service Starters' (Needed to calculate Wq)
                     data['Cumulative Stats']['Emergency Service Starters'] += 1
                     # print('d')
-                    data['Patients'][first_patient_in_queue][
-                        'Time Emergency Service Begins'] = clock  # track "every move" of this patient
+                    # track "every move" of this patient
+                    data['Patients'].emergency_service_begins[first_patient_in_queue] = clock
 
                     # Update queue waiting time
                     data['Cumulative Stats']['Emergency Queue Waiting Time'] += \
-                        (data['Patients'][first_patient_in_queue]['Time Emergency Service Begins'] -
-                         data['Patients'][first_patient_in_queue]['Arrival Time'])
+                        (data['Patients'].emergency_service_begins[first_patient_in_queue] -
+                         data['Patients'].arrival_time[first_patient_in_queue])
 
                     # Save the waiting time
-                    data['Emergency Queue Waiting Times'][first_patient_in_queue] = (
-                            data['Patients'][first_patient_in_queue]['Time Emergency Service Begins'] -
-                            data['Patients'][first_patient_in_queue]['Arrival Time'])
+                    data['Emergency Queue Waiting Times'].add(first_patient_in_queue, (
+                            data['Patients'].emergency_service_begins[first_patient_in_queue] -
+                            data['Patients'].arrival_time[first_patient_in_queue]))
 
                     # Check whether the patient is admitted immediately or not
-                    if clock - data['Patients'][first_patient_in_queue]["Arrival Time"] == 0:
+                    if clock - data['Patients'].arrival_time[first_patient_in_queue] == 0:
                         # Update number of 'Number of Immediately Admitted Emergency Patients'
                         data['Cumulative Stats']['Number of Immediately Admitted Emergency Patients'] += 1
 
                     # Schedule 'Laboratory Arrival' for this patient
-                    fel_maker(future_event_list, 'Laboratory Arrival', clock, data, param, first_patient_in_queue)
+                    fel_maker(future_event_list, LABORATORY_ARRIVAL, clock, data, param, first_patient_in_queue)
 
 
 def operation_departure(future_event_list, state, param, clock, data, patient):
-    if data['Patients'][patient]['Surgery Type'] == 'Simple':  # if the surgery type is simple
+    if data['Patients'].surgery_type[patient] == SIMPLE:  # if the surgery type is simple
 
-        data['Patients'][patient]['Unit Type'] = 'General Ward'
-        data['Patients'][patient]['General Ward Arrival Time'] = clock  # track every move of this patient
+        data['Patients'].unit_type[patient] = GENERAL_WARD
+        data['Patients'].general_ward_arrival_time[patient] = clock  # track every move of this patient
 
         if state['General Ward Occupied Beds'] == param['General Ward Capacity']:  # if there is no empty bed
             # Queue length changes, so calculate the area under the current rectangle
             data['Cumulative Stats']['Area Under General Ward Queue Length Curve'] += \
                 (clock - data['Last Time General Ward Queue Length Changed']) * (state['General Ward Queue'])
+            data['General Ward Queue Length Histogram'].add(
+                state['General Ward Queue'], clock - data['Last Time General Ward Queue Length Changed'])
 
             state['General Ward Queue'] += 1
-            data['General Ward Queue Patients'][patient] = clock  # add this patient to the queue
-            data['General Ward Queue Lengths'][clock] = state['General Ward Queue']  # Save queue length
+            data['General Ward Queue Patients'].append(patient)  # add this patient to the end of the queue
+            data['General Ward Queue Lengths'].add(clock, state['General Ward Queue'])  # Save queue length
 
             # Queue length just changed. Update 'Last Time Queue Length Changed'
             data['Last Time General Ward Queue Length Changed'] = clock
@@ -890,6 +942,8 @@ def operation_departure(future_event_list, state, param, clock, data, patient):
             data['Cumulative Stats']['General Ward Server Busy Time'] += \
                 ((clock - data['Last Time General Ward Occupied Beds Changed']) *
                  (state['General Ward Occupied Beds'] / param['General Ward Capacity']))
+            data['General Ward Occupancy Histogram'].add(
+                state['General Ward Occupied Beds'], clock - data['Last Time General Ward Occupied Beds Changed'])
 
             # Update Occupied Beds
             state['General Ward Occupied Beds'] += 1
@@ -897,24 +951,26 @@ def operation_departure(future_event_list, state, param, clock, data, patient):
             data['Last Time General Ward Occupied Beds Changed'] = clock
             # Someone just started getting service. Update 'Service Starters' (Needed to calculate Wq)
             data['Cumulative Stats']['General Ward Service Starters'] += 1
-            data['Patients'][patient]['Time General Ward Service Begins'] = clock  # track "every move" of this patient
-            fel_maker(future_event_list, 'End of Service', clock, data, param, patient)
+            data['Patients'].general_ward_service_begins[patient] = clock  # track "every move" of this patient
+            fel_maker(future_event_list, END_OF_SERVICE, clock, data, param, patient)
 
-    elif data['Patients'][patient]['Surgery Type'] == 'Medium':  # if the surgery type is medium
-        crn = random.random()
-        if crn <= 0.7:  # if the patient is sent to the general ward
+    elif data['Patients'].surgery_type[patient] == MEDIUM:  # if the surgery type is medium
+        unit_type = data['Variates'].medium_unit()
+        if unit_type == GENERAL_WARD:  # if the patient is sent to the general ward
 
-            data['Patients'][patient]['Unit Type'] = 'General Ward'
-            data['Patients'][patient]['General Ward Arrival Time'] = clock  # track every move of this patient
+            data['Patients'].unit_type[patient] = GENERAL_WARD
+            data['Patients'].general_ward_arrival_time[patient] = clock  # track every move of this patient
 
             if state['General Ward Occupied Beds'] == param['General Ward Capacity']:  # if there is no empty bed
                 # Queue length changes, so calculate the area under the current rectangle
                 data['Cumulative Stats']['Area Under General Ward Queue Length Curve'] += \
                     (clock - data['Last Time General Ward Queue Length Changed']) * (state['General Ward Queue'])
+                data['General Ward Queue Length Histogram'].add(
+                    state['General Ward Queue'], clock - data['Last Time General Ward Queue Length Changed'])
 
                 state['General Ward Queue'] += 1
-                data['General Ward Queue Patients'][patient] = clock  # add this patient to the queue
-                data['General Ward Queue Lengths'][clock] = state['General Ward Queue']  # Save queue length
+                data['General Ward Queue Patients'].append(patient)  # add this patient to the end of the queue
+                data['General Ward Queue Lengths'].add(clock, state['General Ward Queue'])  # Save queue length
 
                 # Queue length just changed. Update 'Last Time Queue Length Changed'
                 data['Last Time General Ward Queue Length Changed'] = clock
@@ -924,6 +980,8 @@ def operation_departure(future_event_list, state, param, clock, data, patient):
                 data['Cumulative Stats']['General Ward Server Busy Time'] += \
                     ((clock - data['Last Time General Ward Occupied Beds Changed']) *
                      (state['General Ward Occupied Beds'] / param['General Ward Capacity']))
+                data['General Ward Occupancy Histogram'].add(
+                    state['General Ward Occupied Beds'], clock - data['Last Time General Ward Occupied Beds Changed'])
 
                 # Update Occupied Beds
                 state['General Ward Occupied Beds'] += 1
@@ -932,22 +990,24 @@ def operation_departure(future_event_list, state, param, clock, data, patient):
                 # Someone just started getting service. Update 'Service Starters' (Needed to calculate Wq)
                 data['Cumulative Stats']['General Ward Service Starters'] += 1
                 # track "every move" of this patient
-                data['Patients'][patient]['Time General Ward Service Begins'] = clock
-                fel_maker(future_event_list, 'End of Service', clock, data, param, patient)
+                data['Patients'].general_ward_service_begins[patient] = clock
+                fel_maker(future_event_list, END_OF_SERVICE, clock, data, param, patient)
 
-        elif 0.7 < crn <= 0.8:  # if the patient is sent to the ICU
+        elif unit_type == ICU:  # if the patient is sent to the ICU
 
-            data['Patients'][patient]['Unit Type'] = 'ICU'
-            data['Patients'][patient]['ICU Arrival Time'] = clock  # track every move of this patient
+            data['Patients'].unit_type[patient] = ICU
+            data['Patients'].icu_arrival_time[patient] = clock  # track every move of this patient
 
             if len(data['ICU Patients']) >= param['ICU Capacity']:  # if there is no empty bed
                 # Queue length changes, so calculate the area under the current rectangle
                 data['Cumulative Stats']['Area Under ICU Queue Length Curve'] += \
                     (clock - data['Last Time ICU Queue Length Changed']) * (state['ICU Queue'])
+                data['ICU Queue Length Histogram'].add(
+                    state['ICU Queue'], clock - data['Last Time ICU Queue Length Changed'])
 
                 state['ICU Queue'] += 1
-                data['ICU Queue Patients'][patient] = clock  # add this patient to the queue
-                data['ICU Queue Lengths'][clock] = state['ICU Queue']  # Save queue length
+                data['ICU Queue Patients'].append(patient)  # add this patient to the end of the queue
+                data['ICU Queue Lengths'].add(clock, state['ICU Queue'])  # Save queue length
 
                 # Queue length just changed. Update 'Last Time Queue Length Changed'
                 data['Last Time ICU Queue Length Changed'] = clock
@@ -957,31 +1017,37 @@ def operation_departure(future_event_list, state, param, clock, data, patient):
                 data['Cumulative Stats']['ICU Server Busy Time'] += \
                     ((clock - data['Last Time ICU Occupied Beds Changed']) *
                      (state['ICU Occupied Beds'] / param['ICU Capacity']))
-
-                # Update Occupied Beds
-                state['ICU Occupied Beds'] += 1
+                data['ICU Occupancy Histogram'].add(
+                    state['ICU Occupied Beds'], clock - data['Last Time ICU Occupied Beds Changed'])
+                if state['ICU Occupied Beds'] >= param['ICU Capacity']:  # every usable bed is busy
+                    data['Cumulative Stats']['ICU All Beds Busy Time'] += \
+                        clock - data['Last Time ICU Occupied Beds Changed']
+
+                # Update Occupied Beds (the bed set keeps state['ICU Occupied Beds'] in sync)
+                data['ICU Patients'].add(patient)
                 # Occupied Beds just changed. Update 'Last Time Occupied Beds Changed'
                 data['Last Time ICU Occupied Beds Changed'] = clock
-                data['ICU Patients'].append(patient)
                 # Someone just started getting service. Update 'Service Starters' (Needed to calculate Wq)
                 data['Cumulative Stats']['ICU Service Starters'] += 1
-                data['Patients'][patient]['Time ICU Service Begins'] = clock  # track "every move" of this patient
-                fel_maker(future_event_list, 'Care Unit Departure', clock, data, param,
+                data['Patients'].icu_service_begins[patient] = clock  # track "every move" of this patient
+                fel_maker(future_event_list, CARE_UNIT_DEPARTURE, clock, data, param,
                           patient)  # patient discharge from ICU or CCU
 
         else:  # if the patient is sent to the CCU
 
-            data['Patients'][patient]['Unit Type'] = 'CCU'
-            data['Patients'][patient]['CCU Arrival Time'] = clock  # track every move of this patient
+            data['Patients'].unit_type[patient] = CCU
+            data['Patients'].ccu_arrival_time[patient] = clock  # track every move of this patient
 
             if len(data['CCU Patients']) >= param['CCU Capacity']:  # if there is no empty bed
                 # Queue length changes, so calculate the area under the current rectangle
                 data['Cumulative Stats']['Area Under CCU Queue Length Curve'] += \
                     (clock - data['Last Time CCU Queue Length Changed']) * (state['CCU Queue'])
+                data['CCU Queue Length Histogram'].add(
+                    state['CCU Queue'], clock - data['Last Time CCU Queue Length Changed'])
 
                 state['CCU Queue'] += 1
-                data['CCU Queue Patients'][patient] = clock  # add this patient to the queue
-                data['CCU Queue Lengths'][clock] = state['CCU Queue']  # Save queue length
+                data['CCU Queue Patients'].append(patient)  # add this patient to the end of the queue
+                data['CCU Queue Lengths'].add(clock, state['CCU Queue'])  # Save queue length
 
                 # Queue length just changed. Update 'Last Time Queue Length Changed'
                 data['Last Time CCU Queue Length Changed'] = clock
@@ -991,39 +1057,46 @@ def operation_departure(future_event_list, state, param, clock, data, patient):
                 data['Cumulative Stats']['CCU Server Busy Time'] += \
                     ((clock - data['Last Time CCU Occupied Beds Changed']) *
                      (state['CCU Occupied Beds'] / param['CCU Capacity']))
-
-                # Update Occupied Beds
-                state['CCU Occupied Beds'] += 1
+                data['CCU Occupancy Histogram'].add(
+                    state['CCU Occupied Beds'], clock - data['Last Time CCU Occupied Beds Changed'])
+                if state['CCU Occupied Beds'] >= param['CCU Capacity']:  # every usable bed is busy
+                    data['Cumulative Stats']['CCU All Beds Busy Time'] += \
+                        clock - data['Last Time CCU Occupied Beds Changed']
+
+                # Update Occupied Beds (the bed set keeps state['CCU Occupied Beds'] in sync)
+                data['CCU Patients'].add(patient)
                 # Occupied Beds just changed. Update 'Last Time Occupied Beds Changed'
                 data['Last Time CCU Occupied Beds Changed'] = clock
-                data['CCU Patients'].append(patient)
                 # Someone just started getting service. Update 'Service Starters' (Needed to calculate Wq)
                 data['Cumulative Stats']['CCU Service Starters'] += 1
-                data['Patients'][patient]['Time CCU Service Begins'] = clock  # track "every move" of this patient
-                fel_maker(future_event_list, 'Care Unit Departure', clock, data, param,
+                data['Patients'].ccu_service_begins[patient] = clock  # track "every move" of this patient
+                fel_maker(future_event_list, CARE_UNIT_DEPARTURE, clock, data, param,
                           patient)  # patient discharge from ICU or CCU
 
     else:  # if the surgery type is complex
 
-        if random.random() <= 0.1:  # if the patient dies
-            data['Patients'].pop(patient, None)
-            # data['Patients'][patient]['Time Service Ends'] = clock
+        if data['Variates'].death():  # if the patient dies
+            data['Patients'].exit(patient)
+            data['Patients'].remove(patient)  # the record of a dead patient is never kept
+            # data['Patients'].service_ends[patient] = clock
 
         else:  # the patient doesn't die
 
-            if random.random() <= 0.75:  # non-cardiac surgery
+            if data['Variates'].complex_unit() == ICU:  # non-cardiac surgery
 
-                data['Patients'][patient]['Unit Type'] = 'ICU'
-                data['Patients'][patient]['ICU Arrival Time'] = clock  # track every move of this patient
+                data['Patients'].unit_type[patient] = ICU
+                data['Patients'].icu_arrival_time[patient] = clock  # track every move of this patient
 
                 if len(data['ICU Patients']) >= param['ICU Capacity']:  # if there is no empty bed
                     # Queue length changes, so calculate the area under the current rectangle
                     data['Cumulative Stats']['Area Under ICU Queue Length Curve'] += \
                         (clock - data['Last Time ICU Queue Length Changed']) * (state['ICU Queue'])
+                    data['ICU Queue Length Histogram'].add(
+                        state['ICU Queue'], clock - data['Last Time ICU Queue Length Changed'])
 
                     state['ICU Queue'] += 1
-                    data['ICU Queue Patients'][patient] = clock  # add this patient to the queue
-                    data['ICU Queue Lengths'][clock] = state['ICU Queue']  # Save queue length
+                    data['ICU Queue Patients'].append(patient)  # add this patient to the end of the queue
+                    data['ICU Queue Lengths'].add(clock, state['ICU Queue'])  # Save queue length
 
                     # Queue length just changed. Update 'Last Time Queue Length Changed'
                     data['Last Time ICU Queue Length Changed'] = clock
@@ -1033,30 +1106,36 @@ def operation_departure(future_event_list, state, param, clock, data, patient):
                     data['Cumulative Stats']['ICU Server Busy Time'] += \
                         ((clock - data['Last Time ICU Occupied Beds Changed']) *
                          (state['ICU Occupied Beds'] / param['ICU Capacity']))
-
-                    # Update Occupied Beds
-                    state['ICU Occupied Beds'] += 1
+                    data['ICU Occupancy Histogram'].add(
+                        state['ICU Occupied Beds'], clock - data['Last Time ICU Occupied Beds Changed'])
+                    if state['ICU Occupied Beds'] >= param['ICU Capacity']:  # every usable bed is busy
+                        data['Cumulative Stats']['ICU All Beds Busy Time'] += \
+                            clock - data['Last Time ICU Occupied Beds Changed']
+
+                    # Update Occupied Beds (the bed set keeps state['ICU Occupied Beds'] in sync)
+                    data['ICU Patients'].add(patient)
                     # Occupied Beds just changed. Update 'Last Time Occupied Beds Changed'
                     data['Last Time ICU Occupied Beds Changed'] = clock
-                    data['ICU Patients'].append(patient)
                     # Someone just started getting service. Update 'Service Starters' (Needed to calculate Wq)
                     data['Cumulative Stats']['ICU Service Starters'] += 1
-                    data['Patients'][patient]['Time ICU Service Begins'] = clock  # track "every move" of this patient
-                    fel_maker(future_event_list, 'Care Unit Departure', clock, data, param,
+                    data['Patients'].icu_service_begins[patient] = clock  # track "every move" of this patient
+                    fel_maker(future_event_list, CARE_UNIT_DEPARTURE, clock, data, param,
                               patient)  # patient discharge from ICU or CCU
 
             else:  # cardiac surgery
-                data['Patients'][patient]['Unit Type'] = 'CCU'
-                data['Patients'][patient]['CCU Arrival Time'] = clock  # track every move of this patient
+                data['Patients'].unit_type[patient] = CCU
+                data['Patients'].ccu_arrival_time[patient] = clock  # track every move of this patient
 
                 if len(data['CCU Patients']) >= param['CCU Capacity']:  # if there is no empty bed
                     # Queue length changes, so calculate the area under the current rectangle
                     data['Cumulative Stats']['Area Under CCU Queue Length Curve'] += \
                         (clock - data['Last Time CCU Queue Length Changed']) * (state['CCU Queue'])
+                    data['CCU Queue Length Histogram'].add(
+                        state['CCU Queue'], clock - data['Last Time CCU Queue Length Changed'])
 
                     state['CCU Queue'] += 1
-                    data['CCU Queue Patients'][patient] = clock  # add this patient to the queue
-                    data['CCU Queue Lengths'][clock] = state['CCU Queue']  # Save queue length
+                    data['CCU Queue Patients'].append(patient)  # add this patient to the end of the queue
+                    data['CCU Queue Lengths'].add(clock, state['CCU Queue'])  # Save queue length
 
                     # Queue length just changed. Update 'Last Time Queue Length Changed'
                     data['Last Time CCU Queue Length Changed'] = clock
@@ -1066,16 +1145,20 @@ def operation_departure(future_event_list, state, param, clock, data, patient):
                     data['Cumulative Stats']['CCU Server Busy Time'] += \
                         ((clock - data['Last Time CCU Occupied Beds Changed']) *
                          (state['CCU Occupied Beds'] / param['CCU Capacity']))
-
-                    # Update Occupied Beds
-                    state['CCU Occupied Beds'] += 1
+                    data['CCU Occupancy Histogram'].add(
+                        state['CCU Occupied Beds'], clock - data['Last Time CCU Occupied Beds Changed'])
+                    if state['CCU Occupied Beds'] >= param['CCU Capacity']:  # every usable bed is busy
+                        data['Cumulative Stats']['CCU All Beds Busy Time'] += \
+                            clock - data['Last Time CCU Occupied Beds Changed']
+
+                    # Update Occupied Beds (the bed set keeps state['CCU Occupied Beds'] in sync)
+                    data['CCU Patients'].add(patient)
                     # Occupied Beds just changed. Update 'Last Time Occupied Beds Changed'
                     data['Last Time CCU Occupied Beds Changed'] = clock
-                    data['CCU Patients'].append(patient)
                     # Someone just started getting service. Update 'Service Starters' (Needed to calculate Wq)
                     data['Cumulative Stats']['CCU Service Starters'] += 1
-                    data['Patients'][patient]['Time CCU Service Begins'] = clock  # track "every move" of this patient
-                    fel_maker(future_event_list, 'Care Unit Departure', clock, data, param,
+                    data['Patients'].ccu_service_begins[patient] = clock  # track "every move" of this patient
+                    fel_maker(future_event_list, CARE_UNIT_DEPARTURE, clock, data, param,
                               patient)  # patient discharge from ICU or CCU
 
     if state['Surgery Urgent Queue'] == 0:  # if there is no urgent patient in the queue
@@ -1085,6 +1168,8 @@ def operation_departure(future_event_list, state, param, clock, data, patient):
             data['Cumulative Stats']['Operation Server Busy Time'] += \
                 ((clock - data['Last Time Operation Occupied Beds Changed']) *
                  (state['Operation Occupied Beds'] / param['Operation Capacity']))
+            data['Operation Occupancy Histogram'].add(
+                state['Operation Occupied Beds'], clock - data['Last Time Operation Occupied Beds Changed'])
 
             # Update Occupied Beds
             state['Operation Occupied Beds'] -= 1
@@ -1093,92 +1178,93 @@ def operation_departure(future_event_list, state, param, clock, data, patient):
 
         else:  # there is at least one normal patient in the queue
             # Queue length changes, so calculate the area under the current rectangle
-            data['Cumulative Stats']['Area Under Surgery Normal Queue Length Curve'] += \
+            data['Cumulative Stats']['Area Under Operation Normal Queue Length Curve'] += \
                 (clock - data['Last Time Surgery Normal Queue Length Changed']) * (state['Surgery Normal Queue'])
+            data['Surgery Normal Queue Length Histogram'].add(
+                state['Surgery Normal Queue'], clock - data['Last Time Surgery Normal Queue Length Changed'])
 
             state['Surgery Normal Queue'] -= 1
-            data['Operation Normal Queue Lengths'][clock] = state['Surgery Normal Queue']  # Save queue length
+            data['Operation Normal Queue Lengths'].add(clock, state['Surgery Normal Queue'])  # Save queue length
 
             # Queue length just changed. Update 'Last Time Queue Length Changed'
             data['Last Time Surgery Normal Queue Length Changed'] = clock
 
             # Who is going to get served first?
-            first_patient_in_queue = min(data['Surgery Normal Queue Patients'],
-                                         key=data['Surgery Normal Queue Patients'].get)
-            data['Surgery Normal Queue Patients'].pop(first_patient_in_queue, None)
+            first_patient_in_queue = data['Surgery Normal Queue Patients'].popleft()
 
             # Someone just started getting service. Update 'Service Starters' (Needed to calculate Wq)
             data['Cumulative Stats']['Operation Normal Service Starters'] += 1
-            data['Patients'][first_patient_in_queue][
-                'Time Operation Service Begins'] = clock  # track "every move" of this patient
+            # track "every move" of this patient
+            data['Patients'].operation_service_begins[first_patient_in_queue] = clock
 
             # Update queue waiting time
             data['Cumulative Stats']['Operation Normal Queue Waiting Time'] += \
-                (data['Patients'][first_patient_in_queue]['Time Operation Service Begins'] -
-                 data['Patients'][first_patient_in_queue]['Operation Arrival Time'])
+                (data['Patients'].operation_service_begins[first_patient_in_queue] -
+                 data['Patients'].operation_arrival_time[first_patient_in_queue])
 
             # Save the waiting time
-            data['Operation Normal Queue Waiting Times'][first_patient_in_queue] = (
-                    data['Patients'][first_patient_in_queue]['Time Operation Service Begins'] -
-                    data['Patients'][first_patient_in_queue]['Operation Arrival Time'])
+            data['Operation Normal Queue Waiting Times'].add(first_patient_in_queue, (
+                    data['Patients'].operation_service_begins[first_patient_in_queue] -
+                    data['Patients'].operation_arrival_time[first_patient_in_queue]))
 
             # Schedule 'Operation Departure' for this patient
-            fel_maker(future_event_list, 'Operation Departure', clock, data, param, first_patient_in_queue)
+            fel_maker(future_event_list, OPERATION_DEPARTURE, clock, data, param, first_patient_in_queue)
 
     else:  # there is at least one urgent patient in the queue
         # Queue length changes, so calculate the area under the current rectangle
-        data['Cumulative Stats']['Area Under Surgery Urgent Queue Length Curve'] += \
+        data['Cumulative Stats']['Area Under Operation Urgent Queue Length Curve'] += \
             (clock - data['Last Time Surgery Urgent Queue Length Changed']) * (state['Surgery Urgent Queue'])
+        data['Surgery Urgent Queue Length Histogram'].add(
+            state['Surgery Urgent Queue'], clock - data['Last Time Surgery Urgent Queue Length Changed'])
 
         state['Surgery Urgent Queue'] -= 1
-        data['Operation Urgent Queue Lengths'][clock] = state['Surgery Urgent Queue']  # Save queue length
+        data['Operation Urgent Queue Lengths'].add(clock, state['Surgery Urgent Queue'])  # Save queue length
 
         # Queue length just changed. Update 'Last Time Queue Length Changed'
         data['Last Time Surgery Urgent Queue Length Changed'] = clock
 
         # Who is going to get served first?
-        first_patient_in_queue = min(data['Surgery Urgent Queue Patients'],
-                                     key=data['Surgery Urgent Queue Patients'].get)
-        data['Surgery Urgent Queue Patients'].pop(first_patient_in_queue, None)
+        first_patient_in_queue = data['Surgery Urgent Queue Patients'].popleft()
 
         # Someone just started getting service. Update 'Service Starters' (Needed to calculate Wq)
         data['Cumulative Stats']['Operation Urgent Service Starters'] += 1
-        data['Patients'][first_patient_in_queue][
-            'Time Operation Service Begins'] = clock  # track "every move" of this patient
+        data['Patients'].operation_service_begins[first_patient_in_queue] = clock  # track "every move" of this patient
 
         # Update queue waiting time
         data['Cumulative Stats']['Operation Urgent Queue Waiting Time'] += \
-            (data['Patients'][first_patient_in_queue]['Time Operation Service Begins'] -
-             data['Patients'][first_patient_in_queue]['Operation Arrival Time'])
+            (data['Patients'].operation_service_begins[first_patient_in_queue] -
+             data['Patients'].operation_arrival_time[first_patient_in_queue])
 
         # Save the waiting time
-        data['Operation Urgent Queue Waiting Times'][first_patient_in_queue] = (
-                data['Patients'][first_patient_in_queue]['Time Operation Service Begins'] -
-                data['Patients'][first_patient_in_queue]['Operation Arrival Time'])
+        data['Operation Urgent Queue Waiting Times'].add(first_patient_in_queue, (
+                data['Patients'].operation_service_begins[first_patient_in_queue] -
+                data['Patients'].operation_arrival_time[first_patient_in_queue]))
 
         # Schedule 'Operation Departure' for this patient
-        fel_maker(future_event_list, 'Operation Departure', clock, data, param, first_patient_in_queue)
+        fel_maker(future_event_list, OPERATION_DEPARTURE, clock, data, param, first_patient_in_queue)
 
 
 def care_unit_departure(future_event_list, state, param, clock, data, patient):
     # if the patient's condition worsens
-    if (data['Patients'][patient]['Surgery Type'] == 'Complex') & (random.random() <= 0.01):
+    if data['Patients'].surgery_type[patient] == COMPLEX and data['Variates'].deterioration():
 
         # Update number of 'Number of Repeated Operations For Patients With Complex Operation'
         data['Cumulative Stats']['Number of Repeated Operations For Patients With Complex Operation'] += 1
-        fel_maker(future_event_list, 'Condition Deterioration', clock, data, param, patient)
+        fel_maker(future_event_list, CONDITION_DETERIORATION, clock, data, param, patient)
 
     else:
-        data['Patients'][patient]['General Ward Arrival Time'] = clock  # track every move of this patient
+        data['Patients'].general_ward_arrival_time[patient] = clock  # track every move of this patient
         # if there is no empty bed in the general ward
         if state['General Ward Occupied Beds'] == param['General Ward Capacity']:
             # Queue length changes, so calculate the area under the current rectangle
             data['Cumulative Stats']['Area Under General Ward Queue Length Curve'] += \
                 (clock - data['Last Time General Ward Queue Length Changed']) * (state['General Ward Queue'])
+            data['General Ward Queue Length Histogram'].add(
+                state['General Ward Queue'], clock - data['Last Time General Ward Queue Length Changed'])
 
             state['General Ward Queue'] += 1
-            data['General Ward Queue Patients'][patient] = clock  # add this patient to the queue
-            data['General Ward Queue Lengths'][clock] = state['General Ward Queue']  # Save queue length
+            data['General Ward Queue Patients'].append(patient)  # add this patient to the end of the queue
+            data['General Ward Queue Lengths'].add(clock, state['General Ward Queue'])  # Save queue length
 
             # Queue length just changed. Update 'Last Time Queue Length Changed'
             data['Last Time General Ward Queue Length Changed'] = clock
@@ -1188,6 +1274,8 @@ def care_unit_departure(future_event_list, state, param, clock, data, patient):
             data['Cumulative Stats']['General Ward Server Busy Time'] += \
                 ((clock - data['Last Time General Ward Occupied Beds Changed']) *
                  (state['General Ward Occupied Beds'] / param['General Ward Capacity']))
+            data['General Ward Occupancy Histogram'].add(
+                state['General Ward Occupied Beds'], clock - data['Last Time General Ward Occupied Beds Changed'])
 
             # Update Occupied Beds
             state['General Ward Occupied Beds'] += 1
@@ -1195,20 +1283,23 @@ def care_unit_departure(future_event_list, state, param, clock, data, patient):
             data['Last Time General Ward Occupied Beds Changed'] = clock
             # Someone just started getting service. Update 'Service Starters' (Needed to calculate Wq)
             data['Cumulative Stats']['General Ward Service Starters'] += 1
-            data['Patients'][patient]['Time General Ward Service Begins'] = clock  # track "every move" of this patient
-            fel_maker(future_event_list, 'End of Service', clock, data, param, patient)
-
-    if data['Patients'][patient]['Unit Type'] == 'ICU':  # if the unit where the patient was hospitalized is ICU
-        data['ICU Patients'].remove(patient)
+            data['Patients'].general_ward_service_begins[patient] = clock  # track "every move" of this patient
+            fel_maker(future_event_list, END_OF_SERVICE, clock, data, param, patient)
 
+    if data['Patients'].unit_type[patient] == ICU:  # if the unit where the patient was hospitalized is ICU
         if state['ICU Queue'] == 0:  # if there is no patient in the ICU queue
             # Occupied Beds changes, so calculate Server busy time
             data['Cumulative Stats']['ICU Server Busy Time'] += \
                 ((clock - data['Last Time ICU Occupied Beds Changed']) *
                  (state['ICU Occupied Beds'] / param['ICU Capacity']))
-
-            # Update Occupied Beds
-            state['ICU Occupied Beds'] -= 1
+            data['ICU Occupancy Histogram'].add(
+                state['ICU Occupied Beds'], clock - data['Last Time ICU Occupied Beds Changed'])
+            if state['ICU Occupied Beds'] >= param['ICU Capacity']:  # every usable bed is busy
+                data['Cumulative Stats']['ICU All Beds Busy Time'] += \
+                    clock - data['Last Time ICU Occupied Beds Changed']
+
+            # Update Occupied Beds (the bed set keeps state['ICU Occupied Beds'] in sync)
+            data['ICU Patients'].remove(patient)
             # Occupied Beds just changed. Update 'Last Time Occupied Beds Changed'
             data['Last Time ICU Occupied Beds Changed'] = clock
 
@@ -1216,40 +1307,39 @@ def care_unit_departure(future_event_list, state, param, clock, data, patient):
             # Queue length changes, so calculate the area under the current rectangle
             data['Cumulative Stats']['Area Under ICU Queue Length Curve'] += \
                 (clock - data['Last Time ICU Queue Length Changed']) * (state['ICU Queue'])
+            data['ICU Queue Length Histogram'].add(
+                state['ICU Queue'], clock - data['Last Time ICU Queue Length Changed'])
 
             state['ICU Queue'] -= 1
-            data['ICU Queue Lengths'][clock] = state['ICU Queue']  # Save queue length
+            data['ICU Queue Lengths'].add(clock, state['ICU Queue'])  # Save queue length
 
             # Queue length just changed. Update 'Last Time Queue Length Changed'
             data['Last Time ICU Queue Length Changed'] = clock
 
             # Who is going to get served first?
-            first_patient_in_queue = min(data['ICU Queue Patients'],
-                                         key=data['ICU Queue Patients'].get)
-            data['ICU Queue Patients'].pop(first_patient_in_queue, None)
-            data['ICU Patients'].append(first_patient_in_queue)
+            first_patient_in_queue = data['ICU Queue Patients'].popleft()
+            # The bed passes to the first patient in the queue, the number of occupied beds doesn't change
+            data['ICU Patients'].remove(patient)
+            data['ICU Patients'].add(first_patient_in_queue)
 
             # Someone just started getting service. Update 'Service Starters' (Needed to calculate Wq)
             data['Cumulative Stats']['ICU Service Starters'] += 1
-            data['Patients'][first_patient_in_queue][
-                'Time ICU Service Begins'] = clock  # track "every move" of this patient
+            data['Patients'].icu_service_begins[first_patient_in_queue] = clock  # track "every move" of this patient
 
             # Update queue waiting time
             data['Cumulative Stats']['ICU Queue Waiting Time'] += \
-                (data['Patients'][first_patient_in_queue]['Time ICU Service Begins'] -
-                 data['Patients'][first_patient_in_queue]['ICU Arrival Time'])
+                (data['Patients'].icu_service_begins[first_patient_in_queue] -
+                 data['Patients'].icu_arrival_time[first_patient_in_queue])
 
             # Save the waiting time
-            data['ICU Queue Waiting Times'][first_patient_in_queue] = (
-                    data['Patients'][first_patient_in_queue]['Time ICU Service Begins'] -
-                    data['Patients'][first_patient_in_queue]['ICU Arrival Time'])
+            data['ICU Queue Waiting Times'].add(first_patient_in_queue, (
+                    data['Patients'].icu_service_begins[first_patient_in_queue] -
+                    data['Patients'].icu_arrival_time[first_patient_in_queue]))
 
             # Schedule 'Care Unit Departure' for this patient
-            fel_maker(future_event_list, 'Care Unit Departure', clock, data, param, first_patient_in_queue)
-
-    elif data['Patients'][patient]['Unit Type'] == 'CCU':  # if the unit where the patient was hospitalized is CCU
-        data['CCU Patients'].remove(patient)
+            fel_maker(future_event_list, CARE_UNIT_DEPARTURE, clock, data, param, first_patient_in_queue)
 
+    elif data['Patients'].unit_type[patient] == CCU:  # if the unit where the patient was hospitalized is CCU
         # End of CCU Service Update Server Busy Time
         # data['Cumulative Stats']['CCU Server Busy Time'] += (clock - data['Patients'][patient][
         #    'Time CCU Service Begins']) * (state['CCU Occupied Beds'] / param['CCU Capacity'])
@@ -1259,9 +1349,14 @@ def care_unit_departure(future_event_list, state, param, clock, data, patient):
             data['Cumulative Stats']['CCU Server Busy Time'] += \
                 ((clock - data['Last Time CCU Occupied Beds Changed']) *
                  (state['CCU Occupied Beds'] / param['CCU Capacity']))
-
-            # Update Occupied Beds
-            state['CCU Occupied Beds'] -= 1
+            data['CCU Occupancy Histogram'].add(
+                state['CCU Occupied Beds'], clock - data['Last Time CCU Occupied Beds Changed'])
+            if state['CCU Occupied Beds'] >= param['CCU Capacity']:  # every usable bed is busy
+                data['Cumulative Stats']['CCU All Beds Busy Time'] += \
+                    clock - data['Last Time CCU Occupied Beds Changed']
+
+            # Update Occupied Beds (the bed set keeps state['CCU Occupied Beds'] in sync)
+            data['CCU Patients'].remove(patient)
             # Occupied Beds just changed. Update 'Last Time Occupied Beds Changed'
             data['Last Time CCU Occupied Beds Changed'] = clock
 
@@ -1270,52 +1365,55 @@ def care_unit_departure(future_event_list, state, param, clock, data, patient):
             # Queue length changes, so calculate the area under the current rectangle
             data['Cumulative Stats']['Area Under CCU Queue Length Curve'] += \
                 (clock - data['Last Time CCU Queue Length Changed']) * (state['CCU Queue'])
+            data['CCU Queue Length Histogram'].add(
+                state['CCU Queue'], clock - data['Last Time CCU Queue Length Changed'])
 
             state['CCU Queue'] -= 1
-            data['CCU Queue Lengths'][clock] = state['CCU Queue']  # Save queue length
+            data['CCU Queue Lengths'].add(clock, state['CCU Queue'])  # Save queue length
 
             # Queue length just changed. Update 'Last Time Queue Length Changed'
             data['Last Time CCU Queue Length Changed'] = clock
 
             # Who is going to get served first?
-            first_patient_in_queue = min(data['CCU Queue Patients'],
-                                         key=data['CCU Queue Patients'].get)
-            data['CCU Queue Patients'].pop(first_patient_in_queue, None)
-            data['CCU Patients'].append(first_patient_in_queue)
+            first_patient_in_queue = data['CCU Queue Patients'].popleft()
+            # The bed passes to the first patient in the queue, the number of occupied beds doesn't change
+            data['CCU Patients'].remove(patient)
+            data['CCU Patients'].add(first_patient_in_queue)
 
             # Someone just started getting service. Update 'Service Starters' (Needed to calculate Wq)
             data['Cumulative Stats']['CCU Service Starters'] += 1
-            data['Patients'][first_patient_in_queue][
-                'Time CCU Service Begins'] = clock  # track "every move" of this patient
+            data['Patients'].ccu_service_begins[first_patient_in_queue] = clock  # track "every move" of this patient
 
             # Update queue waiting time
             data['Cumulative Stats']['CCU Queue Waiting Time'] += \
-                (data['Patients'][first_patient_in_queue]['Time CCU Service Begins'] -
-                 data['Patients'][first_patient_in_queue]['CCU Arrival Time'])
+                (data['Patients'].ccu_service_begins[first_patient_in_queue] -
+                 data['Patients'].ccu_arrival_time[first_patient_in_queue])
 
             # Save the waiting time
-            data['CCU Queue Waiting Times'][first_patient_in_queue] = (
-                    data['Patients'][first_patient_in_queue]['Time CCU Service Begins'] -
-                    data['Patients'][first_patient_in_queue]['CCU Arrival Time'])
+            data['CCU Queue Waiting Times'].add(first_patient_in_queue, (
+                    data['Patients'].ccu_service_begins[first_patient_in_queue] -
+                    data['Patients'].ccu_arrival_time[first_patient_in_queue]))
 
             # Schedule 'Care Unit Departure' for this patient
-            fel_maker(future_event_list, 'Care Unit Departure', clock, data, param, first_patient_in_queue)
+            fel_maker(future_event_list, CARE_UNIT_DEPARTURE, clock, data, param, first_patient_in_queue)
 
 
 def condition_deterioration(future_event_list, state, param, clock, data, patient):
-    data['Patients'][patient]['Patient Type'] = 'Urgent'  # the patient will be urgent
+    data['Patients'].patient_type[patient] = URGENT  # the patient will be urgent
 
-    data['Patients'][patient]['Operation Arrival Time'] = clock  # track every move of this patient
+    data['Patients'].operation_arrival_time[patient] = clock  # track every move of this patient
 
     # if there is no empty bed in the operation room
     if state['Operation Occupied Beds'] == param['Operation Capacity']:
         # Queue length changes, so calculate the area under the current rectangle
-        data['Cumulative Stats']['Area Under Surgery Urgent Queue Length Curve'] += \
+        data['Cumulative Stats']['Area Under Operation Urgent Queue Length Curve'] += \
             (clock - data['Last Time Surgery Urgent Queue Length Changed']) * (state['Surgery Urgent Queue'])
+        data['Surgery Urgent Queue Length Histogram'].add(
+            state['Surgery Urgent Queue'], clock - data['Last Time Surgery Urgent Queue Length Changed'])
 
         state['Surgery Urgent Queue'] += 1
-        data['Surgery Urgent Queue Patients'][patient] = clock  # add this patient to the queue
-        data['Operation Urgent Queue Lengths'][clock] = state['Surgery Urgent Queue']  # Save queue length
+        data['Surgery Urgent Queue Patients'].append(patient)  # add this patient to the end of the queue
+        data['Operation Urgent Queue Lengths'].add(clock, state['Surgery Urgent Queue'])  # Save queue length
 
         # Queue length just changed. Update 'Last Time Queue Length Changed'
         data['Last Time Surgery Urgent Queue Length Changed'] = clock
@@ -1325,6 +1423,8 @@ def condition_deterioration(future_event_list, state, param, clock, data, patien
         data['Cumulative Stats']['Operation Server Busy Time'] += \
             ((clock - data['Last Time Operation Occupied Beds Changed']) *
              (state['Operation Occupied Beds'] / param['Operation Capacity']))
+        data['Operation Occupancy Histogram'].add(
+            state['Operation Occupied Beds'], clock - data['Last Time Operation Occupied Beds Changed'])
 
         # Update Occupied Beds
         state['Operation Occupied Beds'] += 1
@@ -1333,41 +1433,58 @@ def condition_deterioration(future_event_list, state, param, clock, data, patien
 
         # Someone just started getting service. Update 'Service Starters' (Needed to calculate Wq)
         data['Cumulative Stats']['Operation Urgent Service Starters'] += 1
-        data['Patients'][patient]['Time Operation Service Begins'] = clock  # track "every move" of this patient
-        fel_maker(future_event_list, 'Operation Departure', clock, data, param, patient)
+        data['Patients'].operation_service_begins[patient] = clock  # track "every move" of this patient
+        fel_maker(future_event_list, OPERATION_DEPARTURE, clock, data, param, patient)
+
 
+def close_care_unit_periods(state, param, clock, data):
+    # The ICU and CCU capacities are about to change: their current occupancy periods end here, at the old capacity
+    for name in ('ICU', 'CCU'):
+        duration = clock - data[f'Last Time {name} Occupied Beds Changed']
+        data['Cumulative Stats'][f'{name} Server Busy Time'] += \
+            duration * (state[f'{name} Occupied Beds'] / param[f'{name} Capacity'])
+        data[f'{name} Occupancy Histogram'].add(state[f'{name} Occupied Beds'], duration)
+        if state[f'{name} Occupied Beds'] >= param[f'{name} Capacity']:
+            data['Cumulative Stats'][f'{name} All Beds Busy Time'] += duration
+        data[f'Last Time {name} Occupied Beds Changed'] = clock
 
-def power_off(future_event_list, state, param, clock, data):
+
+def power_off(future_event_list, state, param, clock, data, patient=None):
     state['Power Outage'] = 1
+    close_care_unit_periods(state, param, clock, data)
     # 80% of bed capacity is usable
     param['ICU Capacity'] = param['ICU Capacity'] * 0.8
     param['CCU Capacity'] = param['CCU Capacity'] * 0.8
 
-    fel_maker(future_event_list, 'Power On', clock, data, param)
+    fel_maker(future_event_list, POWER_ON, clock, data, param)
 
 
-def power_on(state, param):
+def power_on(future_event_list, state, param, clock, data, patient=None):
     state['Power Outage'] = 0
-    # All bed capacities are available
-    param['ICU Capacity'] = param['ICU Capacity'] * 1.25
-    param['CCU Capacity'] = param['CCU Capacity'] * 1.25
+    close_care_unit_periods(state, param, clock, data)
+    # All bed capacities are available (rounded: a capacity is a number of beds, and 0.8 * 1.25 is not exactly 1 in
+    # floating point, e.g. 6 beds would come back as 6.000000000000001)
+    param['ICU Capacity'] = round(param['ICU Capacity'] * 1.25)
+    param['CCU Capacity'] = round(param['CCU Capacity'] * 1.25)
 
 
 def end_of_service(future_event_list, state, param, clock, data, patient):
-    warm_up_time = 5400
     #  End of "service". Update System Waiting Time and count number of patients.
-    data['Cumulative Stats']['System Waiting Time'] += clock - data['Patients'][patient]['Arrival Time']
+    time_in_system = clock - data['Patients'].arrival_time[patient]
+    data['Cumulative Stats']['System Waiting Time'] += time_in_system
+    data['Time in System'].add(patient, time_in_system)
     data['Cumulative Stats']['Total Patients'] += 1
 
-    data['Patients'][patient]['Time Service Ends'] = clock
-    if data['Patients'][patient]['Time Service Ends'] >= warm_up_time:
-        data['Cumulative Stats']['Finished Patients'] += 1
+    data['Patients'].service_ends[patient] = clock
+    data['Patients'].exit(patient)  # the patient leaves the hospital
 
     if state['General Ward Queue'] == 0:  # if there is no patient in the queue
         # Occupied Beds changes, so calculate Server busy time
         data['Cumulative Stats']['General Ward Server Busy Time'] += \
             ((clock - data['Last Time General Ward Occupied Beds Changed']) *
              (state['General Ward Occupied Beds'] / param['General Ward Capacity']))
+        data['General Ward Occupancy Histogram'].add(
+            state['General Ward Occupied Beds'], clock - data['Last Time General Ward Occupied Beds Changed'])
 
         # Update Occupied Beds
         state['General Ward Occupied Beds'] -= 1
@@ -1378,244 +1495,179 @@ def end_of_service(future_event_list, state, param, clock, data, patient):
         # Queue length changes, so calculate the area under the current rectangle
         data['Cumulative Stats']['Area Under General Ward Queue Length Curve'] += \
             (clock - data['Last Time General Ward Queue Length Changed']) * (state['General Ward Queue'])
+        data['General Ward Queue Length Histogram'].add(
+            state['General Ward Queue'], clock - data['Last Time General Ward Queue Length Changed'])
 
         state['General Ward Queue'] -= 1
-        data['General Ward Queue Lengths'][clock] = state['General Ward Queue']  # Save queue length
+        data['General Ward Queue Lengths'].add(clock, state['General Ward Queue'])  # Save queue length
 
         # Queue length just changed. Update 'Last Time Queue Length Changed'
         data['Last Time General Ward Queue Length Changed'] = clock
 
         # Who is going to get served first?
-        first_patient_in_queue = min(data['General Ward Queue Patients'],
-                                     key=data['General Ward Queue Patients'].get)
-        data['General Ward Queue Patients'].pop(first_patient_in_queue, None)
+        first_patient_in_queue = data['General Ward Queue Patients'].popleft()
 
         # Someone just started getting service. Update 'Service Starters' (Needed to calculate Wq)
         data['Cumulative Stats']['General Ward Service Starters'] += 1
-        data['Patients'][first_patient_in_queue][
-            'Time General Ward Service Begins'] = clock  # track "every move" of this patient
+        # track "every move" of this patient
+        data['Patients'].general_ward_service_begins[first_patient_in_queue] = clock
 
         # Update queue waiting time
         data['Cumulative Stats']['General Ward Queue Waiting Time'] += \
-            (data['Patients'][first_patient_in_queue]['Time General Ward Service Begins'] -
-             data['Patients'][first_patient_in_queue]['General Ward Arrival Time'])
+            (data['Patients'].general_ward_service_begins[first_patient_in_queue] -
+             data['Patients'].general_ward_arrival_time[first_patient_in_queue])
 
         # Save the waiting time
-        data['General Ward Queue Waiting Times'][first_patient_in_queue] = (
-                data['Patients'][first_patient_in_queue]['Time General Ward Service Begins'] -
-                data['Patients'][first_patient_in_queue]['General Ward Arrival Time'])
+        data['General Ward Queue Waiting Times'].add(first_patient_in_queue, (
+                data['Patients'].general_ward_service_begins[first_patient_in_queue] -
+                data['Patients'].general_ward_arrival_time[first_patient_in_queue]))
 
         # Schedule 'End of Service' for this patient
-        fel_maker(future_event_list, 'End of Service', clock, data, param, first_patient_in_queue)
-
-
-def create_row(step, current_event, state, data, future_event_list):
-    # This function will create a list, which will eventually become a row of the output Excel file
-
-    sorted_fel = sorted(future_event_list, key=lambda x: x['Event Time'])
-
-    # What should this row contain?
-    # 1. Step, Clock, Event Type and Event Patient
-    row = [step, current_event['Event Time'], current_event['Event Type'], current_event['Patient']]
-    # 2. All state variables
-    row.extend(list(state.values()))
-    # 3. All Cumulative Stats
-    row.extend(list(data['Cumulative Stats'].values()))
-    # 4. All events in fel ('Event Time', 'Event Type' & 'Event Customer' for each event)
-    for event in sorted_fel:
-        row.append(event['Event Time'])
-        row.append(event['Event Type'])
-        row.append(event['Patient'])
-    return row
-
-
-def justify(table):
-    # This function adds blanks to short rows in order to match their lengths to the maximum row length
-
-    # Find maximum row length in the table
-    row_max_len = 0
-    for row in table:
-        if len(row) > row_max_len:
-            row_max_len = len(row)
-
-    # For each row, add enough blanks
-    for row in table:
-        row.extend([""] * (row_max_len - len(row)))
-
-
-def create_main_header(state, data):
-    # This function creates the main part of header (returns a list)
-    # A part of header which is used for future events will be created in create_excel()
-
-    # Header consists of ...
-    # 1. Step, Clock, Event Type and Event Patient
-    header = ['Step', 'Clock', 'Event Type', 'Event Patient']
-    # 2. Names of the state variables
-    header.extend(list(state.keys()))
-    # 3. Names of the cumulative stats
-    header.extend(list(data['Cumulative Stats'].keys()))
-    return header
-
-
-def create_excel(table, header):
-    # This function creates and fine-tunes the Excel output file
-
-    # Find length of each row in the table
-    row_len = len(table[0])
-
-    # Find length of header (header does not include cells for fel at this moment)
-    header_len = len(header)
-
-    # row_len exceeds header_len by (max_fel_length * 3) (Event Type, Event Time & Customer for each event in FEL)
-    # Extend the header with 'Future Event Time', 'Future Event Type', 'Future Event Patient'
-    # for each event in the fel with maximum size
-    i = 1
-    for col in range((row_len - header_len) // 3):
-        header.append('Future Event Time ' + str(i))
-        header.append('Future Event Type ' + str(i))
-        header.append('Future Event Patient ' + str(i))
-        i += 1
-
-    # Dealing with the output
-    # First create a pandas DataFrame
-    df = pd.DataFrame(table, columns=header, index=None)
-
-    # Create a handle to work on the Excel file
-    writer = pd.ExcelWriter('output.xlsx', engine='xlsxwriter')
-
-    # Write out the Excel file to the hard drive
-    df.to_excel(writer, sheet_name='Initial State Output', header=False, startrow=1, index=False)
-
-    # Use the handle to get the workbook (just library syntax, can be found with a simple search)
-    workbook = writer.book
-
-    # Get the sheet you want to work on
-    worksheet = writer.sheets['Initial State Output']
-
-    # Create a cell-formatter object (this will be used for the cells in the header, hence: header_formatter!)
-    header_formatter = workbook.add_format()
-
-    # Define whatever format you want
-    header_formatter.set_align('center')
-    header_formatter.set_align('vcenter')
-    header_formatter.set_font('Times New Roman')
-    header_formatter.set_bold('True')
-
-    # Write out the column names and apply the format to the cells in the header row
-    for col_num, value in enumerate(df.columns.values):
-        worksheet.write(0, col_num, value, header_formatter)
-
-    # Auto-fit columns
-    # Copied from https://stackoverflow.com/questions/29463274/simulate-autofit-column-in-xslxwriter
-    for i, width in enumerate(get_col_widths(df)):
-        worksheet.set_column(i - 1, i - 1, width)
-
-    # Create a cell-formatter object for the body of Excel file
-    main_formatter = workbook.add_format()
-    main_formatter.set_align('center')
-    main_formatter.set_align('vcenter')
-    main_formatter.set_font('Times New Roman')
-
-    # Apply the format to the body cells
-    for row in range(1, len(df) + 1):
-        worksheet.set_row(row, None, main_formatter)
-
-    # Save your edits
-    writer.close()
-
-
-def get_col_widths(dataframe):
-    # Copied from https://stackoverflow.com/questions/29463274/simulate-autofit-column-in-xslxwriter
-    # First we find the maximum length of the index column
-    idx_max = max([len(str(s)) for s in dataframe.index.values] + [len(str(dataframe.index.name))])
-    # Then, we concatenate this to the max of the lengths of column name and its values for each column, left to right
-    return [idx_max] + [max([len(str(s)) for s in dataframe[col].values] + [len(col)]) for col in dataframe.columns]
-
-
-def simulation(simulation_time, param, excel_creation=False):
-    warm_up_time = 5400
-    state, future_event_list, data = starting_state(param)
+        fel_maker(future_event_list, END_OF_SERVICE, clock, data, param, first_patient_in_queue)
+
+
+def warm_up(future_event_list, state, param, clock, data, patient=None):
+    # End of the warm-up period: every statistic starts over from the current state of the system, so the Results only
+    # cover the steady state. The patients already in the system are kept, and the histories of the run (the patient
+    # records, data['preoperative_queue_tracker']) are not statistics, so they still cover the whole run.
+    for name in data['Cumulative Stats']:
+        data['Cumulative Stats'][name] = 0
+    for key in data:
+        if key.startswith('Last Time '):  # the areas under the curves and the busy times start now
+            data[key] = clock
+    for value in data.values():
+        if isinstance(value, (RunningStatistics, TimeWeightedHistogram)):
+            value.reset()
+    # The control variates of the run must cover the same period as the Results (see Variates.input_statistics())
+    data['Variates'].reset_input_statistics()
+    # The current queue lengths are the first observations of the steady state (e.g. for Max_Lq)
+    for queue, name in QUEUE_HISTOGRAMS.items():
+        data[f"{queue.replace('_', ' ')} Queue Lengths"].add(clock, state[f'{name} Queue'])
+
+
+# Event code -> handler. Every handler is called as handler(future_event_list, state, param, clock, data, patient).
+EVENT_HANDLERS = {
+    NORMAL_ARRIVAL: partial(arrival, patient_type=NORMAL),
+    URGENT_ARRIVAL: partial(arrival, patient_type=URGENT),
+    LABORATORY_ARRIVAL: laboratory_arrival,
+    LABORATORY_DEPARTURE: laboratory_departure,
+    OPERATION_ARRIVAL: operation_arrival,
+    OPERATION_DEPARTURE: operation_departure,
+    CONDITION_DETERIORATION: condition_deterioration,
+    CARE_UNIT_DEPARTURE: care_unit_departure,
+    POWER_OFF: power_off,
+    POWER_ON: power_on,
+    END_OF_SERVICE: end_of_service,
+    WARM_UP: warm_up,
+}
+
+
+def simulation(simulation_time, param, excel_creation=False, event_queue='heap', recorder=None, retention=None,
+               seed=None, antithetic=False, variates=None, return_mode='data', queue_history=False, warm_up_time=0):
+    # seed: int or SeedSequence; the same seed reproduces the run (None: fresh entropy, see data['Variates'].entropy)
+    # antithetic: use 1 - U for every uniform U, i.e. the antithetic partner of the run with the same seed
+    # variates: Variates object to draw the random inputs from (seed and antithetic are then unused), e.g. to read its
+    # input_statistics() after the run
+    # return_mode: 'data' (the whole data dict), 'results' (data['Results']), 'vector' (NumPy float array of the
+    # Results, in the order of RESULT_METRICS) or 'summary' ((data['Results'], data['Sketches'])). With the last three
+    # the histories that only the data dict exposes (data['preoperative_queue_tracker']) are not filled.
+    # retention: what happens to the record of a patient who leaves (see patients.py); None: 'keep' with the 'data'
+    # return mode, 'drop' with the others, whose callers cannot read the records
+    # queue_history: also keep every queue length and waiting time in data['X Queue Lengths'].history and
+    # data['X Queue Waiting Times'].history (dicts keyed by time / patient); only the running statistics otherwise
+    # warm_up_time: length of the warm-up period left out of the statistics; a 'Warm Up' event resets them all at that
+    # time (see warm_up()), so every result is over (warm_up_time, simulation_time)
+    if return_mode not in RETURN_MODES:
+        raise ValueError(f"Unknown return mode '{return_mode}'. Choose one of {', '.join(RETURN_MODES)}.")
+    if not 0 <= warm_up_time < simulation_time:
+        raise ValueError("The warm-up time must be at least 0 and shorter than the simulation time.")
+    history = return_mode == 'data'
+    if retention is None:
+        retention = 'keep' if history else 'drop'
+    state, future_event_list, data = starting_state(param, event_queue, retention, seed, antithetic, variates, history,
+                                                    queue_history)
     clock = 0
-    table = []  # a list of lists. Each inner list will be a row in the Excel output.
+    # The recorder receives one row per step (see tracing.py). Without a trace nothing is built at all.
+    if recorder is None:
+        recorder = ExcelRecorder() if excel_creation else NullRecorder()
     step = 1  # every event counts as a step.
     # one day of power outage per month.
-    future_event_list.append({'Event Type': 'Power Off', 'Event Time': uniform(0, 720), 'Patient': None})
-    future_event_list.append({'Event Type': 'End of Simulation', 'Event Time': simulation_time, 'Patient': None})
+    future_event_list.push(Event(data['Variates'].outage_time(), POWER_OFF))
+    future_event_list.push(Event(simulation_time, END_OF_SIMULATION))
+    if warm_up_time > 0:
+        future_event_list.push(Event(warm_up_time, WARM_UP))
     # print_header()
     while clock < simulation_time:
-        sorted_fel = sorted(future_event_list, key=lambda x: x['Event Time'])
-        # print(sorted_fel, '\n')
         # print(data)
-        current_event = sorted_fel[0]  # find imminent event
-        clock = current_event['Event Time']  # advance time
-        patient = current_event['Patient']  # find the patient of that event
-        if clock < simulation_time:  # if current_event['Event Type'] != 'End of Simulation'  (Same)
-            if current_event['Event Type'] == 'Arrival':
-                patient_type = current_event['Patient Type']  # find the patient type
-                arrival(future_event_list, state, param, clock, data, patient, patient_type)
-
-            elif current_event['Event Type'] == 'Laboratory Arrival':
-                laboratory_arrival(future_event_list, state, param, clock, data, patient)
-
-            elif current_event['Event Type'] == 'Laboratory Departure':
-                laboratory_departure(future_event_list, state, param, clock, data, patient)
-
-            elif current_event['Event Type'] == 'Operation Arrival':
-                operation_arrival(future_event_list, state, param, clock, data, patient)
-
-            elif current_event['Event Type'] == 'Operation Departure':
-                operation_departure(future_event_list, state, param, clock, data, patient)
-
-            elif current_event['Event Type'] == 'Condition Deterioration':
-                condition_deterioration(future_event_list, state, param, clock, data, patient)
-
-            elif current_event['Event Type'] == 'Care Unit Departure':
-                care_unit_departure(future_event_list, state, param, clock, data, patient)
-
-            elif current_event['Event Type'] == 'Power Off':
-                power_off(future_event_list, state, param, clock, data)
-
-            elif current_event['Event Type'] == 'Power On':
-                power_on(state, param)
-
-            elif current_event['Event Type'] == 'End of Service':
-                end_of_service(future_event_list, state, param, clock, data, patient)
-
-            future_event_list.remove(current_event)
+        current_event = future_event_list.pop()  # find (and remove) imminent event
+        clock = current_event.time  # advance time
+        if clock < simulation_time:  # if current_event.code != END_OF_SIMULATION  (Same)
+            EVENT_HANDLERS[current_event.code](future_event_list, state, param, clock, data, current_event.patient)
 
         else:
             # Update utilization for the last time!
             data['Cumulative Stats']['Preoperative Server Busy Time'] += \
                 (clock - data['Last Time Preoperative Occupied Beds Changed']) * (
                             state['Preoperative Occupied Beds'] / param['Preoperative Capacity'])
+            data['Preoperative Occupancy Histogram'].add(
+                state['Preoperative Occupied Beds'], clock - data['Last Time Preoperative Occupied Beds Changed'])
             data['Cumulative Stats']['Emergency Server Busy Time'] += \
                 (clock - data['Last Time Emergency Occupied Beds Changed']) * (
                             state['Emergency Occupied Beds'] / param['Emergency Capacity'])
+            data['Emergency Occupancy Histogram'].add(
+                state['Emergency Occupied Beds'], clock - data['Last Time Emergency Occupied Beds Changed'])
             data['Cumulative Stats']['Laboratory Server Busy Time'] += \
                 (clock - data['Last Time Laboratory Occupied Beds Changed']) * (
                             state['Laboratory Occupied Beds'] / param['Laboratory Capacity'])
+            data['Laboratory Occupancy Histogram'].add(
+                state['Laboratory Occupied Beds'], clock - data['Last Time Laboratory Occupied Beds Changed'])
             data['Cumulative Stats']['Operation Server Busy Time'] += \
                 (clock - data['Last Time Operation Occupied Beds Changed']) * (
                             state['Operation Occupied Beds'] / param['Operation Capacity'])
+            data['Operation Occupancy Histogram'].add(
+                state['Operation Occupied Beds'], clock - data['Last Time Operation Occupied Beds Changed'])
             data['Cumulative Stats']['General Ward Server Busy Time'] += \
                 (clock - data['Last Time General Ward Occupied Beds Changed']) * (
                             state['General Ward Occupied Beds'] / param['General Ward Capacity'])
+            data['General Ward Occupancy Histogram'].add(
+                state['General Ward Occupied Beds'], clock - data['Last Time General Ward Occupied Beds Changed'])
             data['Cumulative Stats']['ICU Server Busy Time'] += \
                 (clock - data['Last Time ICU Occupied Beds Changed']) * (
                             state['ICU Occupied Beds'] / param['ICU Capacity'])
+            data['ICU Occupancy Histogram'].add(
+                state['ICU Occupied Beds'], clock - data['Last Time ICU Occupied Beds Changed'])
+            if state['ICU Occupied Beds'] >= param['ICU Capacity']:  # every usable bed is busy
+                data['Cumulative Stats']['ICU All Beds Busy Time'] += \
+                    clock - data['Last Time ICU Occupied Beds Changed']
             data['Cumulative Stats']['CCU Server Busy Time'] += \
                 (clock - data['Last Time CCU Occupied Beds Changed']) * (
                             state['CCU Occupied Beds'] / param['CCU Capacity'])
+            data['CCU Occupancy Histogram'].add(
+                state['CCU Occupied Beds'], clock - data['Last Time CCU Occupied Beds Changed'])
+            if state['CCU Occupied Beds'] >= param['CCU Capacity']:  # every usable bed is busy
+                data['Cumulative Stats']['CCU All Beds Busy Time'] += \
+                    clock - data['Last Time CCU Occupied Beds Changed']
+            # A full emergency queue at the end of the run is still full, so its last period counts too
+            if state['Emergency Queue'] == param['Emergency Queue Capacity']:
+                data['Cumulative Stats']['Full Emergency Queue Duration'] += \
+                    clock - data['Last Time Emergency Queue Length Changed']
+            # Close the last period of every queue, so the areas and the histograms cover the whole run
+            for queue, name in QUEUE_HISTOGRAMS.items():
+                data['Cumulative Stats'][f"Area Under {queue.replace('_', ' ')} Queue Length Curve"] += \
+                    (clock - data[f'Last Time {name} Queue Length Changed']) * state[f'{name} Queue']
+                data[f'{name} Queue Length Histogram'].add(
+                    state[f'{name} Queue'], clock - data[f'Last Time {name} Queue Length Changed'])
             future_event_list.clear()
 
-        # create a row in the table
-        table.append(create_row(step, current_event, state, data, future_event_list))
+        # create a row in the trace
+        if recorder.enabled:
+            recorder.record(step, current_event, state, data, future_event_list)
         step += 1
 
-    if excel_creation:
-        excel_main_header = create_main_header(state, data)
-        justify(table)
-        create_excel(table, excel_main_header)
+    recorder.close(state, data)
+
+    # Time averages are over the period after the warm-up, when the statistics were collected
+    observed_time = simulation_time - warm_up_time
 
     # Criteria_1
     if data['Cumulative Stats']['Total Patients'] == 0:  # avoiding division by zero error
@@ -1626,7 +1678,7 @@ def simulation(simulation_time, param, excel_creation=False):
     data['Results']['average_time_in_system'] = average_time_in_system
 
     # Criteria_2
-    Full_Emergency_Queue_Probability = data['Cumulative Stats']['Full Emergency Queue Duration'] / simulation_time
+    Full_Emergency_Queue_Probability = data['Cumulative Stats']['Full Emergency Queue Duration'] / observed_time
     data['Results']['Full_Emergency_Queue_Probability'] = Full_Emergency_Queue_Probability
 
     # Criteria_3
@@ -1649,54 +1701,54 @@ def simulation(simulation_time, param, excel_creation=False):
         'immediately_admitted_emergency_patients_percentage'] = immediately_admitted_emergency_patients_percentage
 
     # Criteria_5
-    rho_Emergency = data['Cumulative Stats']['Emergency Server Busy Time'] / simulation_time
+    rho_Emergency = data['Cumulative Stats']['Emergency Server Busy Time'] / observed_time
     data['Results']['rho_Emergency'] = rho_Emergency
 
-    rho_Preoperative = data['Cumulative Stats']['Preoperative Server Busy Time'] / simulation_time
+    rho_Preoperative = data['Cumulative Stats']['Preoperative Server Busy Time'] / observed_time
     data['Results']['rho_Preoperative'] = rho_Preoperative
 
-    rho_Laboratory = data['Cumulative Stats']['Laboratory Server Busy Time'] / simulation_time
+    rho_Laboratory = data['Cumulative Stats']['Laboratory Server Busy Time'] / observed_time
     data['Results']['rho_Laboratory'] = rho_Laboratory
 
-    rho_Operation = data['Cumulative Stats']['Operation Server Busy Time'] / simulation_time
+    rho_Operation = data['Cumulative Stats']['Operation Server Busy Time'] / observed_time
     data['Results']['rho_Operation'] = rho_Operation
 
-    rho_General_Ward = data['Cumulative Stats']['General Ward Server Busy Time'] / simulation_time
+    rho_General_Ward = data['Cumulative Stats']['General Ward Server Busy Time'] / observed_time
     data['Results']['rho_General_Ward'] = rho_General_Ward
 
-    rho_ICU = data['Cumulative Stats']['ICU Server Busy Time'] / simulation_time
+    rho_ICU = data['Cumulative Stats']['ICU Server Busy Time'] / observed_time
     data['Results']['rho_ICU'] = rho_ICU
 
-    rho_CCU = data['Cumulative Stats']['CCU Server Busy Time'] / simulation_time
+    rho_CCU = data['Cumulative Stats']['CCU Server Busy Time'] / observed_time
     data['Results']['rho_CCU'] = rho_CCU
 
     # Criteria_4
     # Average Queue Length for each queue
-    Lq_Emergency = data['Cumulative Stats']['Area Under Emergency Queue Length Curve'] / simulation_time
+    Lq_Emergency = data['Cumulative Stats']['Area Under Emergency Queue Length Curve'] / observed_time
     data['Results']['Lq_Emergency'] = Lq_Emergency
 
-    Lq_Preoperative = data['Cumulative Stats']['Area Under Preoperative Queue Length Curve'] / simulation_time
+    Lq_Preoperative = data['Cumulative Stats']['Area Under Preoperative Queue Length Curve'] / observed_time
     data['Results']['Lq_Preoperative'] = Lq_Preoperative
 
-    Lq_Laboratory_Normal = data['Cumulative Stats']['Area Under Laboratory Normal Queue Length Curve'] / simulation_time
+    Lq_Laboratory_Normal = data['Cumulative Stats']['Area Under Laboratory Normal Queue Length Curve'] / observed_time
     data['Results']['Lq_Laboratory_Normal'] = Lq_Laboratory_Normal
 
-    Lq_Laboratory_Urgent = data['Cumulative Stats']['Area Under Laboratory Urgent Queue Length Curve'] / simulation_time
+    Lq_Laboratory_Urgent = data['Cumulative Stats']['Area Under Laboratory Urgent Queue Length Curve'] / observed_time
     data['Results']['Lq_Laboratory_Urgent'] = Lq_Laboratory_Urgent
 
-    Lq_Operation_Normal = data['Cumulative Stats']['Area Under Operation Normal Queue Length Curve'] / simulation_time
+    Lq_Operation_Normal = data['Cumulative Stats']['Area Under Operation Normal Queue Length Curve'] / observed_time
     data['Results']['Lq_Operation_Normal'] = Lq_Operation_Normal
 
-    Lq_Operation_Urgent = data['Cumulative Stats']['Area Under Operation Urgent Queue Length Curve'] / simulation_time
+    Lq_Operation_Urgent = data['Cumulative Stats']['Area Under Operation Urgent Queue Length Curve'] / observed_time
     data['Results']['Lq_Operation_Urgent'] = Lq_Operation_Urgent
 
-    Lq_General_Ward = data['Cumulative Stats']['Area Under General Ward Queue Length Curve'] / simulation_time
+    Lq_General_Ward = data['Cumulative Stats']['Area Under General Ward Queue Length Curve'] / observed_time
     data['Results']['Lq_General_Ward'] = Lq_General_Ward
 
-    Lq_ICU = data['Cumulative Stats']['Area Under ICU Queue Length Curve'] / simulation_time
+    Lq_ICU = data['Cumulative Stats']['Area Under ICU Queue Length Curve'] / observed_time
     data['Results']['Lq_ICU'] = Lq_ICU
 
-    Lq_CCU = data['Cumulative Stats']['Area Under CCU Queue Length Curve'] / simulation_time
+    Lq_CCU = data['Cumulative Stats']['Area Under CCU Queue Length Curve'] / observed_time
     data['Results']['Lq_CCU'] = Lq_CCU
 
     # Average Waiting Time in each queue
@@ -1766,133 +1818,101 @@ def simulation(simulation_time, param, excel_creation=False):
     data['Results']['Wq_CCU'] = Wq_CCU
 
     # Maximum waiting time in each queue
-    if data['Preoperative Queue Waiting Times'].values():
-        Max_Wq_Preoperative = max(data['Preoperative Queue Waiting Times'].values())
-    else:
-        Max_Wq_Preoperative = 0
+    Max_Wq_Preoperative = data['Preoperative Queue Waiting Times'].max
     data['Results']['Max_Wq_Preoperative'] = Max_Wq_Preoperative
 
-    if data['Emergency Queue Waiting Times'].values():
-        Max_Wq_Emergency = max(data['Emergency Queue Waiting Times'].values())
-    else:
-        Max_Wq_Emergency = 0
+    Max_Wq_Emergency = data['Emergency Queue Waiting Times'].max
     data['Results']['Max_Wq_Emergency'] = Max_Wq_Emergency
 
-    if data['Laboratory Normal Queue Waiting Times'].values():
-        Max_Wq_Laboratory_Normal = max(data['Laboratory Normal Queue Waiting Times'].values())
-    else:
-        Max_Wq_Laboratory_Normal = 0
+    Max_Wq_Laboratory_Normal = data['Laboratory Normal Queue Waiting Times'].max
     data['Results']['Max_Wq_Laboratory_Normal'] = Max_Wq_Laboratory_Normal
 
-    if data['Laboratory Urgent Queue Waiting Times'].values():
-        Max_Wq_Laboratory_Urgent = max(data['Laboratory Urgent Queue Waiting Times'].values())
-    else:
-        Max_Wq_Laboratory_Urgent = 0
+    Max_Wq_Laboratory_Urgent = data['Laboratory Urgent Queue Waiting Times'].max
     data['Results']['Max_Wq_Laboratory_Urgent'] = Max_Wq_Laboratory_Urgent
 
-    if data['Operation Normal Queue Waiting Times'].values():
-        Max_Wq_Operation_Normal = max(data['Operation Normal Queue Waiting Times'].values())
-    else:
-        Max_Wq_Operation_Normal = 0
+    Max_Wq_Operation_Normal = data['Operation Normal Queue Waiting Times'].max
     data['Results']['Max_Wq_Operation_Normal'] = Max_Wq_Operation_Normal
 
-    if data['Operation Urgent Queue Waiting Times'].values():
-        Max_Wq_Operation_Urgent = max(data['Operation Urgent Queue Waiting Times'].values())
-    else:
-        Max_Wq_Operation_Urgent = 0
+    Max_Wq_Operation_Urgent = data['Operation Urgent Queue Waiting Times'].max
     data['Results']['Max_Wq_Operation_Urgent'] = Max_Wq_Operation_Urgent
 
-    if data['General Ward Queue Waiting Times'].values():
-        Max_Wq_General_Ward = max(data['General Ward Queue Waiting Times'].values())
-    else:
-        Max_Wq_General_Ward = 0
+    Max_Wq_General_Ward = data['General Ward Queue Waiting Times'].max
     data['Results']['Max_Wq_General_Ward'] = Max_Wq_General_Ward
 
-    if data['ICU Queue Waiting Times'].values():
-        Max_Wq_ICU = max(data['ICU Queue Waiting Times'].values())
-    else:
-        Max_Wq_ICU = 0
+    Max_Wq_ICU = data['ICU Queue Waiting Times'].max
     data['Results']['Max_Wq_ICU'] = Max_Wq_ICU
 
-    if data['CCU Queue Waiting Times'].values():
-        Max_Wq_CCU = max(data['CCU Queue Waiting Times'].values())
-    else:
-        Max_Wq_CCU = 0
+    Max_Wq_CCU = data['CCU Queue Waiting Times'].max
     data['Results']['Max_Wq_CCU'] = Max_Wq_CCU
 
     # Maximum queue length for each queue
-    if data['Preoperative Queue Lengths'].values():
-        Max_Lq_Preoperative = max(data['Preoperative Queue Lengths'].values())
-    else:
-        Max_Lq_Preoperative = 0
+    Max_Lq_Preoperative = data['Preoperative Queue Lengths'].max
     data['Results']['Max_Lq_Preoperative'] = Max_Lq_Preoperative
 
-    if data['Emergency Queue Lengths'].values():
-        Max_Lq_Emergency = max(data['Emergency Queue Lengths'].values())
-    else:
-        Max_Lq_Emergency = 0
+    Max_Lq_Emergency = data['Emergency Queue Lengths'].max
     data['Results']['Max_Lq_Emergency'] = Max_Lq_Emergency
 
-    if data['Laboratory Normal Queue Lengths'].values():
-        Max_Lq_Laboratory_Normal = max(data['Laboratory Normal Queue Lengths'].values())
-    else:
-        Max_Lq_Laboratory_Normal = 0
+    Max_Lq_Laboratory_Normal = data['Laboratory Normal Queue Lengths'].max
     data['Results']['Max_Lq_Laboratory_Normal'] = Max_Lq_Laboratory_Normal
 
-    if data['Laboratory Urgent Queue Lengths'].values():
-        Max_Lq_Laboratory_Urgent = max(data['Laboratory Urgent Queue Lengths'].values())
-    else:
-        Max_Lq_Laboratory_Urgent = 0
+    Max_Lq_Laboratory_Urgent = data['Laboratory Urgent Queue Lengths'].max
     data['Results']['Max_Lq_Laboratory_Urgent'] = Max_Lq_Laboratory_Urgent
 
-    if data['Operation Normal Queue Lengths'].values():
-        Max_Lq_Operation_Normal = max(data['Operation Normal Queue Lengths'].values())
-    else:
-        Max_Lq_Operation_Normal = 0
+    Max_Lq_Operation_Normal = data['Operation Normal Queue Lengths'].max
     data['Results']['Max_Lq_Operation_Normal'] = Max_Lq_Operation_Normal
 
-    if data['Operation Urgent Queue Lengths'].values():
-        Max_Lq_Operation_Urgent = max(data['Operation Urgent Queue Lengths'].values())
-    else:
-        Max_Lq_Operation_Urgent = 0
+    Max_Lq_Operation_Urgent = data['Operation Urgent Queue Lengths'].max
     data['Results']['Max_Lq_Operation_Urgent'] = Max_Lq_Operation_Urgent
 
-    if data['General Ward Queue Lengths'].values():
-        Max_Lq_General_Ward = max(data['General Ward Queue Lengths'].values())
-    else:
-        Max_Lq_General_Ward = 0
+    Max_Lq_General_Ward = data['General Ward Queue Lengths'].max
     data['Results']['Max_Lq_General_Ward'] = Max_Lq_General_Ward
 
-    if data['ICU Queue Lengths'].values():
-        Max_Lq_ICU = max(data['ICU Queue Lengths'].values())
-    else:
-        Max_Lq_ICU = 0
+    Max_Lq_ICU = data['ICU Queue Lengths'].max
     data['Results']['Max_Lq_ICU'] = Max_Lq_ICU
 
-    if data['CCU Queue Lengths'].values():
-        Max_Lq_CCU = max(data['CCU Queue Lengths'].values())
-    else:
-        Max_Lq_CCU = 0
+    Max_Lq_CCU = data['CCU Queue Lengths'].max
     data['Results']['Max_Lq_CCU'] = Max_Lq_CCU
 
-    # Warm Period Criteria
-    # Lq
-    Lq_Preoperative_Warm_Period = data['Cumulative Stats'][
-                                      'Area Under Preoperative Queue Length Curve(warm period)'] / (
-                                              simulation_time - warm_up_time)
-    data['Results']['Lq_Preoperative_Warm_Period'] = Lq_Preoperative_Warm_Period
-
-    # Wq
-    if data['Cumulative Stats']['Preoperative Service Starters(warm period)'] == 0:  # avoiding division by zero error
-        Wq_Preoperative_Warm_Period = 0
-    else:
-        Wq_Preoperative_Warm_Period = data['Cumulative Stats']['Preoperative Queue Waiting Time(warm period)'] / \
-                                      data['Cumulative Stats'][
-                                          'Preoperative Service Starters(warm period)']
-    data['Results']['Wq_Preoperative_Warm_Period'] = Wq_Preoperative_Warm_Period
-
-    # Finished Patients
-    Finished_Patients = data['Cumulative Stats']['Finished Patients']
+    # Finished Patients (after the warm-up period, like every other result)
+    Finished_Patients = data['Cumulative Stats']['Total Patients']
     data['Results']['Finished_Patients'] = Finished_Patients
 
+    # Percentiles of the waiting time in each queue. Like Wq, they are over all the patients who started service,
+    # so those served without waiting are added as zero waits, to a copy of the sketch (the run's own sketch keeps
+    # only the observed waits, so computing the Results does not change it)
+    for queue in WAITING_TIME_QUEUES:
+        name = queue.replace('_', ' ')
+        waiting_times = data[f'{name} Queue Waiting Times']
+        sketch = QuantileSketch(waiting_times.sketch.accuracy).merge(waiting_times.sketch)
+        sketch.add(0, data['Cumulative Stats'][f'{name} Service Starters'] - waiting_times.count)
+        data['Sketches'][f'Wq_{queue}'] = sketch
+        for percentile in PERCENTILES:
+            data['Results'][f'P{percentile}_Wq_{queue}'] = sketch.quantile(percentile / 100)
+
+    # Percentiles of the time in system
+    data['Sketches']['time_in_system'] = data['Time in System'].sketch
+    for percentile in PERCENTILES:
+        data['Results'][f'P{percentile}_time_in_system'] = data['Time in System'].sketch.quantile(percentile / 100)
+
+    # Share of the time each queue is not empty, and each department has all its beds busy (time-weighted histograms;
+    # the whole distributions are data['<name> Queue Length Histogram'] and data['<name> Occupancy Histogram'])
+    for queue, name in QUEUE_HISTOGRAMS.items():
+        data['Results'][f'Nonempty_Queue_Probability_{queue}'] = \
+            data[f'{name} Queue Length Histogram'].probability_at_least(1)
+    # The ICU and CCU lose beds during the power outage, so "all beds busy" is measured against their current capacity
+    # (the last bin of their histograms is the starting capacity)
+    for department, name in OCCUPANCY_HISTOGRAMS.items():
+        if name in ('ICU', 'CCU'):
+            probability = data['Cumulative Stats'][f'{name} All Beds Busy Time'] / observed_time
+        else:
+            histogram = data[f'{name} Occupancy Histogram']
+            probability = histogram.probability_at_least(len(histogram.time) - 1)
+        data['Results'][f'All_Beds_Busy_Probability_{department}'] = probability
+
+    if return_mode == 'results':
+        return data['Results']
+    if return_mode == 'vector':
+        return np.array([data['Results'][metric] for metric in RESULT_METRICS], dtype=np.float64)
+    if return_mode == 'summary':
+        return data['Results'], data['Sketches']
     return data
@@ -0,0 +1,323 @@
+"""
+**Benchmarks and Checks**
+
+Description:
+    Performance measurements of the simulation engine, and checks that a change leaves the model's output as it
+    should be. Run as a script, it prints the throughput before and after the last commit and the FEL comparison.
+
+Performance:
+    - event_queue_benchmark(): times the heap, calendar and ladder future event lists (see event_queue.py) at several
+      load levels (scaled_param()), after asserting that every backend pops the events in the same order as the heap.
+    - event_throughput(): events per second of the engine in the working tree.
+    - compare_throughput(): the same measurement at two git revisions (before/after a change).
+
+Checks:
+    - compare_revisions(): the Results of seeded runs at two git revisions, listing every metric that differs.
+      Revisions are run in a temporary git worktree and a fresh interpreter (run_at_revision()).
+    - check_queue_histograms(): asserts that the queue-length histograms agree with the average queue lengths (Lq)
+      and with the probability that the emergency queue is full.
+"""
+
+import base
+import math
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+import pandas as pd
+from event_queue import EVENT_QUEUES
+from get_result import original_param
+
+
+def scaled_param(param, load):
+    """
+    Scales a parameter set to a heavier load level.
+
+    Arrival rates and the bed capacities of every department are multiplied by `load`, so the hospital stays stable
+    while the number of patients in the system (and therefore of pending events in the FEL) grows with `load`.
+    """
+    param_copy = param.copy()
+    for key in ['Normal Arrival Exp Param', 'Urgent Arrival Exp Param']:
+        param_copy[key] = param[key] * load
+    for key in ['Preoperative Capacity', 'Emergency Capacity', 'Emergency Queue Capacity', 'Laboratory Capacity',
+                'Operation Capacity', 'General Ward Capacity', 'ICU Capacity', 'CCU Capacity']:
+        param_copy[key] = param[key] * load
+    return param_copy
+
+
+def fel_statistics(queue_class):
+    # Wraps an event queue class to count processed events and record the largest FEL size
+    class CountingQueue(queue_class):
+        events = 0
+        max_size = 0
+
+        def pop(self):
+            CountingQueue.events += 1
+            CountingQueue.max_size = max(CountingQueue.max_size, len(self))
+            return super().pop()
+
+    return CountingQueue
+
+
+def fel_recorder(queue_class):
+    # Wraps an event queue class to record the (time, code, patient) of every popped event, in pop order
+    class RecordingQueue(queue_class):
+        popped = []
+
+        def pop(self):
+            event = super().pop()
+            RecordingQueue.popped.append((event.time, event.code, event.patient))
+            return event
+
+    return RecordingQueue
+
+
+def event_queue_benchmark(simulation_time, param, loads=(1, 10, 25, 50), repeats=3, seed=0):
+    """
+    Compares the future event list backends (see event_queue.py) on the hospital model at several load levels.
+    Before timing them, it asserts that every backend pops the events in the same order as the heap.
+
+    Parameters:
+        simulation_time (int): Duration of each simulation run.
+        param (dict): Base parameters, scaled with scaled_param() for each load level.
+        loads (iterable): Load multipliers to benchmark.
+        repeats (int): Number of timed runs per (load, backend); the fastest one is reported.
+        seed (int): Seed used for every run, so all backends process exactly the same events.
+
+    Returns:
+        pd.DataFrame: One row per load level with the number of events, the largest FEL size and the best wall-clock
+        time (seconds) of each backend.
+    """
+    rows = []
+    for load in loads:
+        load_param = scaled_param(param, load)
+
+        # An untimed run to count events and measure how large the FEL gets
+        counting_queue = fel_statistics(EVENT_QUEUES['heap'])
+        base.simulation(simulation_time, load_param.copy(), event_queue=counting_queue, seed=seed)
+        row = {'Load': load, 'Events': counting_queue.events, 'Max FEL Size': counting_queue.max_size}
+
+        # Untimed runs checking that every backend pops the events in the same order as the heap
+        pop_orders = {}
+        for name, queue_class in EVENT_QUEUES.items():
+            recording_queue = fel_recorder(queue_class)
+            base.simulation(simulation_time, load_param.copy(), event_queue=recording_queue, seed=seed)
+            pop_orders[name] = recording_queue.popped
+        for name, popped in pop_orders.items():
+            assert popped == pop_orders['heap'], f"The {name} queue pops the events out of order at load {load}."
+
+        for name in EVENT_QUEUES:
+            timings = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                base.simulation(simulation_time, load_param.copy(), event_queue=name, seed=seed)
+                timings.append(time.perf_counter() - start)
+            row[f'{name} (s)'] = min(timings)
+
+        rows.append(row)
+        print(row)
+
+    return pd.DataFrame(rows).set_index('Load')
+
+
+def event_throughput(simulation_time, param, repeats=5, seed=0):
+    """
+    Measures the raw speed of the engine (event dispatch, handlers and FEL) in events per second.
+
+    Parameters:
+        simulation_time (int): Duration of each simulation run.
+        param (dict): Parameters of the scenario.
+        repeats (int): Number of timed runs; the fastest one is reported.
+        seed (int): Seed used for every run.
+
+    Returns:
+        dict: Number of events processed, best wall-clock time (seconds) and events per second.
+    """
+    counting_queue = fel_statistics(EVENT_QUEUES['heap'])
+    base.simulation(simulation_time, param.copy(), event_queue=counting_queue, seed=seed)
+
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        base.simulation(simulation_time, param.copy(), seed=seed)
+        timings.append(time.perf_counter() - start)
+
+    best = min(timings)
+    return {'Events': counting_queue.events, 'Time (s)': best, 'Events/s': counting_queue.events / best}
+
+
+# Run in a fresh interpreter inside a checkout of a revision: reads (task, arguments) from the file given as argument
+# and replaces it with the pickled output. Only relies on base.simulation(), so that it works for older revisions too.
+_REVISION_SCRIPT = '''
+import inspect, pickle, random, sys, time
+import numpy as np
+import base
+
+
+def run(simulation_time, param, seed, **kwargs):
+    if 'seed' in inspect.signature(base.simulation).parameters:
+        return base.simulation(simulation_time, dict(param), seed=seed, **kwargs)
+    random.seed(seed)  # revisions before seeded runs draw from the global generators
+    np.random.seed(seed)
+    return base.simulation(simulation_time, dict(param), **kwargs)
+
+
+def results(simulation_time, param, seeds):
+    return {seed: run(simulation_time, param, seed)['Results'] for seed in seeds}
+
+
+def throughput(simulation_time, param, repeats, seed):
+    events = None
+    if 'event_queue' in inspect.signature(base.simulation).parameters:
+        from event_queue import EVENT_QUEUES
+
+        class CountingQueue(EVENT_QUEUES['heap']):
+            count = 0
+
+            def pop(self):
+                CountingQueue.count += 1
+                return super().pop()
+
+        run(simulation_time, param, seed, event_queue=CountingQueue)
+        events = CountingQueue.count
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run(simulation_time, param, seed)
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    return {'Events': events, 'Time (s)': best, 'Events/s': events / best if events is not None else None}
+
+
+with open(sys.argv[1], 'rb') as file:
+    task, arguments = pickle.load(file)
+output = {'results': results, 'throughput': throughput}[task](*arguments)
+with open(sys.argv[1], 'wb') as file:
+    pickle.dump(output, file)
+'''
+
+
+def run_at_revision(revision, task, *arguments):
+    # Runs _REVISION_SCRIPT's task ('results' or 'throughput') on the model at a git revision (None: the working
+    # tree), in a temporary git worktree and a fresh interpreter, and returns its output
+    repository = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as directory:
+        checkout = repository
+        if revision is not None:
+            checkout = os.path.join(directory, 'checkout')
+            subprocess.run(['git', 'worktree', 'add', '--detach', checkout, revision], cwd=repository, check=True,
+                           capture_output=True)
+        try:
+            path = os.path.join(directory, 'output.pkl')
+            with open(path, 'wb') as file:
+                pickle.dump((task, arguments), file)
+            subprocess.run([sys.executable, '-c', _REVISION_SCRIPT, path], cwd=checkout, check=True)
+            with open(path, 'rb') as file:
+                return pickle.load(file)
+        finally:
+            if revision is not None:
+                subprocess.run(['git', 'worktree', 'remove', '--force', checkout], cwd=repository, check=True,
+                               capture_output=True)
+
+
+def seeded_results(revision, simulation_time, param, seeds):
+    # {seed: Results} of seeded runs of the model at a git revision (None: the working tree)
+    return run_at_revision(revision, 'results', simulation_time, param, list(seeds))
+
+
+def compare_throughput(baseline, revision=None, simulation_time=365 * 24, param=original_param, repeats=5, seed=0):
+    """
+    Before/after micro-benchmark: event_throughput() of the model at two git revisions.
+
+    Both revisions run the same seeded scenario, each in a fresh interpreter (see run_at_revision()), so a
+    performance change can be measured against the revision before it, e.g. compare_throughput('HEAD~1').
+
+    Parameters:
+        baseline (str): Git revision measured first ("before").
+        revision (str): Git revision measured second ("after"; None: the working tree).
+        simulation_time (int): Duration of each simulation run.
+        param (dict): Parameters of the scenario.
+        repeats (int): Number of timed runs per revision; the fastest one is reported.
+        seed (int): Seed used for every run.
+
+    Returns:
+        pd.DataFrame: One row per revision with the number of events, the best wall-clock time (seconds) and the
+        events per second. Events are None for revisions whose simulation() cannot take an event queue class.
+    """
+    rows = []
+    for label, rev in [('Baseline', baseline), ('Revision', revision)]:
+        row = {'Run': label, 'Revision': rev if rev is not None else 'working tree'}
+        row.update(run_at_revision(rev, 'throughput', simulation_time, param, repeats, seed))
+        rows.append(row)
+    return pd.DataFrame(rows).set_index('Run')
+
+
+def compare_revisions(baseline, revision=None, simulation_time=30 * 24, param=original_param, seeds=range(4)):
+    """
+    Checks that a change leaves the Results of seeded runs unchanged (e.g. a pure performance change).
+
+    Parameters:
+        baseline (str): Git revision the Results are compared against, e.g. 'HEAD~1'.
+        revision (str): Git revision to check (None: the working tree).
+        simulation_time (int): Duration of each simulation run.
+        param (dict): Parameters of the scenario.
+        seeds (iterable): Seeds of the runs; each is run at both revisions.
+
+    Returns:
+        pd.DataFrame: One row per (seed, metric) whose value differs, with both values. Only the metrics that exist
+        at both revisions are compared; an empty DataFrame means that the Results are identical.
+    """
+    expected = seeded_results(baseline, simulation_time, param, seeds)
+    actual = seeded_results(revision, simulation_time, param, seeds)
+    rows = [{'Seed': seed, 'Metric': metric, 'Baseline': expected[seed][metric], 'Revision': actual[seed][metric]}
+            for seed in expected for metric in expected[seed]
+            if metric in actual[seed] and expected[seed][metric] != actual[seed][metric]]
+    return pd.DataFrame(rows, columns=['Seed', 'Metric', 'Baseline', 'Revision'])
+
+
+def check_queue_histograms(simulation_time, param, seeds=range(4), warm_up_time=0):
+    """
+    Checks that the queue-length histograms agree with the average queue lengths (Lq) of the Results.
+
+    For every queue of base.QUEUE_HISTOGRAMS and every seeded run, the mean of the histogram must equal Lq. When the
+    queue reached the last bin (QUEUE_HISTOGRAM_SIZE - 1 or more), the histogram only gives a lower bound of the mean.
+    The share of the time the emergency queue histogram spends at the queue capacity must also equal
+    Full_Emergency_Queue_Probability.
+
+    Parameters:
+        simulation_time (int): Duration of each simulation run.
+        param (dict): Parameters of the scenario.
+        seeds (iterable): Seeds of the runs.
+        warm_up_time (float): Warm-up period of the runs (see base.simulation()).
+
+    Raises:
+        AssertionError: If a histogram and its Lq, or the emergency queue histogram and
+                        Full_Emergency_Queue_Probability, disagree.
+    """
+    for seed in seeds:
+        data = base.simulation(simulation_time, param.copy(), seed=seed, warm_up_time=warm_up_time)
+        for queue, name in base.QUEUE_HISTOGRAMS.items():
+            histogram = data[f'{name} Queue Length Histogram']
+            mean = sum(level * duration for level, duration in enumerate(histogram.time)) / sum(histogram.time)
+            lq = data['Results'][f'Lq_{queue}']
+            if histogram.time[-1] == 0:
+                assert math.isclose(mean, lq, rel_tol=1e-9, abs_tol=1e-12), \
+                    f"Lq_{queue} = {lq} but its histogram has mean {mean} (seed {seed})."
+            else:
+                assert mean <= lq * (1 + 1e-9), f"Lq_{queue} = {lq} is below its histogram's bound {mean} (seed {seed})."
+        full = data['Emergency Queue Length Histogram'].probability_at_least(int(param['Emergency Queue Capacity']))
+        probability = data['Results']['Full_Emergency_Queue_Probability']
+        assert math.isclose(probability, full, rel_tol=1e-9, abs_tol=1e-12), \
+            f"Full_Emergency_Queue_Probability = {probability} but its histogram gives {full} (seed {seed})."
+
+
+if __name__ == "__main__":
+
+    # Events per second of the engine on the default scenario (one simulated year), before (HEAD~1) and after (the
+    # working tree) the last change.
+    print(compare_throughput('HEAD~1'))
+
+    # Compare heap, calendar and ladder FEL backends with arrival rates (and capacities) scaled 1-50x.
+    print(event_queue_benchmark(simulation_time=3 * 24, param=original_param))
@@ -0,0 +1,283 @@
+"""
+**Future Event List**
+
+Description:
+    Priority-queue implementations of the future event list (FEL) used by base.simulation().
+    Events are the Event objects (see events.py) created in base.fel_maker(); the queue only decides the order in which
+    they fire.
+
+Ordering:
+    - Events fire in increasing event time.
+    - Events with the same event time fire in the order they were scheduled (a sequence number breaks ties).
+      This matches the stable sort the simulation used before, including the epsilon-spaced group arrivals.
+
+Backends:
+    Every backend has the same small interface: push(event), pop(), peek(), clear(), len() and iteration
+    (pending events in firing order, used for the trace output).
+        - 'heap': Binary heap. O(log n) push and pop.
+        - 'calendar': Calendar queue (Brown, 1988). Amortized O(1) push and pop when the FEL is large.
+        - 'ladder': Ladder queue (Tang, Goh & Thng, 2005). Amortized O(1), robust to skewed event times.
+"""
+
+import heapq
+import itertools
+from bisect import insort
+
+
+class HeapEventQueue:
+    """Binary heap of (event time, sequence number, event) entries."""
+
+    def __init__(self):
+        self._heap = []
+        self._sequence = itertools.count()
+
+    def push(self, event):
+        heapq.heappush(self._heap, (event.time, next(self._sequence), event))
+
+    def pop(self):
+        # Remove and return the imminent event
+        return heapq.heappop(self._heap)[2]
+
+    def peek(self):
+        # Return the imminent event without removing it
+        return self._heap[0][2]
+
+    def clear(self):
+        self._heap.clear()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __iter__(self):
+        # Pending events in the order they will fire (used for the trace output)
+        return (entry[2] for entry in sorted(self._heap))
+
+
+class CalendarQueue:
+    """
+    Calendar queue: an array of buckets ("days"), each bucket holding the entries whose event time falls on that day
+    of some "year" (bucket count * bucket width). Buckets are kept sorted, so the imminent event is the head of the
+    first bucket, scanning from the current day, whose head falls in the current year.
+    The number of buckets doubles/halves with the queue size and the bucket width is re-estimated on each resize.
+    """
+
+    def __init__(self, bucket_count=2, bucket_width=1.0):
+        self._sequence = itertools.count()
+        self._size = 0
+        self._last_time = 0  # time of the last dequeued event; nothing can be scheduled before it
+        self._setup(bucket_count, bucket_width, 0)
+
+    def _setup(self, bucket_count, bucket_width, current_day):
+        self._buckets = [[] for _ in range(bucket_count)]
+        self._bucket_count = bucket_count
+        self._bucket_width = bucket_width
+        self._current_day = current_day  # day number (not bucket index) of the last dequeued event
+        self._top_threshold = 2 * bucket_count
+        self._bottom_threshold = bucket_count // 2 - 2
+
+    def _day(self, event_time):
+        return int(event_time / self._bucket_width)
+
+    def _insert(self, entry):
+        insort(self._buckets[self._day(entry[0]) % self._bucket_count], entry)
+
+    def _locate(self):
+        # Day number of the imminent event (pop() moves the calendar to that day, peek() does not)
+        if self._size == 0:
+            raise IndexError('event queue is empty')
+        day = self._current_day
+        for _ in range(self._bucket_count):
+            bucket = self._buckets[day % self._bucket_count]
+            if bucket and self._day(bucket[0][0]) <= day:
+                return day
+            day += 1
+
+        # No event in the coming year: fall back to a direct search for the minimum
+        return self._day(min(bucket[0] for bucket in self._buckets if bucket)[0])
+
+    def _resize(self, bucket_count):
+        entries = sorted(entry for bucket in self._buckets for entry in bucket)
+
+        # Estimate a new bucket width from the separation of the earliest events, ignoring outliers
+        sample = [entry[0] for entry in entries[:25]]
+        gaps = [b - a for a, b in zip(sample, sample[1:])]
+        bucket_width = self._bucket_width
+        if gaps:
+            average_gap = sum(gaps) / len(gaps)
+            gaps = [gap for gap in gaps if gap <= 2 * average_gap]
+            if gaps and sum(gaps) > 0:
+                bucket_width = 3 * sum(gaps) / len(gaps)
+
+        start_time = min(self._last_time, entries[0][0]) if entries else self._last_time
+        self._setup(bucket_count, bucket_width, int(start_time / bucket_width))
+        for entry in entries:
+            self._buckets[self._day(entry[0]) % bucket_count].append(entry)  # entries are already sorted
+
+    def push(self, event):
+        self._insert((event.time, next(self._sequence), event))
+        self._size += 1
+        if self._size > self._top_threshold:
+            self._resize(2 * self._bucket_count)
+
+    def pop(self):
+        self._current_day = self._locate()
+        entry = self._buckets[self._current_day % self._bucket_count].pop(0)
+        self._last_time = entry[0]
+        self._size -= 1
+        if self._size < self._bottom_threshold:
+            self._resize(self._bucket_count // 2)
+        return entry[2]
+
+    def peek(self):
+        return self._buckets[self._locate() % self._bucket_count][0][2]
+
+    def clear(self):
+        self._size = 0
+        self._last_time = 0
+        self._setup(2, 1.0, 0)
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        return (entry[2] for entry in sorted(entry for bucket in self._buckets for entry in bucket))
+
+
+class _Rung:
+    # One rung of a ladder queue: equal-width buckets covering [start, start + len(buckets) * width)
+    __slots__ = ('start', 'width', 'buckets', 'current')
+
+    def __init__(self, start, width, bucket_count):
+        self.start = start
+        self.width = width
+        self.buckets = [[] for _ in range(bucket_count)]
+        self.current = 0  # index of the next bucket to be dequeued
+
+    def index(self, event_time):
+        return int((event_time - self.start) / self.width)
+
+    def add(self, entry):
+        index = min(max(self.index(entry[0]), 0), len(self.buckets) - 1)
+        self.buckets[index].append(entry)
+
+
+class LadderQueue:
+    """
+    Ladder queue: far-future events are appended unsorted to 'Top'; when needed they are spread over the buckets of
+    a 'Rung', and a bucket is only sorted (into 'Bottom') when it is about to be dequeued. Buckets that are still too
+    large are spread over a finer child rung instead.
+    """
+
+    THRESHOLD = 50  # largest bucket that is sorted into Bottom directly
+    MAX_RUNGS = 8
+
+    def __init__(self):
+        self._sequence = itertools.count()
+        self.clear()
+
+    def clear(self):
+        self._size = 0
+        self._top = []
+        self._top_min = float('inf')
+        self._top_max = float('-inf')
+        self._top_start = float('-inf')  # events at or after this time go to Top
+        self._rungs = []
+        self._bottom = []  # sorted entries, all earlier than anything in the rungs or in Top
+
+    def push(self, event):
+        entry = (event.time, next(self._sequence), event)
+        self._size += 1
+        event_time = entry[0]
+
+        if event_time >= self._top_start:
+            self._top.append(entry)
+            self._top_min = min(self._top_min, event_time)
+            self._top_max = max(self._top_max, event_time)
+            return
+
+        for rung in self._rungs:
+            if rung.index(event_time) >= rung.current:
+                rung.add(entry)
+                return
+
+        insort(self._bottom, entry)
+
+    def _spawn_rung_from_top(self):
+        top = self._top
+        width = (self._top_max - self._top_min) / len(top)
+        if width > 0:
+            rung = _Rung(self._top_min, width, len(top) + 1)
+            for entry in top:
+                rung.add(entry)
+            self._rungs.append(rung)
+            self._top_start = rung.start + len(rung.buckets) * width
+        else:  # all events in Top share the same time
+            self._bottom = sorted(top)
+            self._top_start = self._top_max
+        self._top = []
+        self._top_min = float('inf')
+        self._top_max = float('-inf')
+
+    def _fill_bottom(self):
+        while not self._bottom:
+            if not self._rungs:
+                if not self._top:
+                    raise IndexError('event queue is empty')
+                self._spawn_rung_from_top()
+                continue
+
+            rung = self._rungs[-1]
+            while rung.current < len(rung.buckets) and not rung.buckets[rung.current]:
+                rung.current += 1
+            if rung.current == len(rung.buckets):  # this rung is exhausted
+                self._rungs.pop()
+                continue
+
+            bucket = rung.buckets[rung.current]
+            rung.buckets[rung.current] = []
+            bucket_start = rung.start + rung.current * rung.width
+            rung.current += 1
+
+            if len(bucket) > self.THRESHOLD and len(self._rungs) < self.MAX_RUNGS:
+                child = _Rung(bucket_start, rung.width / len(bucket), len(bucket))
+                for entry in bucket:
+                    child.add(entry)
+                self._rungs.append(child)
+            else:
+                bucket.sort()
+                self._bottom = bucket
+
+    def pop(self):
+        self._fill_bottom()
+        self._size -= 1
+        return self._bottom.pop(0)[2]
+
+    def peek(self):
+        self._fill_bottom()
+        return self._bottom[0][2]
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        entries = list(self._top) + list(self._bottom)
+        for rung in self._rungs:
+            for bucket in rung.buckets[rung.current:]:
+                entries.extend(bucket)
+        return (entry[2] for entry in sorted(entries))
+
+
+EVENT_QUEUES = {
+    'heap': HeapEventQueue,
+    'calendar': CalendarQueue,
+    'ladder': LadderQueue,
+}
+
+
+def make_event_queue(event_queue='heap'):
+    # Accepts a backend name from EVENT_QUEUES or a class with the same interface
+    if isinstance(event_queue, str):
+        if event_queue not in EVENT_QUEUES:
+            raise ValueError(f"Unknown event queue '{event_queue}'. Choose from {list(EVENT_QUEUES)}.")
+        return EVENT_QUEUES[event_queue]()
+    return event_queue()
@@ -0,0 +1,50 @@
+"""
+**Events**
+
+Description:
+    Event records of the future event list used by base.simulation().
+    An event is a small Event object with three slots (time, code, patient) instead of a dict, and its type is an
+    integer code, so the main loop finds the handler of an event with one table lookup (base.EVENT_HANDLERS)
+    instead of comparing strings.
+
+Event codes:
+    Normal and urgent arrivals have their own code (the patient type used to travel in the event dict); both are
+    named 'Arrival'. WARM_UP ends the warm-up period of a run (see base.warm_up()).
+    EVENT_NAMES gives the name of every code, as shown in the trace output.
+"""
+
+(NORMAL_ARRIVAL, URGENT_ARRIVAL, LABORATORY_ARRIVAL, LABORATORY_DEPARTURE, OPERATION_ARRIVAL, OPERATION_DEPARTURE,
+ CONDITION_DETERIORATION, CARE_UNIT_DEPARTURE, POWER_OFF, POWER_ON, END_OF_SERVICE, END_OF_SIMULATION,
+ WARM_UP) = range(13)
+
+EVENT_NAMES = {
+    NORMAL_ARRIVAL: 'Arrival',
+    URGENT_ARRIVAL: 'Arrival',
+    LABORATORY_ARRIVAL: 'Laboratory Arrival',
+    LABORATORY_DEPARTURE: 'Laboratory Departure',
+    OPERATION_ARRIVAL: 'Operation Arrival',
+    OPERATION_DEPARTURE: 'Operation Departure',
+    CONDITION_DETERIORATION: 'Condition Deterioration',
+    CARE_UNIT_DEPARTURE: 'Care Unit Departure',
+    POWER_OFF: 'Power Off',
+    POWER_ON: 'Power On',
+    END_OF_SERVICE: 'End of Service',
+    END_OF_SIMULATION: 'End of Simulation',
+    WARM_UP: 'Warm Up',
+}
+
+
+class Event:
+    __slots__ = ('time', 'code', 'patient')
+
+    def __init__(self, time, code, patient=None):
+        self.time = time
+        self.code = code
+        self.patient = patient  # integer patient ID, None for events without a patient
+
+    @property
+    def name(self):
+        return EVENT_NAMES[self.code]
+
+    def __repr__(self):
+        return f'Event({self.time!r}, {self.name!r}, {self.patient!r})'
@@ -1,4 +1,9 @@
 import base
+from concurrent.futures import ProcessPoolExecutor
+import result_cache
+from result_cache import select_cache
+from variates import Variates
+from accumulators import QuantileSketch
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
@@ -38,7 +43,7 @@ original_param = {
 }
 
 
-def run_simulation(simulation_time, param, excel_creation=False):
+def run_simulation(simulation_time, param, excel_creation=False, warm_up_time=0):
 
     """
     This function runs a single hospital simulation and prints detailed metrics about its performance.
@@ -46,6 +51,7 @@ def run_simulation(simulation_time, param, excel_creation=False):
     Parameters:
         simulation_time (int): The total duration for which the simulation runs.
         param (dict): A set of parameters used to configure the simulation (e.g., hospital settings, patient flows, etc.).
+        warm_up_time (float): Warm-up period left out of every metric (see base.simulation()). Default is 0.
 
     Key Steps:
         1. Calls the base simulation function with the provided parameters, enabling Excel creation.
@@ -58,7 +64,7 @@ def run_simulation(simulation_time, param, excel_creation=False):
                - Average waiting times in queues.
                - Maximum waiting times in queues.
     """
-    simulation = base.simulation(simulation_time, param, excel_creation)['Results']
+    simulation = base.simulation(simulation_time, param, excel_creation, warm_up_time=warm_up_time)['Results']
 
     print('--------------------------------------------------------------')
     print('Metrics:\n')
@@ -120,16 +126,75 @@ def run_simulation(simulation_time, param, excel_creation=False):
     print(f"Max_Wq_ICU = {simulation['Max_Wq_ICU']}")
     print(f"Max_Wq_CCU = {simulation['Max_Wq_CCU']}")
     
-    print('\nWarm Period Criteria:')
-    print(f"Lq_Preoperative_Warm_Period = {simulation['Lq_Preoperative_Warm_Period']}")
-    print(f"Wq_Preoperative_Warm_Period = {simulation['Wq_Preoperative_Warm_Period']}")
-    print(f"Finished_Patients = {simulation['Finished_Patients']}")
+    print('\nWaiting time percentiles (P90, P95, P99) in different hospital departments:')
+    for queue in base.WAITING_TIME_QUEUES:
+        print(f"Wq_{queue}: " + ', '.join(str(simulation[f'P{percentile}_Wq_{queue}'])
+                                          for percentile in base.PERCENTILES))
+    print('Time in system: ' + ', '.join(str(simulation[f'P{percentile}_time_in_system'])
+                                         for percentile in base.PERCENTILES))
+
+    print('\nProbability that all beds of different hospital departments are busy:')
+    for department in base.OCCUPANCY_HISTOGRAMS:
+        print(f"All_Beds_Busy_Probability_{department} = {simulation[f'All_Beds_Busy_Probability_{department}']}")
+
+    print('\nProbability that queues in different hospital departments are not empty:')
+    for queue in base.QUEUE_HISTOGRAMS:
+        print(f"Nonempty_Queue_Probability_{queue} = {simulation[f'Nonempty_Queue_Probability_{queue}']}")
+
+    print(f"\nFinished_Patients = {simulation['Finished_Patients']}")
 
     print('--------------------------------------------------------------')
     print('Simulation Ended!')
 
 
-def replication(simulation_time, r, param, alpha):
+def replicate(simulation_time, param, seed, antithetic=False, warm_up_time=0):
+    # One replication. Only the Results dict, the input statistics (for control variates) and the quantile sketches
+    # of the percentiles (to pool them over the replications) are returned, so that little has to be sent back from a
+    # worker process or stored in the result cache, and the engine skips the histories nobody reads. The run gets its
+    # own copy of param, since the power outage changes the care-unit capacities while it lasts.
+    variates = Variates(param, seed, antithetic)
+    results, sketches = base.simulation(simulation_time, param.copy(), variates=variates, return_mode='summary',
+                                        warm_up_time=warm_up_time)
+    return results, variates.input_statistics(), sketches
+
+
+def _replicate_task(task):
+    return replicate(*task)
+
+
+def run_replications(tasks, workers=None, chunksize=1, desc=None, cache=None):
+    """
+    Runs replicate(*task) for every task and returns the results in task order.
+
+    Parameters:
+        tasks (list): Argument tuples of replicate().
+        workers (int): Number of worker processes (None or 1: run in this process).
+        chunksize (int): Number of tasks sent to a worker at once.
+        desc (str): Label of the progress bar.
+        cache (ResultCache): Cache looked up before simulating and filled afterwards (None: no caching). Only the
+                             runs that are not cached are simulated (and sent to the workers).
+    """
+    keys = [cache.key(*task) for task in tasks] if cache is not None else [None] * len(tasks)
+    outputs = [cache.get(key) if cache is not None else None for key in keys]
+    missing = [i for i, output in enumerate(outputs) if output is None]
+    pending = [tasks[i] for i in missing]
+
+    if workers is None or workers <= 1:
+        computed = [replicate(*task) for task in tqdm(pending, desc=desc)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            computed = list(tqdm(executor.map(_replicate_task, pending, chunksize=chunksize), total=len(pending),
+                                 desc=desc))
+
+    for i, output in zip(missing, computed):
+        outputs[i] = output
+        if cache is not None:
+            cache.put(keys[i], output)
+    return outputs
+
+
+def replication(simulation_time, r, param, alpha, antithetic=False, seed=None, control_variates=False, workers=None,
+                cache=True, warm_up_time=0):
     """
     Performs multiple replications of the hospital simulation to assess variability and provide confidence intervals for key metrics.
 
@@ -138,28 +203,65 @@ def replication(simulation_time, r, param, alpha):
         r (int): The number of independent replications to perform.
         param (dict): Parameters used for the simulation.
         alpha (float): The significance level (e.g., 0.05 for a 95% confidence interval).
+        antithetic (bool): If True, the r replications are run as r / 2 antithetic pairs: the second run of a pair
+                           uses 1 - U wherever the first one uses U. The pair means are the independent observations,
+                           so the confidence interval uses r / 2 - 1 degrees of freedom, and the 'Within-Pair
+                           Correlation' column shows whether the pairing helped (negative: narrower intervals).
+        seed (int): Seed of the replications (None: fresh entropy). Replication j (pair j when antithetic) is seeded
+                    with the j-th child of SeedSequence(seed).
+        control_variates (bool): If True, the realized mean interarrival time, surgery duration and care-unit LOS of
+                                 every replication are recorded (sheet 'Control Variates' of the Excel file), and
+                                 every metric is also estimated with the regression control-variate estimator
+                                 Y = b0 + b'(C - E[C]) + e: 'CV Point Estimate' (b0) and 'CV Confidence Interval'
+                                 (n - 4 degrees of freedom for n observations and 3 controls).
+        workers (int): Number of worker processes the replications are spread over (None: run them one after
+                       another in this process). The seeds do not depend on it, so the results are the same.
+        cache (bool or ResultCache): Result cache of the runs (see result_cache.py): True for
+                                     result_cache.default_cache, False for none. Only seeded runs are cached.
+        warm_up_time (float): Warm-up period left out of the statistics of every replication (see base.simulation()).
 
     Key Steps:
-        1. Run multiple replications of the simulation, storing results for each metric.
+        1. Run multiple replications of the simulation, storing results for each metric and merging the quantile
+           sketches of the percentile metrics.
         2. Organize the results into a Pandas DataFrame where rows represent metrics and columns represent replications.
         3. Compute statistical metrics:
             - Point estimates (means) and standard deviations.
             - Confidence intervals using the t-distribution.
         4. Add the calculated point estimates and confidence intervals to the DataFrame.
+        5. Add the percentiles of the merged sketches ('Pooled Estimate'): the percentile of all the waiting times
+           (or times in system) of the r replications, which the mean of the per-replication percentiles is not.
 
     Returns:
         pd.DataFrame: A DataFrame containing:
             - Metric values for each replication.
             - Point estimates (means).
             - Confidence intervals for each metric.
+            - Pooled estimates of the percentile metrics (NaN for the other metrics).
     """
 
+    if antithetic and r % 2 != 0:
+        raise ValueError("Antithetic replications are run in pairs, so r must be even.")
+
     # Initialize results dictionary
     list_of_result = None
-
-    for i in tqdm(range(r)):
-        # Run the simulation
-        result = base.simulation(simulation_time, param)['Results']
+    list_of_inputs = []  # realized input statistics of each replication (control variates)
+    pooled_sketches = {}  # quantile sketches of the percentile metrics, merged over the replications
+    seeds = np.random.SeedSequence(seed).spawn(r // 2 if antithetic else r)
+
+    # Run the simulations (an antithetic pair shares its seed; the second run of the pair uses 1 - U)
+    if antithetic:
+        tasks = [(simulation_time, param, seeds[i // 2], i % 2 == 1, warm_up_time) for i in range(r)]
+    else:
+        tasks = [(simulation_time, param, seeds[i], False, warm_up_time) for i in range(r)]
+    replications = run_replications(tasks, workers, cache=select_cache(cache, seed))
+
+    for i, (result, inputs, sketches) in enumerate(replications):
+        if control_variates:
+            list_of_inputs.append(inputs)
+        for name, sketch in sketches.items():
+            if name not in pooled_sketches:
+                pooled_sketches[name] = QuantileSketch(sketch.accuracy)
+            pooled_sketches[name].merge(sketch)
 
         # On the first iteration, initialize structures
         if i == 0:
@@ -175,8 +277,14 @@ def replication(simulation_time, r, param, alpha):
 
     # Calculate point estimate (mean) and confidence intervals for each metric
     means = results.mean(axis=1)  # Point estimate
-    stds = results.std(axis=1)  # Standard deviation
-    n = r  # Number of replications
+    if antithetic:
+        # The observations are the pair means
+        first, second = results.iloc[:, 0::2].to_numpy(), results.iloc[:, 1::2].to_numpy()
+        observations = pd.DataFrame((first + second) / 2, index=results.index)
+    else:
+        observations = results.copy()
+    stds = observations.std(axis=1)  # Standard deviation
+    n = observations.shape[1]  # Number of independent observations
     t_alpha = t.ppf(1 - alpha / 2, df=n - 1)  # Critical value from t-distribution
     ci_half_width = t_alpha * stds / (n ** 0.5)  # Half-width of the confidence interval
 
@@ -186,10 +294,55 @@ def replication(simulation_time, r, param, alpha):
         f"[{round(mean - ci, 4)}, {round(mean + ci, 4)}]"
         for mean, ci in zip(means, ci_half_width)
     ]
+    # Percentiles over the pooled observations of every replication
+    results['Pooled Estimate'] = pd.Series({f'P{percentile}_{name}': sketch.quantile(percentile / 100)
+                                            for name, sketch in pooled_sketches.items()
+                                            for percentile in base.PERCENTILES})
+    if antithetic:
+        # Correlation between the two runs of the pairs, per metric (NaN for metrics that do not vary)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            covariance = ((first - first.mean(axis=1, keepdims=True)) *
+                          (second - second.mean(axis=1, keepdims=True))).sum(axis=1) / (n - 1)
+            correlation = covariance / (first.std(axis=1, ddof=1) * second.std(axis=1, ddof=1))
+        results['Within-Pair Correlation'] = np.round(correlation, 4)
+
+    if control_variates:
+        # Deviation of the realized input means from their expectation, one row per replication
+        deviations = np.array([[realized - expected for realized, expected in inputs.values()]
+                               for inputs in list_of_inputs])
+        if antithetic:
+            deviations = (deviations[0::2] + deviations[1::2]) / 2
+        if n <= deviations.shape[1] + 1:
+            raise ValueError("Control variates need more independent observations than controls + 1.")
+
+        # Least squares fit of every metric at once on [1, C - E[C]]; the intercept is the adjusted estimate
+        X = np.column_stack([np.ones(n), deviations])
+        Y = observations.to_numpy(dtype=float).T
+        coefficients = np.linalg.lstsq(X, Y, rcond=None)[0]
+        cv_df = n - X.shape[1]
+        residual_variance = ((Y - X @ coefficients) ** 2).sum(axis=0) / cv_df
+        cv_se = np.sqrt(residual_variance * np.linalg.pinv(X.T @ X)[0, 0])
+        cv_means = coefficients[0]
+        cv_half_width = t.ppf(1 - alpha / 2, df=cv_df) * cv_se
+
+        results['CV Point Estimate'] = cv_means
+        results['CV Confidence Interval'] = [
+            f"[{round(mean - ci, 4)}, {round(mean + ci, 4)}]"
+            for mean, ci in zip(cv_means, cv_half_width)
+        ]
+
+        inputs = pd.DataFrame({f"Replication{j + 1}": {f"{name} ({kind})": value
+                                                      for name, values in list_of_inputs[j].items()
+                                                      for kind, value in zip(['realized', 'expected'], values)}
+                               for j in range(r)})
+    summary_columns = len(results.columns) - r
 
     # Save the results DataFrame as an Excel file (including row names)
     file_name = "simulation_results.xlsx"
     results.to_excel(file_name, sheet_name="Replication Results", index=True)
+    if control_variates:
+        with pd.ExcelWriter(file_name, engine='openpyxl', mode='a') as writer:
+            inputs.to_excel(writer, sheet_name="Control Variates", index=True)
     print(f"Results saved to {file_name}")
 
     # Load the Excel file to apply formatting using openpyxl
@@ -219,13 +372,13 @@ def replication(simulation_time, r, param, alpha):
         adjusted_width = (max_length + 2)  # Adding a bit of padding
         sheet.column_dimensions[column].width = adjusted_width
 
-    # Apply color to the last two columns (Point Estimate and Confidence Interval)
+    # Apply color to the summary columns (Point Estimate, Confidence Interval, ...)
     fill_color = PatternFill(start_color="FFFF99", end_color="FFFF99", fill_type="solid")
     last_column = len(results.columns) + 1  # Account for the index being included
-    second_last_column = len(results.columns)  # Adjusted for index
+    first_summary_column = last_column - summary_columns + 1
 
-    # Color the last two columns
-    for row in sheet.iter_rows(min_col=second_last_column, max_col=last_column):
+    # Color the summary columns
+    for row in sheet.iter_rows(min_col=first_summary_column, max_col=last_column):
         for cell in row:
             cell.fill = fill_color
 
@@ -236,7 +389,9 @@ def replication(simulation_time, r, param, alpha):
     return results
 
 
-def multi_sensitivity_analysis_with_individual_plots(simulation_time, param, analyses, replications, alpha=0.05):
+def multi_sensitivity_analysis_with_individual_plots(simulation_time, param, analyses, replications, alpha=0.05,
+                                                     seed=None, workers=None, chunksize=None, cache=True,
+                                                     warm_up_time=0):
     """
     Perform multiple sensitivity analyses and save individual plots for each metric/parameter pair.
 
@@ -249,31 +404,49 @@ def multi_sensitivity_analysis_with_individual_plots(simulation_time, param, ana
                   - 'parameter_values': List of values for the parameter
         replications: Number of replications per parameter value.
         alpha: Significance level for confidence intervals.
+        seed: Seed of the replications (None: fresh entropy). Replication k of every parameter value uses the k-th
+              child of SeedSequence(seed) (common random numbers), so the curves are not blurred by noise between
+              neighbouring values.
+        workers: Number of worker processes (None: run everything in this process).
+        chunksize: Number of simulations sent to a worker at once (None: about four chunks per worker).
+        cache: Result cache of the runs, as in replication(); with a disk cache, re-running the analysis (e.g. to
+               change alpha or the plots) does not simulate again.
+        warm_up_time: Warm-up period left out of the statistics of every run (see base.simulation()).
 
     Returns:
         A list of DataFrames, one for each analysis, containing the results.
     """
-    results_list = []
+    seeds = np.random.SeedSequence(seed).spawn(replications)
 
+    # Compute phase: every (parameter, value) point of the grid is simulated once, whatever the number of analyses
+    # that sweep it; its replications are tasks of one flat list
+    points = {}  # (parameter name, value) -> position of its first replication in tasks
+    tasks = []
     for analysis in analyses:
-        parameter_name = analysis['parameter_name']
-        parameter_values = analysis['parameter_values']
-        metric = analysis['metric']
-        results = []
-
-        for value in tqdm(parameter_values, desc=f"Analyzing {metric} ({parameter_name})"):
+        for value in analysis['parameter_values']:
+            point = (analysis['parameter_name'], value)
+            if point in points:
+                continue
+            points[point] = len(tasks)
             param_copy = param.copy()
-            param_copy[parameter_name] = value
-            metrics = []
-
-            for _ in range(replications):
-                result = base.simulation(simulation_time, param_copy)['Results']
-                metrics.append(result[metric])
-
+            param_copy[analysis['parameter_name']] = value
+            tasks.extend((simulation_time, param_copy, seeds[k], False, warm_up_time) for k in range(replications))
+    if chunksize is None:
+        chunksize = max(1, len(tasks) // (4 * workers)) if workers else 1
+    outputs = run_replications(tasks, workers, chunksize, desc="Sensitivity analysis",
+                               cache=select_cache(cache, seed))
+
+    # Reassemble: every analysis reads its metric from the replications of its points, in the original order
+    results_list = []
+    t_alpha = t.ppf(1 - alpha / 2, df=replications - 1)
+    for analysis in analyses:
+        results = []
+        for value in analysis['parameter_values']:
+            first = points[(analysis['parameter_name'], value)]
+            metrics = [result[analysis['metric']] for result, _, _ in outputs[first:first + replications]]
             # Calculate statistics
             mean_metric = np.mean(metrics)
             std_metric = np.std(metrics, ddof=1)
-            t_alpha = t.ppf(1 - alpha / 2, df=replications - 1)
             ci_half_width = t_alpha * (std_metric / np.sqrt(replications))
 
             results.append({
@@ -283,10 +456,13 @@ def multi_sensitivity_analysis_with_individual_plots(simulation_time, param, ana
                 'Upper CI': mean_metric + ci_half_width
             })
 
-        df_results = pd.DataFrame(results)
-        results_list.append(df_results)
+        results_list.append(pd.DataFrame(results))
+
+    # Plot phase: plot and save each analysis
+    for analysis, df_results in zip(analyses, results_list):
+        parameter_name = analysis['parameter_name']
+        metric = analysis['metric']
 
-        # Plot and save each analysis
         plt.figure(figsize=(8, 6))
         plt.plot(df_results['Parameter Value'], df_results['Point Estimate'], label='Point Estimate', color='orange',
                  linestyle='--')
@@ -345,11 +521,15 @@ analyses = [
 
 if __name__ == "__main__":
 
+    # Keep the seeded runs on disk, so that re-running the script (e.g. after changing a plot) does not simulate again.
+    result_cache.default_cache = result_cache.ResultCache(directory='.simulation_cache')
+
     results = multi_sensitivity_analysis_with_individual_plots(
         simulation_time=30 * 24,
         param=original_param,
         analyses=analyses,
-        replications=10
+        replications=10,
+        seed=2025
     )
 
     # run simulation once, show metrics results and save the trace as an Excel file (output.xlsx).
@@ -357,4 +537,4 @@ if __name__ == "__main__":
 
     # run some replication of the model for obtaining point estimate and confidence interval estimate for each metric.
     # save those as an Excel file (simulation_results.xlsx).
-    result = replication((30 * 24), 25, original_param, 0.05)
+    result = replication((30 * 24), 25, original_param, 0.05, seed=2025)
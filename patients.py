@@ -0,0 +1,257 @@
+"""
+**Patient Records**
+
+Description:
+    Columnar store for the patient records of base.simulation() (data['Patients']).
+    Patients are identified by their integer ID, which is also their row in every column:
+        - One typed array (float64, NaN = not reached yet) per timestamp, e.g. store.arrival_time[patient].
+        - Patient type, surgery type and unit type are small integer codes (0 = not set), e.g.
+          store.surgery_type[patient] == COMPLEX.
+    Columns grow geometrically, so adding a patient is amortized O(1) and a record costs about 120 bytes instead of a
+    dict of dicts. Each column can be exported as a NumPy array (see column()).
+
+Retention:
+    What happens to a record when its patient leaves the system (end of service or death), see make_patient_store():
+        - 'keep': PatientStore keeps the records of finished patients (deaths are dropped, as before).
+        - 'drop': TransientPatientStore deletes the record, so only the patients currently in the system are stored
+          and memory stays constant however long the run is.
+        - A callable: TransientPatientStore calls it with (patient, record) - record is a dict with the old keys -
+          and then deletes the record. Use it to aggregate whatever the run needs from finished patients.
+
+Backwards compatibility:
+    The store also behaves like the old dict of dicts for reading: iterating gives the IDs of the patients in the
+    system (in arrival order), store[patient] gives a dict-like view whose keys are the old ones
+    ('Arrival Time', 'Time Preoperative Service Begins', 'Surgery Type', ...). warm_up_analysis.py relies on this.
+"""
+
+from array import array
+from collections.abc import Mapping
+
+import numpy as np
+
+# Codes (0 means "not set")
+NORMAL, URGENT = 1, 2
+SIMPLE, MEDIUM, COMPLEX = 1, 2, 3
+GENERAL_WARD, ICU, CCU = 1, 2, 3
+
+PATIENT_TYPES = {NORMAL: 'Normal', URGENT: 'Urgent'}
+SURGERY_TYPES = {SIMPLE: 'Simple', MEDIUM: 'Medium', COMPLEX: 'Complex'}
+UNIT_TYPES = {GENERAL_WARD: 'General Ward', ICU: 'ICU', CCU: 'CCU'}
+
+# Old record key -> column name
+TIME_COLUMNS = {
+    'Arrival Time': 'arrival_time',
+    'Time Preoperative Service Begins': 'preoperative_service_begins',
+    'Time Emergency Service Begins': 'emergency_service_begins',
+    'Laboratory Arrival Time': 'laboratory_arrival_time',
+    'Time Laboratory Service Begins': 'laboratory_service_begins',
+    'Operation Arrival Time': 'operation_arrival_time',
+    'Time Operation Service Begins': 'operation_service_begins',
+    'General Ward Arrival Time': 'general_ward_arrival_time',
+    'Time General Ward Service Begins': 'general_ward_service_begins',
+    'ICU Arrival Time': 'icu_arrival_time',
+    'Time ICU Service Begins': 'icu_service_begins',
+    'CCU Arrival Time': 'ccu_arrival_time',
+    'Time CCU Service Begins': 'ccu_service_begins',
+    'Time Service Ends': 'service_ends',
+}
+CODE_COLUMNS = {
+    'Patient Type': ('patient_type', PATIENT_TYPES),
+    'Surgery Type': ('surgery_type', SURGERY_TYPES),
+    'Unit Type': ('unit_type', UNIT_TYPES),
+}
+
+NAN = float('nan')
+
+
+class PatientStore(Mapping):
+
+    def __init__(self, capacity=1024):
+        self._capacity = 0
+        self._count = 0
+        self.present = array('b')  # 1 while the patient is in the store
+        for name in TIME_COLUMNS.values():
+            setattr(self, name, array('d'))
+        for name, _ in CODE_COLUMNS.values():
+            setattr(self, name, array('b'))
+        self._grow(capacity)
+
+    def _grow(self, capacity):
+        extra = capacity - self._capacity
+        self.present.extend(array('b', [0]) * extra)
+        for name in TIME_COLUMNS.values():
+            getattr(self, name).extend(array('d', [NAN]) * extra)
+        for name, _ in CODE_COLUMNS.values():
+            getattr(self, name).extend(array('b', [0]) * extra)
+        self._capacity = capacity
+
+    def add(self, patient, arrival_time, patient_type):
+        if patient >= self._capacity:
+            self._grow(max(patient + 1, 2 * self._capacity))
+        self.present[patient] = 1
+        self.arrival_time[patient] = arrival_time
+        self.patient_type[patient] = patient_type
+        self._count += 1
+
+    def remove(self, patient):
+        # The patient leaves the store (the row is kept, but no longer reported)
+        if self.present[patient]:
+            self.present[patient] = 0
+            self._count -= 1
+
+    def exit(self, patient):
+        # The patient leaves the system: finished records are kept
+        pass
+
+    def pop(self, patient, default=None):
+        if patient in self:
+            record = dict(self[patient])
+            self.remove(patient)
+            return record
+        return default
+
+    def column(self, key):
+        # NumPy copy of a column, by old record key or column name; row = patient ID
+        name = TIME_COLUMNS.get(key) or CODE_COLUMNS.get(key, (key,))[0]
+        column = getattr(self, name)
+        return np.array(column, dtype=np.float64 if column.typecode == 'd' else np.int8)
+
+    # Mapping interface (backwards compatibility with the dict of dicts)
+    def __getitem__(self, patient):
+        if patient not in self:
+            raise KeyError(patient)
+        return PatientView(self, patient)
+
+    def __contains__(self, patient):
+        return isinstance(patient, int) and 0 <= patient < self._capacity and self.present[patient] == 1
+
+    def __iter__(self):
+        return (patient for patient in range(self._capacity) if self.present[patient])
+
+    def __len__(self):
+        return self._count
+
+
+class PatientView(Mapping):
+    """Dict-like view of one patient record, with the old keys and string values for the coded columns."""
+
+    __slots__ = ('_store', '_patient')
+
+    def __init__(self, store, patient):
+        self._store = store
+        self._patient = patient
+
+    def __getitem__(self, key):
+        if key in TIME_COLUMNS:
+            value = getattr(self._store, TIME_COLUMNS[key])[self._patient]
+            if value != value:  # NaN: not reached yet
+                raise KeyError(key)
+            return value
+        if key in CODE_COLUMNS:
+            name, labels = CODE_COLUMNS[key]
+            code = getattr(self._store, name)[self._patient]
+            if code == 0:
+                raise KeyError(key)
+            return labels[code]
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        if key in TIME_COLUMNS:
+            value = getattr(self._store, TIME_COLUMNS[key])[self._patient]
+            return value == value
+        if key in CODE_COLUMNS:
+            return getattr(self._store, CODE_COLUMNS[key][0])[self._patient] != 0
+        return False
+
+    def __setitem__(self, key, value):
+        if key in TIME_COLUMNS:
+            getattr(self._store, TIME_COLUMNS[key])[self._patient] = value
+        elif key in CODE_COLUMNS:
+            name, labels = CODE_COLUMNS[key]
+            codes = {label: code for code, label in labels.items()}
+            getattr(self._store, name)[self._patient] = codes[value]
+        else:
+            raise KeyError(key)
+
+    def __iter__(self):
+        for key in list(TIME_COLUMNS) + list(CODE_COLUMNS):
+            if key in self:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class _Column(dict):
+    # Column of a TransientPatientStore; values that were never set read as NaN (times) or 0 (codes), like the arrays
+    __slots__ = ('_missing',)
+
+    def __init__(self, missing):
+        super().__init__()
+        self._missing = missing
+
+    def __missing__(self, patient):
+        return self._missing
+
+
+class TransientPatientStore(PatientStore):
+    """
+    Patient store that only holds the patients currently in the system: every column is a dict keyed by patient ID,
+    and a patient's entries are deleted when it leaves. `on_exit`, if given, receives (patient, record) first.
+    """
+
+    def __init__(self, on_exit=None):
+        self.on_exit = on_exit
+        self.present = {}  # patient -> 1, in arrival order
+        for name in TIME_COLUMNS.values():
+            setattr(self, name, _Column(NAN))
+        for name, _ in CODE_COLUMNS.values():
+            setattr(self, name, _Column(0))
+
+    def add(self, patient, arrival_time, patient_type):
+        self.present[patient] = 1
+        self.arrival_time[patient] = arrival_time
+        self.patient_type[patient] = patient_type
+
+    def remove(self, patient):
+        if self.present.pop(patient, None):
+            for name in TIME_COLUMNS.values():
+                getattr(self, name).pop(patient, None)
+            for name, _ in CODE_COLUMNS.values():
+                getattr(self, name).pop(patient, None)
+
+    def exit(self, patient):
+        # The patient leaves the system: hand the record to on_exit, then forget it
+        if self.on_exit is not None and patient in self:
+            self.on_exit(patient, dict(self[patient]))
+        self.remove(patient)
+
+    def column(self, key):
+        # NumPy array of a column for the patients currently stored (in arrival order, not indexed by patient ID)
+        name = TIME_COLUMNS.get(key) or CODE_COLUMNS.get(key, (key,))[0]
+        column = getattr(self, name)
+        values = [column[patient] for patient in self.present]
+        return np.array(values, dtype=np.float64 if name in TIME_COLUMNS.values() else np.int8)
+
+    def __contains__(self, patient):
+        return patient in self.present
+
+    def __iter__(self):
+        return iter(list(self.present))
+
+    def __len__(self):
+        return len(self.present)
+
+
+def make_patient_store(retention='keep'):
+    # retention: 'keep', 'drop' or a callable(patient, record) (see the module docstring)
+    if retention == 'keep':
+        return PatientStore()
+    if retention == 'drop':
+        return TransientPatientStore()
+    if callable(retention):
+        return TransientPatientStore(on_exit=retention)
+    raise ValueError(f"Unknown retention policy '{retention}'. Choose 'keep', 'drop' or a callable.")
@@ -0,0 +1,181 @@
+"""
+**Result Cache**
+
+Description:
+    Memoizes seeded simulation runs, so that re-running a replication study, a sensitivity grid or a warm-up analysis
+    (e.g. to change a plot or the confidence level) does not simulate the same runs again.
+    A run is identified by a canonical hash of (param, simulation_time, seed, antithetic, warm_up_time,
+    base.ENGINE_VERSION), see
+    ResultCache.key(). Only what get_result.replicate() returns is stored (the Results dict, the small input
+    statistics dict and the quantile sketches of the percentiles), never the full data dict of a run.
+
+Tiers:
+    - Memory: the `maxsize` most recently used entries (LRU).
+    - Disk (optional, `directory`): one pickle file per entry. The file's modification time is its last use; when the
+      files exceed `max_bytes`, the least recently used ones are deleted. The disk tier survives the process, so it is
+      shared by successive scripts and by the worker processes of one study.
+
+Invalidation:
+    base.ENGINE_VERSION is part of the key; it must be increased whenever a change to the model changes the Results
+    of a seeded run. Unseeded runs are not reproducible and are never cached (key() returns None).
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+from base import ENGINE_VERSION
+
+
+def _canonical(value):
+    # JSON-serializable form of a parameter value (NumPy scalars from np.linspace / np.arange become Python numbers)
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (tuple, list)):
+        return [_canonical(item) for item in value]
+    return value
+
+
+class ResultCache:
+    """Two-tier LRU cache of simulation results (see the module docstring)."""
+
+    def __init__(self, maxsize=256, directory=None, max_bytes=2 ** 30):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._memory = OrderedDict()
+        self._disk_bytes = None  # total size of the disk tier, measured on first use
+        self.hits = 0
+        self.misses = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(simulation_time, param, seed, antithetic=False, warm_up_time=0):
+        # Canonical hash of a run, or None for an unseeded run
+        if seed is None:
+            return None
+        seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        payload = {
+            'param': {name: _canonical(value) for name, value in param.items()},
+            'simulation_time': _canonical(simulation_time),
+            'seed': [_canonical(seed_sequence.entropy), list(seed_sequence.spawn_key), seed_sequence.pool_size],
+            'antithetic': bool(antithetic),
+            'warm_up_time': _canonical(warm_up_time),
+            'engine': ENGINE_VERSION,
+        }
+        text = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def get(self, key):
+        # Cached entry, or None (a disk hit is promoted to the memory tier)
+        if key is None:
+            return None
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return self._memory[key]
+        if self.directory is not None:
+            path = self._path(key)
+            try:
+                with open(path, 'rb') as file:
+                    entry = pickle.load(file)
+                os.utime(path)  # mark as recently used
+            except (OSError, EOFError, pickle.UnpicklingError):
+                entry = None
+            if entry is not None:
+                self._remember(key, entry)
+                self.hits += 1
+                return entry
+        self.misses += 1
+        return None
+
+    def put(self, key, entry):
+        if key is None:
+            return
+        self._remember(key, entry)
+        if self.directory is not None:
+            self._write(key, entry)
+
+    def clear(self):
+        # Empty both tiers
+        self._memory.clear()
+        if self.directory is not None:
+            for name in os.listdir(self.directory):
+                if name.endswith('.pkl'):
+                    os.remove(os.path.join(self.directory, name))
+            self._disk_bytes = 0
+
+    def __len__(self):
+        return len(self._memory)
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.pkl')
+
+    def _write(self, key, entry):
+        # Write to a temporary file first, so that a reader never sees a partial entry
+        path = self._path(key)
+        if self._disk_bytes is None:
+            self._disk_bytes = sum(size for _, size, _ in self._files())
+        if os.path.exists(path):
+            self._disk_bytes -= os.path.getsize(path)
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(descriptor, 'wb') as file:
+            pickle.dump(entry, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, path)
+        self._disk_bytes += os.path.getsize(path)
+        if self._disk_bytes > self.max_bytes:
+            self._evict()
+
+    def _files(self):
+        # (path, size, last use) of the entries on disk
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.pkl'):
+                path = os.path.join(self.directory, name)
+                try:
+                    status = os.stat(path)
+                except FileNotFoundError:  # deleted by another process
+                    continue
+                files.append((path, status.st_size, status.st_mtime))
+        return files
+
+    def _evict(self):
+        # Delete the least recently used files until the disk tier fits in max_bytes again
+        files = sorted(self._files(), key=lambda file: file[2])
+        total = sum(size for _, size, _ in files)
+        for path, size, _ in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._disk_bytes = total
+
+
+# Cache used by the drivers (get_result.replication(), the sensitivity analysis, warm_up_replication()) when they are
+# called with cache=True. Memory only; replace it with ResultCache(directory=...) to keep results between scripts.
+default_cache = ResultCache()
+
+
+def select_cache(cache, seed):
+    # The cache a driver uses: cache is True (default_cache), False/None (no caching) or a ResultCache.
+    # Unseeded runs are not reproducible, so they are never cached.
+    if seed is None or cache is None or cache is False:
+        return None
+    return default_cache if cache is True else cache
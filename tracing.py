@@ -0,0 +1,365 @@
+"""
+**Trace Recorders**
+
+Description:
+    A recorder receives one row per simulation step from base.simulation() (the "trace" of the run).
+    Every recorder has the same interface:
+        - enabled: False if the recorder ignores every row (base.simulation() then skips the call entirely).
+        - record(step, current_event, state, data, future_event_list): called after each event is processed.
+        - close(state, data): called once when the simulation ends.
+
+Recorders:
+    - NullRecorder: Records nothing. Default for replications and sensitivity runs.
+    - ExcelRecorder: Keeps the whole trace in memory and writes it to 'output.xlsx' (excel_creation=True).
+    - StreamingRecorder: Writes the trace to CSV or Parquet in chunks while the simulation runs (bounded memory).
+    - FilteredRecorder: Passes only some steps (a time window, every k-th step, or the steps around a trigger
+      condition) on to another recorder.
+"""
+
+import csv
+from collections import deque
+import pandas as pd
+
+
+class NullRecorder:
+    enabled = False
+
+    def record(self, step, current_event, state, data, future_event_list):
+        pass
+
+    def close(self, state, data):
+        pass
+
+
+class ExcelRecorder:
+    enabled = True
+
+    def __init__(self):
+        self.table = []  # a list of lists. Each inner list will be a row in the Excel output.
+
+    def record(self, step, current_event, state, data, future_event_list):
+        self.table.append(create_row(step, current_event, state, data, future_event_list))
+
+    def close(self, state, data):
+        if not self.table:  # nothing was recorded (e.g. a filtered trace that never triggered)
+            return
+        excel_main_header = create_main_header(state, data)
+        justify(self.table)
+        create_excel(self.table, excel_main_header)
+
+
+class StreamingRecorder:
+    """
+    Streams the trace to disk in chunks of about `chunk_size` rows (at most one step's FEL more), so memory stays
+    bounded however long the run is and however large the FEL grows.
+
+    Two files are written:
+        - '<path>_steps.<ext>': one row per step (Step, Clock, Event Type, Event Patient, state variables and
+          cumulative stats), i.e. the same columns as output.xlsx without the future events.
+        - '<path>_fel.<ext>': the FEL in long format, one row per pending event after each step
+          (Step, Position, Event Time, Event Type, Event Patient).
+
+    Parameters:
+        path (str): Path prefix of the output files.
+        file_format (str): 'csv' or 'parquet' (Parquet needs pyarrow).
+        chunk_size (int): Number of rows buffered (in either file) before a chunk is written. Every step adds one row
+                          to the steps file and one row per pending event to the FEL file.
+    """
+
+    enabled = True
+    fel_header = ['Step', 'Position', 'Event Time', 'Event Type', 'Event Patient']
+
+    def __init__(self, path='trace', file_format='csv', chunk_size=10000):
+        if file_format not in ('csv', 'parquet'):
+            raise ValueError(f"Unknown trace format '{file_format}'. Choose from ['csv', 'parquet'].")
+        self.steps_path = f'{path}_steps.{file_format}'
+        self.fel_path = f'{path}_fel.{file_format}'
+        self.file_format = file_format
+        self.chunk_size = chunk_size
+        self.step_header = None
+        self.step_rows = []
+        self.fel_rows = []
+        self.writers = None
+
+    def record(self, step, current_event, state, data, future_event_list):
+        if self.step_header is None:
+            self.step_header = create_main_header(state, data)
+
+        row = [step, current_event.time, current_event.name, patient_label(current_event.patient)]
+        row.extend(state.values())
+        row.extend(data['Cumulative Stats'].values())
+        self.step_rows.append(row)
+
+        for position, event in enumerate(future_event_list, start=1):  # iterates in firing order
+            self.fel_rows.append([step, position, event.time, event.name, patient_label(event.patient)])
+
+        if len(self.step_rows) >= self.chunk_size or len(self.fel_rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.step_rows:
+            return
+        if self.writers is None:
+            self.writers = [self._open(self.steps_path, self.step_header), self._open(self.fel_path, self.fel_header)]
+        self._write(self.writers[0], self.step_header, self.step_rows)
+        self._write(self.writers[1], self.fel_header, self.fel_rows)
+        self.step_rows = []
+        self.fel_rows = []
+
+    def close(self, state, data):
+        self.flush()
+        if self.writers is not None:
+            for handle, writer in self.writers:
+                (handle or writer).close()
+            self.writers = None
+            print(f"Trace saved to {self.steps_path} and {self.fel_path}")
+
+    def _open(self, file_path, header):
+        if self.file_format == 'csv':
+            handle = open(file_path, 'w', newline='')
+            writer = csv.writer(handle)
+            writer.writerow(header)
+            return handle, writer
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # Fixed column types, so that every chunk has the same schema
+        fields = []
+        for name in header:
+            if name in ('Step', 'Position'):
+                fields.append(pa.field(name, pa.int64()))
+            elif name in ('Event Type', 'Event Patient'):
+                fields.append(pa.field(name, pa.string()))
+            else:
+                fields.append(pa.field(name, pa.float64()))
+        return None, pq.ParquetWriter(file_path, pa.schema(fields))
+
+    def _write(self, handle_writer, header, rows):
+        handle, writer = handle_writer
+        if self.file_format == 'csv':
+            writer.writerows(rows)
+            return
+
+        import pyarrow as pa
+
+        columns = list(zip(*rows)) if rows else [[] for _ in header]
+        arrays = []
+        for field, column in zip(writer.schema, columns):
+            if pa.types.is_string(field.type):
+                column = [None if value is None else str(value) for value in column]
+            arrays.append(pa.array(column, type=field.type))
+        writer.write_table(pa.Table.from_arrays(arrays, schema=writer.schema))
+
+
+class FilteredRecorder:
+    """
+    Forwards only selected steps to another recorder, so long runs can be traced around an incident only.
+
+    Parameters:
+        recorder: The recorder that receives the selected steps (e.g. ExcelRecorder or StreamingRecorder).
+        start_time (float): Steps before this simulated time are ignored (None: from the start).
+        end_time (float): Steps after this simulated time are ignored (None: until the end).
+        every (int): Only every k-th step (by step number) is considered.
+        trigger (callable): trigger(state, data) -> bool. If given, steps are only recorded from a step where the
+                            trigger fires, e.g. lambda state, data: state['Emergency Queue'] >= 10. The trigger fires
+                            when the condition becomes true (it was false at the previous considered step, or this is
+                            the first one), so a condition that stays true, like the power outage, fires only once.
+        pre_trigger_steps (int): Number of considered steps before the trigger that are kept in a ring buffer and
+                                 recorded as well. To keep buffering cheap, a buffered step keeps copies of the state
+                                 and the cumulative stats but only the next pending event instead of the whole FEL
+                                 (O(1) per step rather than O(FEL)).
+        post_trigger_steps (int): Number of considered steps recorded after the trigger fires (including the
+                                  triggering step). None records until the end. Afterwards the trigger is re-armed,
+                                  and fires again once its condition has been false and becomes true again.
+
+    Example:
+        # Trace one day around the power outage of a 900-day run
+        FilteredRecorder(StreamingRecorder('outage'), trigger=lambda state, data: state['Power Outage'] == 1,
+                         pre_trigger_steps=100, post_trigger_steps=2000)
+    """
+
+    enabled = True
+
+    def __init__(self, recorder, start_time=None, end_time=None, every=1, trigger=None, pre_trigger_steps=0,
+                 post_trigger_steps=None):
+        self.recorder = recorder
+        self.start_time = start_time
+        self.end_time = end_time
+        self.every = every
+        self.trigger = trigger
+        self.post_trigger_steps = post_trigger_steps
+        self.buffer = deque(maxlen=pre_trigger_steps) if trigger is not None and pre_trigger_steps > 0 else None
+        self.triggered = False
+        self.condition = False  # value of the trigger condition at the last considered step it was evaluated
+        self.remaining = None  # steps left to record after the trigger fired (None: no limit)
+
+    def record(self, step, current_event, state, data, future_event_list):
+        clock = current_event.time
+        if self.start_time is not None and clock < self.start_time:
+            return
+        if self.end_time is not None and clock > self.end_time:
+            return
+        if step % self.every != 0:
+            return
+
+        if self.trigger is None:
+            self.recorder.record(step, current_event, state, data, future_event_list)
+            return
+
+        if not self.triggered:
+            condition = self.trigger(state, data)
+            fires = condition and not self.condition  # only when the condition becomes true
+            self.condition = condition
+            if not fires:
+                if self.buffer is not None:
+                    # state and data change in place, so the ring buffer keeps copies; of the FEL only the next event
+                    next_events = [future_event_list.peek()] if len(future_event_list) else []
+                    self.buffer.append((step, current_event, dict(state),
+                                        {'Cumulative Stats': dict(data['Cumulative Stats'])}, next_events))
+                return
+
+            # Trigger fired: first record the steps that led to it
+            if self.buffer is not None:
+                for buffered_step in self.buffer:
+                    self.recorder.record(*buffered_step)
+                self.buffer.clear()
+            self.triggered = True
+            self.remaining = self.post_trigger_steps
+
+        self.recorder.record(step, current_event, state, data, future_event_list)
+        if self.remaining is not None:
+            self.remaining -= 1
+            if self.remaining <= 0:
+                self.triggered = False  # re-arm the trigger (self.condition is still true: it must become false first)
+
+    def close(self, state, data):
+        self.recorder.close(state, data)
+
+
+def patient_label(patient):
+    # The engine uses integer patient IDs; the trace shows them as 'P1', 'P2', ...
+    if patient is None:
+        return None
+    return 'P' + str(patient)
+
+
+def create_row(step, current_event, state, data, future_event_list):
+    # This function will create a list, which will eventually become a row of the output Excel file
+
+    # What should this row contain?
+    # 1. Step, Clock, Event Type and Event Patient
+    row = [step, current_event.time, current_event.name, patient_label(current_event.patient)]
+    # 2. All state variables
+    row.extend(list(state.values()))
+    # 3. All Cumulative Stats
+    row.extend(list(data['Cumulative Stats'].values()))
+    # 4. All events in fel ('Event Time', 'Event Type' & 'Event Customer' for each event)
+    for event in future_event_list:  # iterates in firing order
+        row.append(event.time)
+        row.append(event.name)
+        row.append(patient_label(event.patient))
+    return row
+
+
+def justify(table):
+    # This function adds blanks to short rows in order to match their lengths to the maximum row length
+
+    # Find maximum row length in the table
+    row_max_len = 0
+    for row in table:
+        if len(row) > row_max_len:
+            row_max_len = len(row)
+
+    # For each row, add enough blanks
+    for row in table:
+        row.extend([""] * (row_max_len - len(row)))
+
+
+def create_main_header(state, data):
+    # This function creates the main part of header (returns a list)
+    # A part of header which is used for future events will be created in create_excel()
+
+    # Header consists of ...
+    # 1. Step, Clock, Event Type and Event Patient
+    header = ['Step', 'Clock', 'Event Type', 'Event Patient']
+    # 2. Names of the state variables
+    header.extend(list(state.keys()))
+    # 3. Names of the cumulative stats
+    header.extend(list(data['Cumulative Stats'].keys()))
+    return header
+
+
+def create_excel(table, header):
+    # This function creates and fine-tunes the Excel output file
+
+    # Find length of each row in the table
+    row_len = len(table[0])
+
+    # Find length of header (header does not include cells for fel at this moment)
+    header_len = len(header)
+
+    # row_len exceeds header_len by (max_fel_length * 3) (Event Type, Event Time & Customer for each event in FEL)
+    # Extend the header with 'Future Event Time', 'Future Event Type', 'Future Event Patient'
+    # for each event in the fel with maximum size
+    i = 1
+    for col in range((row_len - header_len) // 3):
+        header.append('Future Event Time ' + str(i))
+        header.append('Future Event Type ' + str(i))
+        header.append('Future Event Patient ' + str(i))
+        i += 1
+
+    # Dealing with the output
+    # First create a pandas DataFrame
+    df = pd.DataFrame(table, columns=header, index=None)
+
+    # Create a handle to work on the Excel file
+    writer = pd.ExcelWriter('output.xlsx', engine='xlsxwriter')
+
+    # Write out the Excel file to the hard drive
+    df.to_excel(writer, sheet_name='Initial State Output', header=False, startrow=1, index=False)
+
+    # Use the handle to get the workbook (just library syntax, can be found with a simple search)
+    workbook = writer.book
+
+    # Get the sheet you want to work on
+    worksheet = writer.sheets['Initial State Output']
+
+    # Create a cell-formatter object (this will be used for the cells in the header, hence: header_formatter!)
+    header_formatter = workbook.add_format()
+
+    # Define whatever format you want
+    header_formatter.set_align('center')
+    header_formatter.set_align('vcenter')
+    header_formatter.set_font('Times New Roman')
+    header_formatter.set_bold('True')
+
+    # Write out the column names and apply the format to the cells in the header row
+    for col_num, value in enumerate(df.columns.values):
+        worksheet.write(0, col_num, value, header_formatter)
+
+    # Auto-fit columns
+    # Copied from https://stackoverflow.com/questions/29463274/simulate-autofit-column-in-xslxwriter
+    for i, width in enumerate(get_col_widths(df)):
+        worksheet.set_column(i - 1, i - 1, width)
+
+    # Create a cell-formatter object for the body of Excel file
+    main_formatter = workbook.add_format()
+    main_formatter.set_align('center')
+    main_formatter.set_align('vcenter')
+    main_formatter.set_font('Times New Roman')
+
+    # Apply the format to the body cells
+    for row in range(1, len(df) + 1):
+        worksheet.set_row(row, None, main_formatter)
+
+    # Save your edits
+    writer.close()
+
+
+def get_col_widths(dataframe):
+    # Copied from https://stackoverflow.com/questions/29463274/simulate-autofit-column-in-xslxwriter
+    # First we find the maximum length of the index column
+    idx_max = max([len(str(s)) for s in dataframe.index.values] + [len(str(dataframe.index.name))])
+    # Then, we concatenate this to the max of the lengths of column name and its values for each column, left to right
+    return [idx_max] + [max([len(str(s)) for s in dataframe[col].values] + [len(col)]) for col in dataframe.columns]
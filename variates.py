@@ -0,0 +1,199 @@
+"""
+**Random Variates**
+
+Description:
+    Buffered random variate generation for base.simulation() (data['Variates']).
+    Drawing variates one by one costs a Python call, and for NumPy an array set-up, per number. Instead every input
+    distribution (with its parameters) gets a VariateStream that draws a block of `block_size` variates at once from a
+    numpy.random.Generator and hands them out one at a time as plain Python numbers.
+    Every variate is obtained by inverse transform from one uniform U (see the inverse CDFs below), so the monotone
+    mapping from random numbers to inputs needed for antithetic variates holds for every source.
+
+Seeding:
+    Every stream has its own Generator, spawned from one SeedSequence(seed) in the fixed order of STREAMS, so
+    the same seed reproduces a run, and two scenarios run with the same seed use the same random numbers for each
+    source (e.g. the same arrival times) even when they consume the sources at different rates.
+    New streams must be appended to STREAMS, so the existing ones keep their random numbers.
+
+Antithetic variates:
+    Variates(..., antithetic=True) replaces every uniform U by 1 - U. A run and its antithetic partner (same seed)
+    are negatively correlated: short interarrival times in one are long in the other, and so on.
+
+Streams (attributes of Variates, each called without arguments):
+    - Continuous: normal_interarrival, urgent_interarrival, laboratory_delay (after the laboratory),
+      urgent_operation_delay, surgery_duration[surgery type], care_unit_los, ward_los, outage_time.
+    - Routing decisions, drawn from the precomputed cumulative tables below: next_arrival (normal or urgent),
+      surgery_type, group_size (1 for a single urgent arrival), medium_unit (ward, ICU or CCU after a medium surgery),
+      complex_unit (ICU or CCU after a complex surgery), death and deterioration.
+"""
+
+from operator import length_hint
+import numpy as np
+from scipy.special import ndtri
+from events import NORMAL_ARRIVAL, URGENT_ARRIVAL
+from patients import SIMPLE, MEDIUM, COMPLEX, GENERAL_WARD, ICU, CCU
+
+BLOCK_SIZE = 4096
+TINY = 2 ** -53  # uniforms are kept in (0, 1), so that no inverse CDF returns an infinite value
+
+# One independent random number stream per stochastic source (order matters, see Seeding)
+STREAMS = ('normal_interarrival', 'urgent_interarrival', 'next_arrival', 'surgery_type', 'laboratory_delay',
+           'urgent_operation_delay', 'simple_surgery_duration', 'medium_surgery_duration', 'complex_surgery_duration',
+           'care_unit_los', 'ward_los', 'deterioration', 'group_size', 'outage_time', 'medium_unit', 'complex_unit',
+           'death')
+
+# Routing tables: (values, probabilities)
+NEXT_ARRIVAL = ([NORMAL_ARRIVAL, URGENT_ARRIVAL], [0.75, 0.25])
+SURGERY_TYPE = ([SIMPLE, MEDIUM, COMPLEX], [0.5, 0.45, 0.05])
+GROUP_SIZE = ([1, 2, 3, 4, 5], [0.995, 0.00125, 0.00125, 0.00125, 0.00125])  # 0.5% of urgent arrivals are groups
+MEDIUM_UNIT = ([GENERAL_WARD, ICU, CCU], [0.7, 0.1, 0.2])
+COMPLEX_UNIT = ([ICU, CCU], [0.75, 0.25])  # non-cardiac / cardiac surgery
+DEATH = ([True, False], [0.1, 0.9])  # after a complex surgery
+DETERIORATION = ([True, False], [0.01, 0.99])  # of a complex patient leaving the ICU/CCU
+
+
+class VariateStream:
+    """Hands out variates one at a time from blocks drawn with draw(size)."""
+
+    __slots__ = ('_draw', '_block_size', '_values', '_block', '_count', '_total')
+
+    def __init__(self, draw, block_size=BLOCK_SIZE):
+        self._draw = draw
+        self._block_size = block_size
+        self._values = []  # current block
+        self._block = iter(self._values)
+        self._count = 0  # number and sum of the variates of the used-up blocks
+        self._total = 0
+
+    def __call__(self):
+        try:
+            return next(self._block)
+        except StopIteration:
+            self._count += len(self._values)
+            self._total += sum(self._values)
+            self._values = self._draw(self._block_size).tolist()
+            self._block = iter(self._values)
+            return next(self._block)
+
+    def count(self):
+        # Number of variates handed out so far
+        return self._count + len(self._values) - length_hint(self._block)
+
+    def total(self):
+        # Sum of the variates handed out so far
+        used = len(self._values) - length_hint(self._block)
+        return self._total + sum(self._values[:used])
+
+    def reset(self):
+        # count() and total() start again from 0 (the variates themselves are not affected)
+        used = len(self._values) - length_hint(self._block)
+        self._count = -used
+        self._total = -sum(self._values[:used])
+
+
+# Inverse CDFs: array of uniforms in (0, 1) -> array of variates
+def exponential(u, mean):
+    return -mean * np.log1p(-u)
+
+
+def uniform(u, a, b):
+    return a + (b - a) * u
+
+
+def triangular(u, left, mode, right):
+    split = (mode - left) / (right - left)
+    return np.where(u < split, left + np.sqrt(u * (right - left) * (mode - left)),
+                    right - np.sqrt((1 - u) * (right - left) * (right - mode)))
+
+
+def normal(u, mean, sd):
+    return mean + sd * ndtri(u)
+
+
+def discrete(values, probabilities):
+    # Inverse CDF of a discrete distribution, from a precomputed cumulative table
+    values = np.asarray(values)
+    cumulative = np.cumsum(probabilities)
+    cumulative[-1] = 1.0
+    return lambda u: values[np.searchsorted(cumulative, u)]
+
+
+class Variates:
+    """
+    All the random inputs of one simulation run. `seed` is an int, a SeedSequence or None (fresh entropy); with
+    `antithetic` every uniform U is replaced by 1 - U.
+    """
+
+    def __init__(self, param, seed=None, antithetic=False, block_size=BLOCK_SIZE):
+        seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self.entropy = seed_sequence.entropy  # reproduces an unseeded run
+        # Children are derived from the spawn key rather than with spawn(), which would give different children each
+        # time the same SeedSequence is used (e.g. by both runs of an antithetic pair)
+        rngs = {name: np.random.default_rng(np.random.SeedSequence(seed_sequence.entropy,
+                                                                   spawn_key=seed_sequence.spawn_key + (i,),
+                                                                   pool_size=seed_sequence.pool_size))
+                for i, name in enumerate(STREAMS)}
+
+        def stream(name, inverse_cdf, *args, size=block_size):
+            # Stream of inverse_cdf(U, *args); the parameters are read once, they do not change during a run
+            rng = rngs[name]
+            uniforms = (lambda block: 1 - rng.random(block)) if antithetic else rng.random
+            return VariateStream(lambda block: inverse_cdf(np.clip(uniforms(block), TINY, 1 - TINY), *args), size)
+
+        self.normal_interarrival = stream('normal_interarrival', exponential, 1 / param['Normal Arrival Exp Param'])
+        self.urgent_interarrival = stream('urgent_interarrival', exponential, 1 / param['Urgent Arrival Exp Param'])
+        self.laboratory_delay = stream('laboratory_delay', uniform, param['After Laboratory Uni a Param'],
+                                       param['After Laboratory Uni b Param'])
+        self.urgent_operation_delay = stream('urgent_operation_delay', triangular,
+                                             param['Urgent Operation trgl LB Param'],
+                                             param['Urgent Operation trgl M Param'],
+                                             param['Urgent Operation trgl UB Param'])
+        self.surgery_duration = {
+            surgery_type: stream(f'{name.lower()}_surgery_duration', normal, param[f'{name} Operation Mean'] / 60,
+                                 param[f'{name} Operation SD'] / 60)
+            for surgery_type, name in [(SIMPLE, 'Simple'), (MEDIUM, 'Medium'), (COMPLEX, 'Complex')]}
+        self.care_unit_los = stream('care_unit_los', exponential, 1 / param['Care Unit Exp Param'])
+        self.ward_los = stream('ward_los', exponential, 1 / param['End of Service Exp Param'])
+        self.outage_time = stream('outage_time', uniform, 0, 720, size=1)  # one outage per run
+
+        self.next_arrival = stream('next_arrival', discrete(*NEXT_ARRIVAL))
+        self.surgery_type = stream('surgery_type', discrete(*SURGERY_TYPE))
+        self.group_size = stream('group_size', discrete(*GROUP_SIZE))
+        self.medium_unit = stream('medium_unit', discrete(*MEDIUM_UNIT))
+        self.complex_unit = stream('complex_unit', discrete(*COMPLEX_UNIT))
+        self.death = stream('death', discrete(*DEATH))
+        self.deterioration = stream('deterioration', discrete(*DETERIORATION))
+
+        # Inputs whose realized mean is reported by input_statistics(): name -> [(stream, mean of one draw), ...]
+        self.controls = {
+            'Interarrival Time': [(self.normal_interarrival, 1 / param['Normal Arrival Exp Param']),
+                                  (self.urgent_interarrival, 1 / param['Urgent Arrival Exp Param'])],
+            'Surgery Duration': [(self.surgery_duration[surgery_type], param[f'{name} Operation Mean'] / 60)
+                                 for surgery_type, name in [(SIMPLE, 'Simple'), (MEDIUM, 'Medium'),
+                                                            (COMPLEX, 'Complex')]],
+            'Care Unit LOS': [(self.care_unit_los, 1 / param['Care Unit Exp Param'])],
+        }
+
+    def input_statistics(self):
+        """
+        Realized mean of the main continuous inputs of the run, and its expectation given how many variates each
+        stream handed out: {name: (realized mean, expected mean)}. Their difference has mean zero, which makes the
+        realized means usable as control variates (see get_result.replication()). Only the variates handed out since
+        the last reset_input_statistics() count, i.e. those of the same period as the Results.
+        """
+        statistics = {}
+        for name, streams in self.controls.items():
+            count = sum(stream.count() for stream, _ in streams)
+            if count == 0:
+                statistics[name] = (0.0, 0.0)
+                continue
+            realized = sum(stream.total() for stream, _ in streams) / count
+            expected = sum(stream.count() * mean for stream, mean in streams) / count
+            statistics[name] = (realized, expected)
+        return statistics
+
+    def reset_input_statistics(self):
+        # Called at the end of the warm-up period (see base.warm_up()), when the Results start over
+        for streams in self.controls.values():
+            for stream, _ in streams:
+                stream.reset()
@@ -8,7 +8,14 @@ from tqdm import tqdm
 from scipy.stats import t
 from openpyxl import Workbook
 from openpyxl.styles import Font
+from get_result import run_replications
+from result_cache import select_cache
 
+# Warm-up period (hours) left out of the metrics of the long runs, read off the plots of simulate_and_plot()
+WARM_UP_TIME = 5400
+
+# Steady-state metrics reported for the long runs
+WARM_UP_METRICS = ['Lq_Preoperative', 'Wq_Preoperative', 'Finished_Patients']
 
 original_param = {
     'Preoperative Capacity': 25,
@@ -40,38 +47,38 @@ original_param = {
 }
 
 
-def run_simulation(simulation_time, param, excel_creation=False):
+def run_simulation(simulation_time, param, excel_creation=False, warm_up_time=WARM_UP_TIME):
     """
-    Runs a simulation based on the provided parameters and outputs key performance metrics for the warm-up period.
+    Runs a simulation based on the provided parameters and outputs key performance metrics after the warm-up period.
 
     Args:
         simulation_time (int): The total duration of the simulation in hours.
         param (dict): A dictionary containing the parameters for the system simulation.
         excel_creation (bool, optional): If set to True, an Excel file will be created with the simulation results.
                                           Default is False (no Excel file creation).
+        warm_up_time (float, optional): Warm-up period left out of the metrics. Default is WARM_UP_TIME.
 
     Returns:
         dict: A dictionary containing the simulation results with key metrics, including:
-            - 'Lq_Preoperative_Warm_Period': The length of the preoperative queue during the warm-up period.
-            - 'Wq_Preoperative_Warm_Period': The waiting time for the preoperative queue during the warm-up period.
-            - 'Finished_Patients': The total number of patients that have finished the process during the simulation.
+            - 'Lq_Preoperative': The length of the preoperative queue after the warm-up period.
+            - 'Wq_Preoperative': The waiting time for the preoperative queue after the warm-up period.
+            - 'Finished_Patients': The number of patients that have finished the process after the warm-up period.
 
     Outputs:
-        - Prints key performance metrics for the warm-up period, including:
-            1. `Lq_Preoperative_Warm_Period`
-            2. `Wq_Preoperative_Warm_Period`
+        - Prints key performance metrics after the warm-up period, including:
+            1. `Lq_Preoperative`
+            2. `Wq_Preoperative`
             3. `Finished_Patients`
         - Optionally generates an Excel file containing the simulation results if `excel_creation` is set to True.
     """
 
-    simulation = base.simulation(simulation_time, param, excel_creation)['Results']
+    simulation = base.simulation(simulation_time, param, excel_creation, warm_up_time=warm_up_time)['Results']
 
-    print(f"Lq_Preoperative_Warm_Period = {simulation['Lq_Preoperative_Warm_Period']}")
-    print(f"Wq_Preoperative_Warm_Period = {simulation['Wq_Preoperative_Warm_Period']}")
-    print(f"Finished_Patients = {simulation['Finished_Patients']}")
+    for key in WARM_UP_METRICS:
+        print(f"{key} = {simulation[key]}")
 
 
-def warm_up_replication(simulation_time, r, param):
+def warm_up_replication(simulation_time, r, param, seed=None, cache=True, warm_up_time=WARM_UP_TIME):
     """
     Runs multiple replications of a simulation to analyze warm-up periods and computes statistical summaries.
 
@@ -79,11 +86,18 @@ def warm_up_replication(simulation_time, r, param):
         simulation_time (int): The total simulation duration in hours.
         r (int): The number of replications to run.
         param (dict): A dictionary of parameters used for the simulation.
+        seed (int, optional): If given, replication j is seeded with the j-th child of SeedSequence(seed). Two systems
+                              replicated with the same seed use common random numbers, replication by replication
+                              (see estimate_warm_up_metrics(paired=True)). Default is None (independent replications).
+        cache (bool or ResultCache, optional): Result cache of the seeded runs (see result_cache.py): True (default) for
+                                               result_cache.default_cache, False for none.
+        warm_up_time (float, optional): Warm-up period left out of the metrics of every replication. Default is
+                                        WARM_UP_TIME.
 
     Returns:
         pd.DataFrame: A DataFrame where:
-            - Rows correspond to different performance metrics ('Lq_Preoperative_Warm_Period',
-              'Wq_Preoperative_Warm_Period', 'Finished_Patients').
+            - Rows correspond to different performance metrics ('Lq_Preoperative', 'Wq_Preoperative',
+              'Finished_Patients').
             - Columns correspond to individual replications and statistical summaries:
                 - 'mean': The average value across replications.
                 - 'std': The standard deviation across replications.
@@ -91,27 +105,28 @@ def warm_up_replication(simulation_time, r, param):
 
     Process:
         - Runs the simulation `r` times, collecting data on:
-            - Preoperative queue length during the warm-up period ('Lq_Preoperative_Warm_Period').
-            - Preoperative waiting time during the warm-up period ('Wq_Preoperative_Warm_Period').
-            - Number of patients who finished their process ('Finished_Patients').
+            - Preoperative queue length after the warm-up period ('Lq_Preoperative').
+            - Preoperative waiting time after the warm-up period ('Wq_Preoperative').
+            - Number of patients who finished their process after the warm-up period ('Finished_Patients').
         - Stores results in a dictionary and converts it into a Pandas DataFrame.
         - Computes the mean and standard deviation for each metric.
     """
 
     # Initialize results dictionary
     list_of_result = None
+    seeds = np.random.SeedSequence(seed).spawn(r) if seed is not None else [None] * r
 
-    for i in tqdm(range(r)):
-        # Run the simulation
-        result = base.simulation(simulation_time, param)['Results']
+    # Run the simulations
+    replications = run_replications([(simulation_time, param, seeds[i], False, warm_up_time) for i in range(r)],
+                                    cache=select_cache(cache, seed))
 
+    for i, (result, _, _) in enumerate(replications):
         # On the first iteration, initialize structures
         if i == 0:
-            list_of_result = {key: [0] * r for key in ['Lq_Preoperative_Warm_Period',
-                                                       'Wq_Preoperative_Warm_Period', 'Finished_Patients']}
+            list_of_result = {key: [0] * r for key in WARM_UP_METRICS}
 
         # Store the result for the current replication
-        for key in ['Lq_Preoperative_Warm_Period', 'Wq_Preoperative_Warm_Period', 'Finished_Patients']:
+        for key in WARM_UP_METRICS:
             list_of_result[key][i] = result[key]
 
     # Create a DataFrame where rows correspond to metrics and columns to replications
@@ -128,7 +143,27 @@ def warm_up_replication(simulation_time, r, param):
     return results
 
 
-def estimate_warm_up_metrics(first_system, second_system, alpha):
+def estimate_warm_up_metrics(first_system, second_system, alpha, paired=False):
+    """
+    Compares two systems metric by metric (first minus second) and saves the table to 'systems_comparison_table.xlsx'.
+
+    Args:
+        first_system (pd.DataFrame): Output of warm_up_replication() for the first system.
+        second_system (pd.DataFrame): Output of warm_up_replication() for the second system.
+        alpha (float): Significance level of the confidence intervals.
+        paired (bool, optional): If False (default), the replications are independent and Welch's two-sample t
+                                 interval is used. If True, replication j of both systems must share its random
+                                 numbers (warm_up_replication() with the same seed and number of replications); a
+                                 paired-t interval is computed on the differences, and the 'Variance Reduction'
+                                 column reports 1 - Var(Y_1 - Y_2) / (Var(Y_1) + Var(Y_2)), i.e. the share of the
+                                 variance of an independent comparison that common random numbers removed.
+
+    Returns:
+        pd.DataFrame: 'Point Estimate' and 'Confidence Interval' per metric (and 'Variance Reduction' when paired).
+    """
+    if paired:
+        return estimate_paired_warm_up_metrics(first_system, second_system, alpha)
+
     estimate_table = first_system[['mean', 'std', 'R']].merge(second_system[['mean', 'std', 'R']],
                                                               how='inner', left_index=True, right_index=True)
     estimate_table.columns = ['Y_bar_1', 'S_1', 'R_1', 'Y_bar_2', 'S_2', 'R_2']
@@ -165,7 +200,42 @@ def estimate_warm_up_metrics(first_system, second_system, alpha):
 
     # Select final columns
     result = estimate_table[['Point Estimate', 'Confidence Interval']]
+    save_comparison_table(result)
+    return result
+
+
+def estimate_paired_warm_up_metrics(first_system, second_system, alpha):
+    # Paired-t comparison of two systems replicated with common random numbers (see estimate_warm_up_metrics)
+    replications = [column for column in first_system.columns if str(column).startswith('Replication')]
+    if len(replications) != second_system['R'].iloc[0] or len(replications) < 2:
+        raise ValueError("A paired comparison needs the same number (at least 2) of replications for both systems.")
+
+    first = first_system[replications]
+    second = second_system.loc[first.index, replications]
+    differences = first - second
+    R = len(replications)
 
+    estimate_table = pd.DataFrame(index=differences.index)
+    estimate_table['Point Estimate'] = differences.mean(axis=1)
+    estimate_table['S_D'] = differences.std(axis=1)
+    estimate_table['se'] = estimate_table['S_D'] / np.sqrt(R)
+    estimate_table['ci_half_width'] = t.ppf(1 - alpha / 2, df=R - 1) * estimate_table['se']
+
+    estimate_table['Confidence Interval'] = estimate_table.apply(
+        lambda row: f"[{round(row['Point Estimate'] - row['ci_half_width'], 3)}, {round(row['Point Estimate'] + row['ci_half_width'], 3)}]",
+        axis=1
+    )
+
+    # Variance of the difference without common random numbers: Var(Y_1) + Var(Y_2)
+    independent_variance = (first.var(axis=1) + second.var(axis=1)).replace(0, np.nan)
+    estimate_table['Variance Reduction'] = (1 - estimate_table['S_D'] ** 2 / independent_variance).round(3)
+
+    result = estimate_table[['Point Estimate', 'Confidence Interval', 'Variance Reduction']]
+    save_comparison_table(result)
+    return result
+
+
+def save_comparison_table(result):
     # Save to Excel with formatting
     filename = 'systems_comparison_table.xlsx'
     with pd.ExcelWriter(filename, engine='openpyxl') as writer:
@@ -194,7 +264,6 @@ def estimate_warm_up_metrics(first_system, second_system, alpha):
         workbook.save(filename)
 
     print(f"Results saved to {filename}.")
-    return result
 
 
 def calculate_aggregate_queue_waiting_time(start_time, end_time, patients_data):
@@ -442,12 +511,12 @@ simulate_and_plot(original_param, param_updates_1, simulation_config, '1st Syste
 simulate_and_plot(original_param, param_updates_2, simulation_config, '2nd System')
 
 # Running the system over the long term to obtain metrics
-system1_param = original_param
+system1_param = original_param.copy()  # each system gets its own copy of the parameters
 system1_param.update(param_updates_1)
 simulation_time_1 = ((300 * simulation_config['frame_length']) * 11)
 R1 = 10
 
-system2_param = original_param
+system2_param = original_param.copy()
 system2_param.update(param_updates_2)
 simulation_time_2 = ((300 * simulation_config['frame_length']) * 11)
 R2 = 10
@@ -460,8 +529,9 @@ print('\n---------------------------------------------')
 print('Warm Period Metrics For 2nd System:')
 run_simulation(simulation_time_2, system2_param)
 
-warm_up_results1 = warm_up_replication(simulation_time_1, R1, system1_param)
-warm_up_results2 = warm_up_replication(simulation_time_2, R2, system2_param)
+# Both systems are replicated with common random numbers (same seed), so they can be compared with a paired-t interval
+warm_up_results1 = warm_up_replication(simulation_time_1, R1, system1_param, seed=2025)
+warm_up_results2 = warm_up_replication(simulation_time_2, R2, system2_param, seed=2025)
 print('\n---------------------------------------------')
 print('Point Estimate & Confidence Interval For These Metrics:')
-estimate_warm_up_metrics(warm_up_results1, warm_up_results2, 0.05)
+estimate_warm_up_metrics(warm_up_results1, warm_up_results2, 0.05, paired=True)